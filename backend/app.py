@@ -1,11 +1,19 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 import os
+import asyncio
 import pathlib
 from contextlib import asynccontextmanager
 from routes.video_routes import video_router
+from services.job_queue import fail_orphaned_jobs, render_queue
+from models.inference_client import unreachable_inference_servers
+from models.model_loader import preload_models, remote_inference
+from models.model_registry import model_registry
+from utils.file_utils import migrate_json_metadata
+from utils.metrics import render_metrics
+from utils.workspace import cleanup_stale_workspaces
 from config import Config
 
 # Create the lifespan event handler
@@ -24,9 +32,30 @@ async def lifespan(app: FastAPI):
     static_assets_dir = os.path.join(static_dir, "assets")
     os.makedirs(static_assets_dir, exist_ok=True)
     
+    # Remove scratch workspaces left behind by crashed processes
+    removed = cleanup_stale_workspaces()
+    if removed:
+        print(f"Removed {removed} stale job workspaces")
+    
+    # Jobs left queued or running by a process that is gone will never finish
+    orphaned = fail_orphaned_jobs()
+    if orphaned:
+        print(f"Marked {orphaned} jobs of exited processes as failed")
+    
+    # Import metadata written before the metadata store existed (runs once)
+    imported = migrate_json_metadata()
+    if imported:
+        print(f"Imported {imported} videos into the metadata store")
+    
+    # Load the configured models in the background so the API can answer health checks
+    # right away; /readyz reports when the warm-up has finished
+    print(f"Preloading models: {', '.join(Config.PRELOAD_MODELS) or 'none'}")
+    app.state.warmup = asyncio.create_task(asyncio.to_thread(preload_models))
+    
     yield
     # Code to run on shutdown (if any)
     print("Shutting down...")
+    render_queue.shutdown(wait=False)
 
 app = FastAPI(title="Shorts Video API", lifespan=lifespan)
 
@@ -48,16 +77,51 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Mount static files directory if it exists
+# Liveness: the process is up and serving requests
+@app.get("/healthz", include_in_schema=False)
+def healthz():
+    return {"status": "ok"}
+
+# Readiness: the model warm-up has finished, so renders will not wait for weights to load,
+# and with remote inference every inference server answers
+@app.get("/readyz", include_in_schema=False)
+def readyz():
+    warmup = getattr(app.state, "warmup", None)
+    loaded = list(model_registry.loaded_models())
+    
+    if warmup is None or not warmup.done():
+        return JSONResponse(
+            status_code=503,
+            content={"status": "warming_up", "loaded": loaded, "pending": [key for key in Config.PRELOAD_MODELS if key not in loaded]}
+        )
+    
+    # With remote inference the models live on the inference servers, so they must answer
+    if remote_inference():
+        unreachable = unreachable_inference_servers()
+        if unreachable:
+            return JSONResponse(status_code=503, content={"status": "inference_unavailable", "unreachable": unreachable})
+    
+    # Models that failed to preload are loaded on first use instead, so the API is still ready
+    failed = warmup.result() if not warmup.cancelled() and warmup.exception() is None else Config.PRELOAD_MODELS
+    return {"status": "ready", "loaded": loaded, "failed": failed}
+
+# Prometheus metrics: stage latencies, in-flight renders, loaded models, caches and failures
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+# Register routes
+app.include_router(video_router, prefix="/api/videos")
+
+# Mount static files directory if it exists; it answers every path not routed before it,
+# so the API routes, probes and metrics above stay reachable
 static_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "static")
 if os.path.exists(static_dir):
     app.mount("/", StaticFiles(directory=static_dir, html=True), name="static")
     if os.path.exists(os.path.join(static_dir, "assets")):
         app.mount("/assets", StaticFiles(directory=os.path.join(static_dir, "assets")), name="static_assets")
 
-# Register routes
-app.include_router(video_router, prefix="/api/videos")
-
 # Add the root endpoint
 @app.get("/")
 def read_root():
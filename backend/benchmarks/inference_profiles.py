@@ -0,0 +1,148 @@
+"""
+Compare the latency and peak memory of the inference profiles
+
+Each profile runs in its own subprocess, because torch thread settings and
+loaded models are process-wide. Run from the backend directory:
+
+    python -m benchmarks.inference_profiles --steps 20 --size 512 --output report.json
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+# Environment overrides that define each compared profile
+PROFILES = {
+    "default": {"INFERENCE_PROFILE": "default"},
+    "cpu": {"INFERENCE_PROFILE": "cpu", "CPU_BF16": "False"},
+    "cpu-bf16": {"INFERENCE_PROFILE": "cpu", "CPU_BF16": "True"},
+    "cpu-compile": {"INFERENCE_PROFILE": "cpu", "CPU_BF16": "auto", "TORCH_COMPILE": "True"},
+}
+
+SUMMARY_TEXT = " ".join(
+    ["A lighthouse keeper on a remote island records the weather every hour, "
+     "watches the ships pass and writes letters that are never sent."] * 12
+)
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+def run_profile(steps, size, repeats):
+    """
+    Measure the current process's profile; called inside the per-profile subprocess
+
+    Returns:
+        dict: Seconds for model loads, warm-up and mean keyframe and summary
+        latency, plus the peak RSS in MB after each stage
+    """
+    import torch
+    from models.model_loader import get_image_generation_model, get_text_summarization_model, image_model_identity
+    from models.inference_profile import diffusion_autocast
+
+    result = {"identity": image_model_identity(), "threads": torch.get_num_threads()}
+
+    pipe = None
+    def load_pipe():
+        nonlocal pipe
+        pipe = get_image_generation_model()
+    result["imageLoadSeconds"] = timed(load_pipe)
+
+    def keyframe():
+        with diffusion_autocast():
+            pipe(
+                prompt="a lighthouse on a cliff at sunset",
+                num_inference_steps=steps,
+                height=size,
+                width=size,
+                generator=torch.Generator(device=pipe.device).manual_seed(42)
+            )
+
+    # The first call includes compilation and oneDNN kernel selection
+    result["keyframeWarmupSeconds"] = timed(keyframe)
+    result["keyframeSeconds"] = sum(timed(keyframe) for _ in range(repeats)) / repeats
+    result["imagePeakRssMb"] = peak_rss_mb()
+
+    summarizer = None
+    def load_summarizer():
+        nonlocal summarizer
+        summarizer = get_text_summarization_model()
+    result["summarizerLoadSeconds"] = timed(load_summarizer)
+
+    def summarize():
+        summarizer(SUMMARY_TEXT, max_length=150, min_length=30, do_sample=False)
+
+    summarize()
+    result["summarySeconds"] = sum(timed(summarize) for _ in range(repeats)) / repeats
+    result["peakRssMb"] = peak_rss_mb()
+
+    return result
+
+def format_report(results):
+    """
+    Format profile results as a Markdown table
+    """
+    columns = [
+        ("Profile", None),
+        ("Keyframe (s)", "keyframeSeconds"),
+        ("Warm-up (s)", "keyframeWarmupSeconds"),
+        ("Summary (s)", "summarySeconds"),
+        ("Image peak RSS (MB)", "imagePeakRssMb"),
+        ("Peak RSS (MB)", "peakRssMb"),
+    ]
+    lines = [
+        "| " + " | ".join(title for title, _ in columns) + " |",
+        "|" + "---|" * len(columns),
+    ]
+    for name, result in results.items():
+        if "error" in result:
+            lines.append(f"| {name} | failed: {result['error']} |")
+            continue
+        cells = [name] + [f"{result[key]:.2f}" for _, key in columns[1:]]
+        lines.append("| " + " | ".join(cells) + " |")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--profiles", nargs="+", default=list(PROFILES), choices=list(PROFILES))
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--size", type=int, default=512)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", help="Also write the raw results to this JSON file")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_profile(args.steps, args.size, args.repeats)))
+        return
+
+    results = {}
+    for name in args.profiles:
+        print(f"Running profile {name}...", file=sys.stderr)
+        env = {**os.environ, **PROFILES[name], "PRELOAD_MODELS": ""}
+        process = subprocess.run(
+            [sys.executable, "-m", "benchmarks.inference_profiles", "--child",
+             "--steps", str(args.steps), "--size", str(args.size), "--repeats", str(args.repeats)],
+            env=env, capture_output=True, text=True
+        )
+        if process.returncode != 0:
+            results[name] = {"error": process.stderr.strip().splitlines()[-1] if process.stderr.strip() else "exited with an error"}
+        else:
+            results[name] = json.loads(process.stdout.strip().splitlines()[-1])
+
+    print(format_report(results))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"steps": args.steps, "size": args.size, "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,319 @@
+"""
+Benchmark each stage of the render pipelines on its own, with stub models
+
+Every case (stage, size, duration) runs in a fresh subprocess with empty
+caches, so wall time, CPU time (including ffmpeg children) and peak RSS are
+not skewed by earlier cases. Run from the backend directory:
+
+    python -m benchmarks.stages --sizes 256 512 --durations 10 30 --save main
+    python -m benchmarks.stages --sizes 256 512 --durations 10 30 --compare main
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+
+PROMPT = "A lighthouse on a rocky cliff at sunset, waves crashing below"
+LONG_TEXT = " ".join(
+    [f"Chapter {i}. The keeper climbed the stairs, lit the lamp and watched the ships pass in the night." for i in range(20)]
+)
+
+# name: (uses frame size, uses duration, description)
+STAGES = {
+    "keyframes": (True, False, "Batched keyframe generation through the diffusion batcher and keyframe cache"),
+    "captions": (True, False, "Burning captions into the keyframes"),
+    "interpolate": (True, True, "Crossfade interpolation without encoding"),
+    "encode": (True, True, "Interpolated frames streamed into H.264"),
+    "narration": (False, False, "Narration synthesis with the silent TTS backend"),
+    "encode_mux": (True, True, "Interpolated frames encoded with the narration muxed in"),
+    "keyframes_encode": (True, True, "Keyframe-mode encode with ffmpeg transitions"),
+    "generate_video": (True, True, "generate_video_from_text end to end"),
+    "fallback": (True, True, "generate_fallback_video end to end"),
+    "compose": (True, False, "create_video_from_images_and_audio with five segments"),
+    "process_text": (False, False, "process_text with summarization"),
+}
+
+def configure_sandbox(root):
+    """
+    Point every cache, scratch directory and the latency profile at root and select the offline backends
+
+    Must run before the model and service modules are imported, since their
+    shared caches read Config when they are created.
+    """
+    from config import Config
+
+    Config.KEYFRAME_CACHE_DIR = os.path.join(root, 'keyframes')
+    Config.TTS_CACHE_DIR = os.path.join(root, 'tts')
+    Config.SEGMENT_CACHE_DIR = os.path.join(root, 'segments')
+    Config.RESULT_CACHE_DIR = os.path.join(root, 'results')
+    Config.SCRATCH_DIR = os.path.join(root, 'scratch')
+    # Stub timings must never reach the profile the render planner trusts
+    Config.LATENCY_PROFILE = os.path.join(root, 'latency.json')
+    Config.SCRATCH_USE_TMPFS = False
+    Config.TTS_BACKEND = 'silent'
+    Config.INFERENCE_PROFILE = 'default'
+
+    from benchmarks.stubs import register_stub_models
+    register_stub_models()
+
+def make_keyframes(width, height):
+    import numpy as np
+    import torch
+    from benchmarks.stubs import StubDiffusionPipeline
+    from models.video_generator import keyframe_seeds, NUM_KEYFRAMES
+
+    pipe = StubDiffusionPipeline()
+    generators = [torch.Generator().manual_seed(seed) for seed in keyframe_seeds(NUM_KEYFRAMES)]
+    images = pipe(prompt=[PROMPT] * NUM_KEYFRAMES, height=height, width=width, generator=generators).images
+    return [np.array(image) for image in images]
+
+def prepare_stage(stage, width, height, duration, root):
+    """
+    Build the inputs of a stage and return a function that runs it
+
+    Only the returned function is measured.
+    """
+    from models.video_generator import FPS, generate_narration, generate_video_from_text, generate_fallback_video, keyframe_seeds, NUM_KEYFRAMES, NEGATIVE_PROMPT
+    from models.video_encoder import FFmpegFrameWriter, interpolate_frames, encode_keyframe_video
+
+    output_path = os.path.join(root, 'out', f'{stage}.mp4')
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    frame_count = duration * FPS
+
+    if stage == "keyframes":
+        from concurrent.futures import wait
+        from models.diffusion_batcher import diffusion_batcher, KeyframeRequest
+
+        def run():
+            requests = [
+                KeyframeRequest(PROMPT, NEGATIVE_PROMPT, seed, height=height, width=width)
+                for seed in keyframe_seeds(NUM_KEYFRAMES)
+            ]
+            wait(diffusion_batcher.submit(requests))
+        return run
+
+    if stage == "process_text":
+        from services.text_processing import process_text
+        from models.model_loader import get_text_summarization_model
+        get_text_summarization_model()
+        return lambda: process_text(LONG_TEXT)
+
+    if stage == "narration":
+        return lambda: generate_narration(LONG_TEXT, os.path.join(root, 'narration.wav'))
+
+    if stage == "generate_video":
+        return lambda: generate_video_from_text(PROMPT, output_path, height=height, width=width, min_duration=duration, allow_fallback=False)
+
+    if stage == "fallback":
+        return lambda: generate_fallback_video(output_path, num_frames=duration, height=height, width=width, text=PROMPT)
+
+    if stage == "compose":
+        from PIL import Image
+        from models.video_composer import create_video_from_images_and_audio
+        from models.text_to_speech import text_to_speech
+
+        image_paths, audio_paths = [], []
+        for i, keyframe in enumerate(make_keyframes(width, height)):
+            image_paths.append(os.path.join(root, f'segment_{i}.png'))
+            Image.fromarray(keyframe).save(image_paths[-1])
+            audio_paths.append(text_to_speech(f"Segment number {i} of the storyboard.", os.path.join(root, f'segment_{i}.wav')))
+        return lambda: create_video_from_images_and_audio(image_paths, audio_paths, output_path)
+
+    keyframes = make_keyframes(width, height)
+
+    if stage == "captions":
+        from models.captions import burn_captions
+        return lambda: burn_captions([keyframe.copy() for keyframe in keyframes], PROMPT)
+
+    if stage == "interpolate":
+        def run():
+            for _ in interpolate_frames(keyframes, frame_count):
+                pass
+        return run
+
+    if stage in ("encode", "encode_mux"):
+        audio_path = generate_narration(PROMPT, os.path.join(root, 'narration.wav')) if stage == "encode_mux" else None
+
+        def run():
+            with FFmpegFrameWriter(output_path, width, height, FPS, audio_path=audio_path, duration=duration) as writer:
+                for frame in interpolate_frames(keyframes, frame_count):
+                    writer.write(frame)
+        return run
+
+    if stage == "keyframes_encode":
+        scratch_dir = os.path.join(root, 'keyframe_dumps')
+        os.makedirs(scratch_dir)
+        return lambda: encode_keyframe_video(keyframes, output_path, FPS, duration, scratch_dir=scratch_dir)
+
+    raise ValueError(f"Unknown stage '{stage}'")
+
+def run_case(stage, width, height, duration):
+    """
+    Measure one case in the current process; called inside the per-case subprocess
+
+    Returns:
+        dict: Wall and CPU seconds of the stage and peak RSS in MB of this
+        process and of its largest child (ffmpeg)
+    """
+    root = tempfile.mkdtemp(prefix='bench_')
+    try:
+        configure_sandbox(root)
+        run = prepare_stage(stage, width, height, duration, root)
+
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self_before = resource.getrusage(resource.RUSAGE_SELF)
+        children_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+        start = time.perf_counter()
+
+        run()
+
+        wall = time.perf_counter() - start
+        self_after = resource.getrusage(resource.RUSAGE_SELF)
+        children_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+        cpu = (
+            (self_after.ru_utime - self_before.ru_utime) + (self_after.ru_stime - self_before.ru_stime)
+            + (children_after.ru_utime - children_before.ru_utime) + (children_after.ru_stime - children_before.ru_stime)
+        )
+        return {
+            "wallSeconds": wall,
+            "cpuSeconds": cpu,
+            "peakRssMb": self_after.ru_maxrss / 1024,
+            "rssBeforeMb": rss_before,
+            "childPeakRssMb": children_after.ru_maxrss / 1024,
+        }
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+def case_key(stage, size, duration):
+    uses_size, uses_duration, _ = STAGES[stage]
+    parts = [stage]
+    if uses_size:
+        parts.append(f"{size}x{size}")
+    if uses_duration:
+        parts.append(f"{duration}s")
+    return "/".join(parts)
+
+def run_suite(stages, sizes, durations, repeats):
+    """
+    Run every case in its own subprocess, repeats times each
+
+    Returns:
+        dict: Case key to the median wall and CPU seconds and the maximum peak RSS
+    """
+    results = {}
+    for stage in stages:
+        uses_size, uses_duration, _ = STAGES[stage]
+        for size in (sizes if uses_size else sizes[:1]):
+            for duration in (durations if uses_duration else durations[:1]):
+                key = case_key(stage, size, duration)
+                print(f"Running {key}...", file=sys.stderr)
+
+                runs = []
+                for _ in range(repeats):
+                    process = subprocess.run(
+                        [sys.executable, "-m", "benchmarks.stages", "--child", stage, str(size), str(duration)],
+                        capture_output=True, text=True
+                    )
+                    if process.returncode != 0:
+                        error = process.stderr.strip().splitlines()[-1] if process.stderr.strip() else "exited with an error"
+                        results[key] = {"error": error}
+                        break
+                    runs.append(json.loads(process.stdout.strip().splitlines()[-1]))
+                else:
+                    results[key] = {
+                        "wallSeconds": statistics.median(run["wallSeconds"] for run in runs),
+                        "cpuSeconds": statistics.median(run["cpuSeconds"] for run in runs),
+                        "peakRssMb": max(run["peakRssMb"] for run in runs),
+                        "childPeakRssMb": max(run["childPeakRssMb"] for run in runs),
+                    }
+    return results
+
+def format_results(results, baseline=None, threshold=0.1):
+    """
+    Format results as a Markdown table, with the change against a baseline when given
+
+    Returns:
+        tuple: (report text, list of case keys slower than the baseline by more than threshold)
+    """
+    header = "| Case | Wall (s) | CPU (s) | Peak RSS (MB) | ffmpeg peak RSS (MB) |"
+    if baseline is not None:
+        header += " Wall vs baseline | RSS vs baseline |"
+    lines = [header, "|" + "---|" * (header.count("|") - 1)]
+    regressions = []
+
+    for key, result in results.items():
+        if "error" in result:
+            lines.append(f"| {key} | failed: {result['error']} |")
+            continue
+
+        line = (
+            f"| {key} | {result['wallSeconds']:.3f} | {result['cpuSeconds']:.3f} "
+            f"| {result['peakRssMb']:.0f} | {result['childPeakRssMb']:.0f} |"
+        )
+
+        if baseline is not None:
+            previous = baseline.get(key)
+            if previous is None or "error" in previous:
+                line += " new | new |"
+            else:
+                wall_change = result['wallSeconds'] / previous['wallSeconds'] - 1 if previous['wallSeconds'] else 0
+                rss_change = result['peakRssMb'] / previous['peakRssMb'] - 1 if previous['peakRssMb'] else 0
+                flag = " ⚠" if wall_change > threshold or rss_change > threshold else ""
+                if flag:
+                    regressions.append(key)
+                line += f" {wall_change:+.1%}{flag} | {rss_change:+.1%} |"
+
+        lines.append(line)
+
+    return "\n".join(lines), regressions
+
+def baseline_path(name):
+    return os.path.join(BASELINE_DIR, f"{name}.json")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=list(STAGES))
+    parser.add_argument("--sizes", nargs="+", type=int, default=[256, 512])
+    parser.add_argument("--durations", nargs="+", type=int, default=[10, 30])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--save", metavar="NAME", help="Save the results as baseline NAME")
+    parser.add_argument("--compare", metavar="NAME", help="Diff the results against baseline NAME")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative slowdown reported as a regression")
+    parser.add_argument("--child", nargs=3, metavar=("STAGE", "SIZE", "DURATION"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        stage, size, duration = args.child
+        print(json.dumps(run_case(stage, int(size), int(size), int(duration))))
+        return
+
+    baseline = None
+    if args.compare:
+        with open(baseline_path(args.compare)) as f:
+            baseline = json.load(f)["results"]
+
+    results = run_suite(args.stages, args.sizes, args.durations, args.repeats)
+    report, regressions = format_results(results, baseline, args.threshold)
+    print(report)
+
+    if args.save:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(baseline_path(args.save), "w") as f:
+            json.dump({"repeats": args.repeats, "results": results}, f, indent=2)
+        print(f"Saved baseline '{args.save}'", file=sys.stderr)
+
+    if regressions:
+        print(f"Regressions over {args.threshold:.0%}: {', '.join(regressions)}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,61 @@
+"""
+Tiny deterministic stand-ins for the heavy models, so benchmarks run offline on CPU
+"""
+import hashlib
+import numpy as np
+from PIL import Image
+
+
+class StubImageOutput:
+    def __init__(self, images):
+        self.images = images
+
+
+class StubDiffusionPipeline:
+    """
+    Returns seeded noise shaped like a Stable Diffusion output
+
+    Images depend only on the prompt, seed and size, like the real pipeline,
+    so keyframe caching and batching behave the same way.
+    """
+
+    device = 'cpu'
+    components = {}
+
+    def __call__(self, prompt, negative_prompt=None, num_inference_steps=20, guidance_scale=7.5, height=512, width=512, generator=None, **kwargs):
+        prompts = prompt if isinstance(prompt, list) else [prompt]
+        generators = generator if isinstance(generator, list) else [generator] * len(prompts)
+
+        images = []
+        for text, seed_generator in zip(prompts, generators):
+            seed = seed_generator.initial_seed() if seed_generator is not None else 0
+            digest = hashlib.sha256(f"{text}\n{seed}".encode('utf-8')).digest()
+            rng = np.random.default_rng(int.from_bytes(digest[:8], 'little'))
+
+            # Smooth noise upscaled from a coarse grid, so frames compress like photos rather than static
+            coarse = rng.integers(0, 256, (max(1, height // 32), max(1, width // 32), 3), dtype=np.uint8)
+            images.append(Image.fromarray(coarse).resize((width, height), Image.BILINEAR))
+
+        return StubImageOutput(images)
+
+
+class StubSummarizer:
+    """
+    Returns the leading sentences of the text, like an extractive summary
+    """
+
+    def __call__(self, text, max_length=150, min_length=30, do_sample=False):
+        words = text.split()[:max_length]
+        return [{"summary_text": " ".join(words)}]
+
+
+def register_stub_models():
+    """
+    Replace the registered image and summarization models with the stubs
+    """
+    # Importing the loader module registers the real loaders, which are then replaced
+    import models.model_loader  # noqa: F401
+    from models.model_registry import model_registry
+
+    model_registry.register('image_gen', StubDiffusionPipeline)
+    model_registry.register('summarizer', StubSummarizer)
\ No newline at end of file
@@ -18,10 +18,94 @@ class Config:
     VIDEOS_DIR = os.path.join(STORAGE_DIR, 'videos')
     IMAGES_DIR = os.path.join(STORAGE_DIR, 'images')
     AUDIO_DIR = os.path.join(STORAGE_DIR, 'audio')
+    METADATA_DB = os.path.join(VIDEOS_DIR, 'metadata.db')
+    RESULT_CACHE_DIR = os.path.join(VIDEOS_DIR, 'cache')
+    KEYFRAME_CACHE_DIR = os.path.join(IMAGES_DIR, 'keyframes')
+    KEYFRAME_CACHE_MAX_MB = int(os.getenv('KEYFRAME_CACHE_MAX_MB', 2048))
+    TTS_CACHE_DIR = os.path.join(AUDIO_DIR, 'segments')
+    TTS_CACHE_MAX_MB = int(os.getenv('TTS_CACHE_MAX_MB', 512))
+    SEGMENT_CACHE_DIR = os.path.join(VIDEOS_DIR, 'segments')
+    SEGMENT_CACHE_MAX_MB = int(os.getenv('SEGMENT_CACHE_MAX_MB', 2048))
+    LATENCY_PROFILE = os.path.join(STORAGE_DIR, 'latency.json')
     
     # API URLs
     API_URL = os.getenv('API_URL', 'http://localhost:5000/api')
     
+    # Videos never change once written, so clients may cache them for a long time
+    VIDEO_CACHE_MAX_AGE = int(os.getenv('VIDEO_CACHE_MAX_AGE', 31536000))
+    
     # Model configurations
-    TTS_MODEL = os.getenv('TTS_MODEL', 'facebook/fastspeech2-en-ljspeech')
+    TTS_MODEL = os.getenv('TTS_MODEL', 'facebook/mms-tts-eng')
     IMAGE_MODEL = os.getenv('IMAGE_MODEL', 'stabilityai/stable-diffusion-2-1')
+    
+    # Inference profile: 'default', or 'cpu' for thread tuning, channels_last, VAE slicing/tiling,
+    # int8 BART and optional bf16 autocast ('auto' uses it when the CPU supports it) and torch.compile
+    INFERENCE_PROFILE = os.getenv('INFERENCE_PROFILE', 'default')
+    CPU_THREADS = int(os.getenv('CPU_THREADS', 0))
+    CPU_BF16 = os.getenv('CPU_BF16', 'auto')
+    TORCH_COMPILE = os.getenv('TORCH_COMPILE', 'False') == 'True'
+    
+    # Weight format: 'auto' loads safetensors files when the model has them and falls back to
+    # pickled weights, 'True' requires safetensors, 'False' never uses them
+    USE_SAFETENSORS = {'True': True, 'False': False}.get(os.getenv('USE_SAFETENSORS', 'auto'))
+    # Under gunicorn, move the preloaded weights into shared memory before forking the workers
+    # (needs /dev/shm at least as large as the weights, e.g. docker run --shm-size)
+    SHARE_MODEL_MEMORY = os.getenv('SHARE_MODEL_MEMORY', 'True') == 'True'
+    
+    # Model registry: models loaded at startup and the RAM budget (0 = unlimited)
+    PRELOAD_MODELS = [key.strip() for key in os.getenv('PRELOAD_MODELS', 'image_gen').split(',') if key.strip()]
+    MODEL_MEMORY_BUDGET_MB = int(os.getenv('MODEL_MEMORY_BUDGET_MB', 0))
+    
+    # Inference backend: 'local' runs the models in the API process, 'remote' sends them to
+    # inference servers (python -m models.inference_server) on these Unix sockets, round-robin.
+    # Connections are authenticated with INFERENCE_AUTHKEY, or else with the key the first server
+    # generates into INFERENCE_AUTHKEY_FILE (readable by its user only)
+    INFERENCE_BACKEND = os.getenv('INFERENCE_BACKEND', 'local')
+    INFERENCE_SOCKETS = [path.strip() for path in os.getenv('INFERENCE_SOCKETS', os.path.join(TEMP_DIR, 'inference.sock')).split(',') if path.strip()]
+    INFERENCE_AUTHKEY = os.getenv('INFERENCE_AUTHKEY', '')
+    INFERENCE_AUTHKEY_FILE = os.getenv('INFERENCE_AUTHKEY_FILE', os.path.join(TEMP_DIR, 'inference.key'))
+    
+    # Keyframe diffusion micro-batching across concurrent renders
+    DIFFUSION_BATCH_WINDOW_MS = int(os.getenv('DIFFUSION_BATCH_WINDOW_MS', 50))
+    DIFFUSION_MAX_BATCH = int(os.getenv('DIFFUSION_MAX_BATCH', 8))
+    
+    # Keyframe mode: 'independent' denoises every keyframe from noise, 'chained' derives each keyframe
+    # after the first from the previous one by img2img, running KEYFRAME_STRENGTH of the steps, and
+    # 'latent' denoises LATENT_ANCHORS keyframes and slerps their latents into LATENT_KEYFRAMES
+    # keyframes that only need a VAE decode (VAE_DECODE_BATCH per call)
+    KEYFRAME_MODE = os.getenv('KEYFRAME_MODE', 'independent')
+    KEYFRAME_STRENGTH = float(os.getenv('KEYFRAME_STRENGTH', 0.45))
+    LATENT_ANCHORS = int(os.getenv('LATENT_ANCHORS', 2))
+    LATENT_KEYFRAMES = int(os.getenv('LATENT_KEYFRAMES', 12))
+    VAE_DECODE_BATCH = int(os.getenv('VAE_DECODE_BATCH', 4))
+    
+    # Render mode: 'interpolate' blends frames in Python, 'keyframes' builds transitions in ffmpeg
+    RENDER_MODE = os.getenv('RENDER_MODE', 'interpolate')
+    KEYFRAME_TRANSITION_SECONDS = float(os.getenv('KEYFRAME_TRANSITION_SECONDS', 1.0))
+    KEN_BURNS = os.getenv('KEN_BURNS', 'True') == 'True'
+    
+    # Captions: 'burn' draws them into the frames, 'soft' adds a mov_text subtitle track
+    CAPTION_MODE = os.getenv('CAPTION_MODE', 'burn')
+    
+    # Text-to-speech: 'local' (TTS_MODEL on this host), 'gtts' (Google, needs network) or 'silent'
+    TTS_BACKEND = os.getenv('TTS_BACKEND', 'local')
+    TTS_WORKERS = int(os.getenv('TTS_WORKERS', 4))
+    
+    # Concurrent segment encodes in the video composer (0 = one per CPU core)
+    COMPOSER_WORKERS = int(os.getenv('COMPOSER_WORKERS', 0))
+    
+    # Per-job scratch workspaces, optionally on tmpfs (/dev/shm)
+    SCRATCH_DIR = os.getenv('SCRATCH_DIR', os.path.join(TEMP_DIR, 'jobs'))
+    SCRATCH_USE_TMPFS = os.getenv('SCRATCH_USE_TMPFS', 'False') == 'True'
+    WORKSPACE_QUOTA_MB = int(os.getenv('WORKSPACE_QUOTA_MB', 1024))
+    
+    # Render job queue
+    RENDER_WORKERS = int(os.getenv('RENDER_WORKERS', 1))
+    JOB_HISTORY_LIMIT = int(os.getenv('JOB_HISTORY_LIMIT', 1000))
+    
+    # Render planner: deadline of a render (from when it was queued) unless the request sets one,
+    # the share of the remaining time a plan may be estimated to use, and how long the first
+    # keyframe is always waited for, whatever the plan says (it may include a cold model load)
+    RENDER_DEADLINE_SECONDS = int(os.getenv('RENDER_DEADLINE_SECONDS', 420))
+    PLANNER_SAFETY = float(os.getenv('PLANNER_SAFETY', 0.85))
+    FIRST_KEYFRAME_TIMEOUT_SECONDS = int(os.getenv('FIRST_KEYFRAME_TIMEOUT_SECONDS', 300))
\ No newline at end of file
@@ -0,0 +1,87 @@
+"""
+Production serving: load the models once, then fork the workers
+
+    gunicorn -c gunicorn.conf.py app:app
+
+The master process imports the app and loads Config.PRELOAD_MODELS before
+forking, so the models are loaded once instead of once per worker and the
+workers start without the load time. Loading leaves the weights in private
+memory (from_pretrained, the move to the device and the inference profile's
+dtype, channels_last and quantization steps all copy them), which a fork only
+shares copy-on-write. So once every such step has run, the master moves the
+weights into shared memory (Config.SHARE_MODEL_MEMORY), where all workers map
+the same pages and no write copies them; each worker then adds its interpreter
+and activations to the host's memory, not another copy of the weights. This
+needs /dev/shm at least as large as the weights; when the move fails the
+weights stay private and shared copy-on-write only. Dynamically quantized
+layers are never moved. gc.freeze() below keeps the garbage collector from
+writing to the loaded objects. Check the per-worker PSS to see what is
+actually shared. With INFERENCE_BACKEND=remote the models live in the
+inference servers instead (see models/inference_server.py) and the workers
+load none.
+
+Each worker runs the jobs it accepts on its own render queue, and saves their
+status and progress to the metadata store on every change, so the job status
+and progress endpoints answer for any job from any worker. When a worker
+dies, its unfinished jobs are marked as failed.
+"""
+import gc
+import os
+import shutil
+from config import Config
+from models.inference_profile import available_cpus, configure_threads
+
+bind = f"{Config.HOST}:{Config.PORT}"
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.getenv('WEB_CONCURRENCY', min(4, available_cpus())))
+preload_app = True
+# Model loading in the master can take minutes on a cold cache
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 300))
+graceful_timeout = 60
+
+# Aggregate Prometheus metrics across workers; must be set before prometheus_client is imported
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(Config.TEMP_DIR, 'prometheus'))
+shutil.rmtree(os.environ['PROMETHEUS_MULTIPROC_DIR'], ignore_errors=True)
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+def on_starting(server):
+    """
+    Load the models in the master before any worker is forked
+    """
+    from models.model_loader import preload_models
+
+    # A single torch thread keeps the master from starting an OpenMP pool,
+    # whose threads would not survive the fork
+    configure_threads(1, force=True)
+
+    failed = preload_models()
+    if failed:
+        server.log.warning(f"Models not preloaded, workers will load them on first use: {', '.join(failed)}")
+
+    if Config.SHARE_MODEL_MEMORY:
+        from models.model_registry import model_registry
+
+        private = model_registry.share_memory()
+        if private:
+            server.log.warning(f"Weights not moved to shared memory, workers share them copy-on-write only: {', '.join(private)}")
+
+    # Move the loaded objects out of the collector's reach so that collections
+    # in the workers do not write to (and un-share) their pages
+    gc.collect()
+    gc.freeze()
+
+def post_fork(server, worker):
+    """
+    Give each worker an equal share of the cores for inference
+    """
+    configure_threads(max(1, available_cpus() // workers), force=True)
+
+def child_exit(server, worker):
+    """
+    Drop a dead worker's live gauges from the aggregated metrics and fail the jobs it was running
+    """
+    from prometheus_client import multiprocess
+    from services.job_queue import fail_orphaned_jobs
+
+    multiprocess.mark_process_dead(worker.pid)
+    fail_orphaned_jobs([worker.pid])
@@ -0,0 +1,198 @@
+from functools import lru_cache
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from utils.metrics import observe_stage
+
+CAPTION_FONT_SIZE = 28
+CAPTION_MAX_LENGTH = 50
+CAPTION_BOTTOM_OFFSET = 60  # Distance from the bottom of the frame to the text
+CAPTION_PADDING = (10, 5)  # Horizontal and vertical padding around the text
+CAPTION_BACKGROUND_ALPHA = 180
+
+
+class CaptionSprite:
+    """
+    A caption rasterized once, ready to be blended into any number of frames
+
+    Stores the premultiplied caption color and the inverse alpha of the region it
+    covers, both in 8-bit fixed point, so blending is out = frame * inv >> 8 + color.
+
+    Args:
+        color (numpy.ndarray): h x w x 3 uint16 premultiplied color
+        inverse_alpha (numpy.ndarray): h x w x 1 uint16 weights in [0, 256]
+        x (int): Left edge of the sprite in the frame
+        y (int): Top edge of the sprite in the frame
+    """
+
+    def __init__(self, color, inverse_alpha, x, y):
+        self.color = color
+        self.inverse_alpha = inverse_alpha
+        self.x = x
+        self.y = y
+
+    def blend(self, frame):
+        """
+        Blend the caption into a height x width x 3 uint8 frame, in place
+
+        Only the caption's bounding box is touched.
+        """
+        frame_height, frame_width = frame.shape[:2]
+        sprite_height, sprite_width = self.color.shape[:2]
+
+        # Clip the sprite to the frame
+        x0, y0 = max(self.x, 0), max(self.y, 0)
+        x1, y1 = min(self.x + sprite_width, frame_width), min(self.y + sprite_height, frame_height)
+        if x0 >= x1 or y0 >= y1:
+            return frame
+
+        sx0, sy0 = x0 - self.x, y0 - self.y
+        sx1, sy1 = sx0 + (x1 - x0), sy0 + (y1 - y0)
+
+        region = frame[y0:y1, x0:x1]
+        blended = region * self.inverse_alpha[sy0:sy1, sx0:sx1]
+        blended >>= 8
+        blended += self.color[sy0:sy1, sx0:sx1]
+        np.minimum(blended, 255, out=blended)
+        region[...] = blended
+
+        return frame
+
+@lru_cache(maxsize=8)
+def load_font(size=CAPTION_FONT_SIZE):
+    """
+    Load Arial once per size, using the default font if it is missing
+    """
+    try:
+        return ImageFont.truetype("arial.ttf", size)
+    except OSError:
+        return ImageFont.load_default()
+
+def caption_text(text):
+    """
+    Return the caption shown for a prompt, truncated to fit on one line
+    """
+    return text[:CAPTION_MAX_LENGTH] + "..." if len(text) > CAPTION_MAX_LENGTH else text
+
+@lru_cache(maxsize=256)
+def render_caption_sprite(text, frame_width, frame_height, font_size=CAPTION_FONT_SIZE):
+    """
+    Rasterize a caption into a cached sprite
+
+    The caption is white text centered near the bottom of the frame on a
+    semi-transparent black box.
+
+    Args:
+        text (str): The caption text
+        frame_width (int): Width of the frames the caption goes on
+        frame_height (int): Height of the frames the caption goes on
+        font_size (int): Font size in points
+
+    Returns:
+        CaptionSprite: The rasterized caption
+    """
+    font = load_font(font_size)
+    probe = ImageDraw.Draw(Image.new('L', (1, 1)))
+
+    # Calculate text width and position (centered at bottom with padding)
+    text_width = probe.textlength(text, font=font)
+    text_position = ((frame_width - text_width) // 2, frame_height - CAPTION_BOTTOM_OFFSET)
+    left, top, right, bottom = probe.textbbox(text_position, text, font=font)
+
+    pad_x, pad_y = CAPTION_PADDING
+    x, y = int(left - pad_x), int(top - pad_y)
+    sprite_width, sprite_height = int(right + pad_x) - x, int(bottom + pad_y) - y
+
+    # Antialiased text coverage, drawn at the text's offset within the sprite
+    mask_image = Image.new('L', (sprite_width, sprite_height), 0)
+    ImageDraw.Draw(mask_image).text((text_position[0] - x, text_position[1] - y), text, font=font, fill=255)
+    coverage = np.asarray(mask_image, dtype=np.float32)[..., None] / 255
+
+    # White text over a black box: the box keeps (1 - box alpha) of the frame and the
+    # text replaces a further share of what is left with white
+    background_alpha = CAPTION_BACKGROUND_ALPHA / 255
+    inverse_alpha = np.rint((1 - background_alpha) * (1 - coverage) * 256).astype(np.uint16)
+    color = np.rint(np.repeat(coverage, 3, axis=2) * 255).astype(np.uint16)
+
+    return CaptionSprite(color, inverse_alpha, x, y)
+
+def burn_captions(frames, text):
+    """
+    Burn a caption into each frame, in place
+
+    A frame that appears more than once in the list is only captioned once.
+
+    Args:
+        frames (list): height x width x 3 uint8 frames
+        text (str): The prompt text; it is truncated to the caption length
+
+    Returns:
+        list: The same frames, captioned
+    """
+    seen = set()
+    for frame in frames:
+        if id(frame) in seen:
+            continue
+        seen.add(id(frame))
+        height, width = frame.shape[:2]
+        render_caption_sprite(caption_text(text), width, height).blend(frame)
+    return frames
+
+def _vtt_timestamp(seconds):
+    hours, remainder = divmod(seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f"{int(hours):02d}:{int(minutes):02d}:{seconds:06.3f}"
+
+def write_webvtt(cues, output_path):
+    """
+    Write captions as a WebVTT file
+
+    Args:
+        cues (list): (start seconds, end seconds, text) tuples
+        output_path (str): Path to save the .vtt file
+
+    Returns:
+        str: Path to the WebVTT file
+    """
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write("WEBVTT\n\n")
+        for start, end, text in cues:
+            f.write(f"{_vtt_timestamp(start)} --> {_vtt_timestamp(end)}\n{text}\n\n")
+    return output_path
+
+def subtitle_output_args(input_index):
+    """
+    Return the ffmpeg options that add a subtitle input as an MP4 mov_text track
+    """
+    return [
+        '-map', f'{input_index}:s:0',
+        '-c:s', 'mov_text',
+        '-metadata:s:s:0', 'language=eng',
+    ]
+
+def replace_caption_track(video_path, subtitle_path, output_path):
+    """
+    Swap the caption track of a video without re-encoding its audio or video
+
+    Args:
+        video_path (str): Video with soft captions (or none)
+        subtitle_path (str): New WebVTT captions
+        output_path (str): Path to save the updated video
+
+    Returns:
+        str: Path to the updated video
+    """
+    from models.video_encoder import run_ffmpeg
+
+    with observe_stage('mux'):
+        run_ffmpeg([
+            'ffmpeg', '-y', '-loglevel', 'error',
+            '-i', video_path,
+            '-i', subtitle_path,
+            '-map', '0:v',
+            '-map', '0:a?',
+            '-c', 'copy',
+            *subtitle_output_args(1),
+            '-movflags', '+faststart',
+            output_path
+        ], 'remux')
+    return output_path
\ No newline at end of file
@@ -0,0 +1,308 @@
+import queue
+import threading
+import time
+from concurrent.futures import CancelledError, Future
+import numpy as np
+from models.model_loader import get_image_generation_model, get_image_to_image_model, image_model_identity, remote_inference
+from models.inference_client import RemoteDiffusionBatcher
+from models.inference_profile import diffusion_autocast
+from models.keyframe_cache import keyframe_cache, keyframe_cache_key
+from utils.futures import resolve_future
+from utils.metrics import observe_stage, record_cache_lookup
+from config import Config
+
+class KeyframeRequest:
+    """
+    A single seeded text-to-image generation, or an img2img pass when init_image is given
+
+    img2img starts from init_image noised to strength (0-1) and runs only that
+    fraction of the denoising steps. With output_type='latent' the future
+    resolves to the denoised latents (a float32 channels x height/8 x width/8
+    array) instead of a PIL image; latents skip the VAE decode and the keyframe
+    cache. Requests with the same steps, guidance, size, strength and output
+    type can share one pipeline call. on_step, when given, is called as
+    on_step(step, total_steps) after every denoising step of the call that
+    generates the image.
+    """
+
+    def __init__(self, prompt, negative_prompt, seed, num_inference_steps=20, guidance_scale=7.5, height=512, width=512, init_image=None, strength=None, output_type='pil', on_step=None):
+        self.prompt = prompt
+        self.negative_prompt = negative_prompt
+        self.seed = seed
+        self.num_inference_steps = num_inference_steps
+        self.guidance_scale = guidance_scale
+        self.height = height
+        self.width = width
+        self.init_image = init_image
+        self.strength = strength if init_image is not None else None
+        self.output_type = output_type
+        self.on_step = on_step
+        self.future = Future()
+
+    @property
+    def batch_key(self):
+        return (self.num_inference_steps, self.guidance_scale, self.height, self.width, self.strength, self.output_type)
+
+    @property
+    def denoising_steps(self):
+        # img2img skips the first (1 - strength) of the schedule
+        if self.init_image is None:
+            return self.num_inference_steps
+        return min(int(self.num_inference_steps * self.strength), self.num_inference_steps)
+
+    @property
+    def cache_key(self):
+        return keyframe_cache_key(
+            self.prompt,
+            self.negative_prompt,
+            self.seed,
+            self.num_inference_steps,
+            self.guidance_scale,
+            self.height,
+            self.width,
+            image_model_identity(),
+            self.init_image,
+            self.strength
+        )
+
+
+class LatentDecodeRequest:
+    """
+    A VAE decode of one latent array into a PIL image
+
+    Decodes of same-sized latents are batched into VAE calls of up to
+    Config.VAE_DECODE_BATCH images, and latents larger than one VAE tile are
+    decoded tile by tile, so memory stays bounded at any size.
+    """
+
+    on_step = None
+
+    def __init__(self, latents):
+        self.latents = latents
+        self.future = Future()
+
+    @property
+    def batch_key(self):
+        return ('decode', self.latents.shape)
+
+
+class DiffusionBatcher:
+    """
+    Collect keyframe requests from concurrent renders and denoise them together
+
+    A single worker thread owns the diffusion pipeline. It waits up to window_ms
+    after the first request for more to arrive, then runs one batched call per
+    group of compatible requests, with one seeded generator per image so every
+    image matches what a batch-size-1 call with the same seed would produce.
+    Cancelling a request's future drops it from the queue, and a running call
+    stops after the current denoising step once every future in it is cancelled.
+
+    Args:
+        window_ms (int): How long to wait for more requests before running a batch
+        max_batch (int): Maximum number of images per pipeline call
+    """
+
+    def __init__(self, window_ms=50, max_batch=8):
+        self.window_ms = window_ms
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_worker(self):
+        # Started on first use so the thread lives in the serving process
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._worker, name="diffusion-batcher", daemon=True)
+                self._thread.start()
+
+    def submit(self, requests):
+        """
+        Queue keyframe requests for generation
+
+        Requests already in the keyframe cache are resolved immediately and
+        never reach the pipeline.
+
+        Args:
+            requests (list): KeyframeRequest or LatentDecodeRequest objects
+
+        Returns:
+            list: The futures for each request, resolving to a PIL image
+        """
+        for request in requests:
+            if isinstance(request, KeyframeRequest) and request.output_type == 'pil':
+                image = keyframe_cache.get(request.cache_key)
+                record_cache_lookup('keyframe', image is not None)
+                if image is not None:
+                    resolve_future(request.future, image)
+                    continue
+
+            self._ensure_worker()
+            self._queue.put(request)
+
+        return [request.future for request in requests]
+
+    def _collect(self):
+        # Block for the first request, then gather more until the window closes
+        batch = [self._queue.get()]
+        deadline = time.time() + self.window_ms / 1000
+
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _worker(self):
+        while True:
+            batch = self._collect()
+
+            groups = {}
+            for request in batch:
+                groups.setdefault(request.batch_key, []).append(request)
+
+            for requests in groups.values():
+                self._run_batch(requests)
+
+    def _run_batch(self, requests):
+        # Skip requests whose caller gave up waiting before the batch started. The futures
+        # stay pending while the batch runs, so callers can still cancel them
+        requests = [request for request in requests if not request.future.cancelled()]
+        if not requests:
+            return
+
+        if isinstance(requests[0], LatentDecodeRequest):
+            self._run_decode(requests)
+            return
+
+        first = requests[0]
+
+        def on_step_end(pipe, step, timestep, callback_kwargs):
+            # Stop between steps once nobody waits for any image of the batch
+            if all(request.future.cancelled() for request in requests):
+                raise CancelledError()
+
+            # Report denoising progress to every render waiting on this batch
+            for request in requests:
+                if request.on_step is not None:
+                    try:
+                        request.on_step(step + 1, first.denoising_steps)
+                    except Exception as e:
+                        print(f"Error reporting diffusion progress: {str(e)}")
+            return callback_kwargs
+
+        try:
+            import torch
+
+            if first.init_image is not None:
+                pipe = get_image_to_image_model()
+                inputs = {"image": [request.init_image for request in requests], "strength": first.strength}
+            else:
+                pipe = get_image_generation_model()
+                inputs = {"height": first.height, "width": first.width}
+
+            with observe_stage('diffusion'), diffusion_autocast():
+                images = pipe(
+                    prompt=[request.prompt for request in requests],
+                    negative_prompt=[request.negative_prompt for request in requests],
+                    num_inference_steps=first.num_inference_steps,
+                    guidance_scale=first.guidance_scale,
+                    generator=[torch.Generator(device=pipe.device).manual_seed(request.seed) for request in requests],
+                    callback_on_step_end=on_step_end,
+                    output_type=first.output_type,
+                    **inputs
+                ).images
+        except Exception as e:
+            for request in requests:
+                resolve_future(request.future, exception=e)
+            return
+
+        if first.output_type == 'latent':
+            for request, latents in zip(requests, images):
+                resolve_future(request.future, latents.float().cpu().numpy())
+            return
+
+        for request, image in zip(requests, images):
+            try:
+                keyframe_cache.put(request.cache_key, image)
+            except Exception as e:
+                print(f"Error caching keyframe: {str(e)}")
+            resolve_future(request.future, image)
+
+    def _run_decode(self, requests):
+        try:
+            import torch
+
+            pipe = get_image_generation_model()
+            vae = pipe.vae
+            latents = torch.from_numpy(np.stack([request.latents for request in requests]))
+            latents = latents.to(device=vae.device, dtype=vae.dtype) / vae.config.scaling_factor
+
+            # Tiles bound the activation memory of large frames; the CPU profile may have enabled them already
+            decode = vae.tiled_decode if not vae.use_tiling and max(latents.shape[-2:]) > vae.tile_latent_min_size else vae.decode
+
+            images = []
+            with observe_stage('vae_decode'), torch.no_grad(), diffusion_autocast():
+                for start in range(0, len(requests), Config.VAE_DECODE_BATCH):
+                    decoded = decode(latents[start:start + Config.VAE_DECODE_BATCH], return_dict=False)[0]
+                    images.extend(pipe.image_processor.postprocess(decoded, output_type='pil'))
+        except Exception as e:
+            for request in requests:
+                resolve_future(request.future, exception=e)
+            return
+
+        for request, image in zip(requests, images):
+            resolve_future(request.future, image)
+
+
+def chain_keyframes(batcher, requests, strength):
+    """
+    Submit keyframe requests so that each one after the first is an img2img pass over the image before it
+
+    The first request is generated as given. Every later one is submitted when
+    its predecessor finishes, with that image as init_image; it fails or is
+    cancelled along with its predecessor.
+
+    Args:
+        batcher: The diffusion batcher to submit to
+        requests (list): KeyframeRequest objects, in sequence order
+        strength (float): img2img strength of the later requests
+
+    Returns:
+        list: The futures for each request, resolving to a PIL image
+    """
+    def submit_next(previous, request):
+        if previous.cancelled():
+            request.future.cancel()
+        elif previous.exception() is not None:
+            if request.future.set_running_or_notify_cancel():
+                request.future.set_exception(previous.exception())
+        elif not request.future.cancelled():
+            request.init_image = previous.result()
+            request.strength = strength
+            batcher.submit([request])
+
+    for previous, request in zip(requests, requests[1:]):
+        previous.future.add_done_callback(lambda future, request=request: submit_next(future, request))
+
+    batcher.submit(requests[:1])
+    return [request.future for request in requests]
+
+def create_diffusion_batcher():
+    """
+    Return the batcher for Config.INFERENCE_BACKEND: in-process, or forwarding to the inference servers
+    """
+    if Config.INFERENCE_BACKEND not in ('local', 'remote'):
+        raise ValueError(f"Unknown inference backend '{Config.INFERENCE_BACKEND}'")
+    if remote_inference():
+        return RemoteDiffusionBatcher()
+    return DiffusionBatcher(Config.DIFFUSION_BATCH_WINDOW_MS, Config.DIFFUSION_MAX_BATCH)
+
+
+# Shared batcher; all Stable Diffusion calls in this process go through it
+diffusion_batcher = create_diffusion_batcher()
\ No newline at end of file
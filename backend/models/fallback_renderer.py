@@ -0,0 +1,122 @@
+from functools import lru_cache
+import numpy as np
+from PIL import Image, ImageDraw
+from models.captions import load_font
+
+FALLBACK_BACKGROUND = (25, 25, 50)
+FALLBACK_TITLE = "Video Generation"
+FALLBACK_LINE_LENGTH = 40
+DOT_RADIUS = 15
+DOT_COLORS = [(255, 200, 0), (0, 200, 255), (200, 0, 255), (0, 255, 100), (255, 100, 100)]
+# Flat colors and simple motion compress well even with the fastest settings
+FALLBACK_OUTPUT_ARGS = [
+    '-c:v', 'libx264',
+    '-preset', 'veryfast',
+    '-tune', 'animation',
+    '-crf', '23',
+    '-pix_fmt', 'yuv420p',
+    '-movflags', '+faststart',
+]
+
+
+def _wrap_prompt(text):
+    # Split long lines into lines of at most FALLBACK_LINE_LENGTH characters
+    lines = []
+    for line in text.split('\n'):
+        if len(line) <= FALLBACK_LINE_LENGTH:
+            lines.append(line)
+            continue
+
+        current_line = ""
+        for word in line.split():
+            if len(current_line + " " + word) <= FALLBACK_LINE_LENGTH:
+                current_line += " " + word if current_line else word
+            else:
+                lines.append(current_line)
+                current_line = word
+        if current_line:
+            lines.append(current_line)
+    return lines
+
+def render_fallback_background(width, height, text):
+    """
+    Draw the static part of a fallback frame: the background, title and prompt text
+
+    Args:
+        width (int): Frame width in pixels
+        height (int): Frame height in pixels
+        text (str): The prompt text
+
+    Returns:
+        numpy.ndarray: height x width x 3 uint8 frame
+    """
+    img = Image.new('RGB', (width, height), color=FALLBACK_BACKGROUND)
+    draw = ImageDraw.Draw(img)
+    font = load_font(30)
+    small_font = load_font(20)
+
+    # Position the title in the center
+    text_width = draw.textlength(FALLBACK_TITLE, font=font)
+    draw.text(((width - text_width) // 2, height // 2 - 50), FALLBACK_TITLE, fill=(255, 255, 255), font=font)
+
+    # Add the prompt text below it
+    y_offset = height // 2 + 20
+    for line in _wrap_prompt(text):
+        prompt_width = draw.textlength(line, font=small_font)
+        draw.text(((width - prompt_width) // 2, y_offset), line, fill=(200, 200, 255), font=small_font)
+        y_offset += 25
+
+    return np.array(img)
+
+@lru_cache(maxsize=1)
+def _dot_mask():
+    size = 2 * DOT_RADIUS + 1
+    mask = Image.new('L', (size, size), 0)
+    ImageDraw.Draw(mask).ellipse((0, 0, size - 1, size - 1), fill=255)
+    return np.asarray(mask) > 0
+
+def _draw_dot(frame, x, y, color):
+    # Paint the disc centered at (x, y), clipped to the frame
+    mask = _dot_mask()
+    height, width = frame.shape[:2]
+    x0, y0 = x - DOT_RADIUS, y - DOT_RADIUS
+    cx0, cy0 = max(x0, 0), max(y0, 0)
+    cx1, cy1 = min(x0 + mask.shape[1], width), min(y0 + mask.shape[0], height)
+    if cx0 >= cx1 or cy0 >= cy1:
+        return
+
+    region = frame[cy0:cy1, cx0:cx1]
+    region[mask[cy0 - y0:cy1 - y0, cx0 - x0:cx1 - x0]] = color
+
+def fallback_frames(width, height, text, frame_count):
+    """
+    Yield the frames of the fallback animation: dots circling over the prompt text
+
+    The background and text are drawn once; each frame copies them into a
+    single reused buffer and paints only the dots, so a yielded frame is only
+    valid until the next one is requested.
+
+    Args:
+        width (int): Frame width in pixels
+        height (int): Frame height in pixels
+        text (str): The prompt text
+        frame_count (int): Number of frames to produce
+
+    Yields:
+        numpy.ndarray: The next frame
+    """
+    background = render_fallback_background(width, height, text)
+    frame = np.empty_like(background)
+    radius = min(width, height) // 3
+
+    for i in range(frame_count):
+        np.copyto(frame, background)
+
+        angle = (i / frame_count) * 360
+        for j in range(5):  # Multiple circles for more visual interest
+            sub_angle = np.radians(angle + j * 72)  # Distribute evenly
+            x = width // 2 + int(radius * np.cos(sub_angle))
+            y = height // 2 + int(radius * np.sin(sub_angle))
+            _draw_dot(frame, x, y, DOT_COLORS[j % len(DOT_COLORS)])
+
+        yield frame
\ No newline at end of file
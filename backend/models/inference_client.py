@@ -0,0 +1,231 @@
+import itertools
+import os
+import secrets
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
+import numpy as np
+from PIL import Image
+from utils.futures import resolve_future
+from utils.shared_arrays import discard_arrays, receive_array, receive_arrays, share_array
+from config import Config
+
+# KeyframeRequest attributes sent to the inference server; init_image goes through shared memory
+KEYFRAME_FIELDS = ('prompt', 'negative_prompt', 'seed', 'num_inference_steps', 'guidance_scale', 'height', 'width', 'strength', 'output_type')
+
+_addresses = itertools.cycle(Config.INFERENCE_SOCKETS)
+_addresses_lock = threading.Lock()
+
+
+class InferenceError(Exception):
+    """
+    Raised when the inference server cannot be reached or a model call on it fails
+    """
+
+
+def inference_authkey(create=False):
+    """
+    Return the key inference connections are authenticated with
+
+    The key is Config.INFERENCE_AUTHKEY when set, otherwise the contents of
+    Config.INFERENCE_AUTHKEY_FILE. With create=True, as the server calls it, a
+    random key is first written to that file, readable by this user only, if
+    it does not exist yet.
+
+    Raises:
+        InferenceError: If there is no key; connections are never unauthenticated
+    """
+    if Config.INFERENCE_AUTHKEY:
+        return Config.INFERENCE_AUTHKEY.encode('utf-8')
+
+    path = Config.INFERENCE_AUTHKEY_FILE
+    if create and not os.path.exists(path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Write the key under a temporary name and link it into place, so concurrently
+        # starting servers agree on one key and nobody reads a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            f.write(secrets.token_hex(32))
+        try:
+            os.link(tmp_path, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp_path)
+
+    try:
+        with open(path, 'r') as f:
+            key = f.read().strip()
+    except OSError:
+        key = ''
+    if not key:
+        raise InferenceError(f"No inference authkey: set INFERENCE_AUTHKEY or start an inference server to create {path}")
+    return key.encode('utf-8')
+
+def connect():
+    """
+    Open a connection to the next inference server, round-robin over Config.INFERENCE_SOCKETS
+
+    Returns:
+        multiprocessing.connection.Connection: The connection
+    """
+    with _addresses_lock:
+        address = next(_addresses)
+
+    try:
+        return Client(address, family='AF_UNIX', authkey=inference_authkey())
+    except OSError as e:
+        raise InferenceError(f"Inference server at {address} is not reachable: {str(e)}") from e
+
+def unreachable_inference_servers(timeout=2):
+    """
+    Ping every server in Config.INFERENCE_SOCKETS and report the ones that do not answer
+
+    Args:
+        timeout (float): Seconds to wait for each server's answer
+
+    Returns:
+        dict: Error message by socket address, empty when every server answered
+    """
+    errors = {}
+    for address in Config.INFERENCE_SOCKETS:
+        try:
+            with Client(address, family='AF_UNIX', authkey=inference_authkey()) as conn:
+                conn.send({"op": "ping"})
+                if not conn.poll(timeout):
+                    raise InferenceError(f"No answer within {timeout}s")
+                conn.recv()
+        except (OSError, EOFError, AuthenticationError, InferenceError) as e:
+            errors[address] = str(e) or type(e).__name__
+    return errors
+
+
+class RemoteModel:
+    """
+    Stand-in for a model registry model that runs on the inference server
+
+    Calling it calls the server's copy with the same arguments. Arrays in the
+    result come back through shared memory.
+
+    Args:
+        key (str): Model registry key, e.g. 'summarizer' or 'tts'
+    """
+
+    def __init__(self, key):
+        self.key = key
+
+    def __call__(self, *args, **kwargs):
+        with connect() as conn:
+            conn.send({"op": "call", "model": self.key, "args": args, "kwargs": kwargs})
+            message = conn.recv()
+
+            if message[0] == 'error':
+                raise InferenceError(message[2])
+            # Take the arrays before closing; the server frees any left once the connection closes
+            return receive_arrays(message[1])
+
+
+class RemoteDiffusionBatcher:
+    """
+    Drop-in for DiffusionBatcher that generates keyframes on the inference server
+
+    Every submit() opens one connection. A reader thread reports denoising
+    steps to the requests' on_step callbacks and resolves their futures as
+    images (or latents) arrive. The futures stay pending until then, and
+    cancelling one tells the server, which drops the request or stops its
+    batch between steps like the local batcher. Batching and the keyframe
+    cache live on the server, so requests from every API worker share them.
+    """
+
+    def submit(self, requests):
+        """
+        Send keyframe requests to the inference server
+
+        Args:
+            requests (list): KeyframeRequest or LatentDecodeRequest objects
+
+        Returns:
+            list: The futures for each request, resolving to a PIL image
+        """
+        futures = [request.future for request in requests]
+        requests = [request for request in requests if not request.future.cancelled()]
+        if not requests:
+            return futures
+
+        from models.diffusion_batcher import LatentDecodeRequest
+
+        params = []
+        for request in requests:
+            if isinstance(request, LatentDecodeRequest):
+                params.append({"latents": share_array(request.latents)})
+                continue
+            fields = {field: getattr(request, field) for field in KEYFRAME_FIELDS}
+            if request.init_image is not None:
+                fields["init_image"] = share_array(np.asarray(request.init_image))
+            params.append(fields)
+
+        try:
+            conn = connect()
+            conn.send({"op": "keyframes", "requests": params})
+        except Exception as e:
+            discard_arrays(params)
+            for request in requests:
+                resolve_future(request.future, exception=e)
+            return futures
+
+        # Cancels are sent from whichever thread cancels, while the reader thread receives
+        send_lock = threading.Lock()
+
+        def on_done(future, index):
+            if not future.cancelled():
+                return
+            with send_lock:
+                if conn.closed:
+                    return
+                try:
+                    conn.send({"op": "cancel", "index": index})
+                except OSError:
+                    pass
+
+        for index, request in enumerate(requests):
+            request.future.add_done_callback(lambda future, index=index: on_done(future, index))
+
+        threading.Thread(target=self._receive, args=(conn, send_lock, requests, params), name="inference-client", daemon=True).start()
+        return futures
+
+    def _receive(self, conn, send_lock, requests, params):
+        pending = len(requests)
+        try:
+            while pending:
+                message = conn.recv()
+                request = requests[message[1]]
+
+                if message[0] == 'step':
+                    if request.on_step is not None:
+                        try:
+                            request.on_step(message[2], message[3])
+                        except Exception as e:
+                            print(f"Error reporting diffusion progress: {str(e)}")
+                    continue
+
+                pending -= 1
+                if message[0] == 'error':
+                    resolve_future(request.future, exception=InferenceError(message[2]))
+                    continue
+                # Take the block even if the request was cancelled meanwhile, so it is freed
+                result = receive_array(message[2])
+                resolve_future(request.future, Image.fromarray(result) if message[0] == 'image' else result)
+        except EOFError:
+            print("Inference server closed the connection before returning every keyframe")
+        except Exception as e:
+            print(f"Error receiving keyframes from the inference server: {str(e)}")
+        finally:
+            # Closing tells the server every result arrived (or that this side gave up)
+            with send_lock:
+                conn.close()
+            # Free the inputs the server never took, e.g. when it died mid-transfer
+            discard_arrays(params)
+            for request in requests:
+                if not request.future.done():
+                    resolve_future(request.future, exception=InferenceError("Inference server closed the connection before returning the keyframe"))
@@ -0,0 +1,198 @@
+"""
+Inference server: owns the models and runs them for the API processes
+
+With Config.INFERENCE_BACKEND set to 'remote', the API sends keyframe
+generation, summarization and speech synthesis here over a Unix socket, and
+loads no models itself. Images and audio come back through shared memory;
+only small control messages are pickled. Run one or more servers from the
+backend directory, each on its own socket:
+
+    python -m models.inference_server --socket storage/temp/inference.sock
+
+and list the sockets in INFERENCE_SOCKETS for the API. The socket appears
+once the preloaded models are ready. It is only accessible to the user the
+server runs as, and every connection must know the authkey (INFERENCE_AUTHKEY,
+or the key generated into INFERENCE_AUTHKEY_FILE on first start), since
+requests are unpickled.
+"""
+import argparse
+import os
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener
+import numpy as np
+from PIL import Image
+from models.diffusion_batcher import DiffusionBatcher, KeyframeRequest, LatentDecodeRequest
+from models.inference_client import inference_authkey
+from models.model_registry import model_registry
+from utils.shared_arrays import discard_array, discard_arrays, receive_array, share_array, share_arrays
+from config import Config
+
+
+class InferenceServer:
+    """
+    Accept connections from API processes and answer one request per connection
+
+    Every connection is served on its own thread. Keyframe requests from all
+    connections go through one DiffusionBatcher, so concurrent renders are
+    still denoised together; other model calls run one at a time per model.
+
+    Args:
+        address (str): Path of the Unix socket to listen on
+    """
+
+    def __init__(self, address):
+        self.address = address
+        self.batcher = DiffusionBatcher(Config.DIFFUSION_BATCH_WINDOW_MS, Config.DIFFUSION_MAX_BATCH)
+        self._model_locks = {}
+        self._model_locks_lock = threading.Lock()
+
+    def serve_forever(self):
+        """
+        Load the preloaded models, then accept connections until interrupted
+        """
+        failed = model_registry.preload(Config.PRELOAD_MODELS)
+        if failed:
+            print(f"Models not preloaded, they will load on first use: {', '.join(failed)}")
+
+        # A socket left behind by a server that was killed
+        if os.path.exists(self.address):
+            os.remove(self.address)
+        os.makedirs(os.path.dirname(os.path.abspath(self.address)), exist_ok=True)
+
+        with Listener(self.address, family='AF_UNIX', backlog=64, authkey=inference_authkey(create=True)) as listener:
+            # Only this user may connect at all; the authkey is checked on top of that
+            os.chmod(self.address, 0o600)
+            print(f"Inference server listening on {self.address}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except (OSError, EOFError, AuthenticationError) as e:
+                    # A client with the wrong key (or one that hung up) must not stop the server
+                    print(f"Error accepting inference connection: {str(e)}")
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), name="inference-connection", daemon=True).start()
+
+    def _handle(self, conn):
+        try:
+            with conn:
+                message = conn.recv()
+                if message["op"] == "keyframes":
+                    self._keyframes(conn, message["requests"])
+                elif message["op"] == "call":
+                    self._call(conn, message["model"], message["args"], message["kwargs"])
+                elif message["op"] == "ping":
+                    conn.send(("result", None))
+                else:
+                    conn.send(("error", None, f"Unknown operation '{message['op']}'"))
+        except EOFError:
+            pass
+        except Exception as e:
+            print(f"Error serving inference request: {str(e)}")
+
+    def _keyframes(self, conn, params):
+        for request in params:
+            if request.get("init_image") is not None:
+                request["init_image"] = Image.fromarray(receive_array(request["init_image"]))
+            if "latents" in request:
+                request["latents"] = receive_array(request["latents"])
+
+        send_lock = threading.Lock()
+
+        def send(message):
+            # Step reports come from the batcher thread, results from this one
+            with send_lock:
+                conn.send(message)
+
+        def on_step(index, step, total):
+            try:
+                send(("step", index, step, total))
+            except OSError:
+                pass
+
+        requests = [
+            LatentDecodeRequest(request["latents"]) if "latents" in request
+            else KeyframeRequest(**request, on_step=lambda step, total, index=index: on_step(index, step, total))
+            for index, request in enumerate(params)
+        ]
+        # Cancels arrive on the same connection while the results go out
+        cancels = threading.Thread(target=self._receive_cancels, args=(conn, requests), name="inference-cancels", daemon=True)
+        cancels.start()
+        futures = self.batcher.submit(requests)
+
+        sent = []
+        try:
+            for index, future in enumerate(futures):
+                try:
+                    result = future.result()
+                    # Latents are already arrays; images are sent as their pixels
+                    kind = 'latent' if isinstance(result, np.ndarray) else 'image'
+                    shared = share_array(np.asarray(result))
+                except Exception as e:
+                    send(("error", index, f"{type(e).__name__}: {str(e)}"))
+                    continue
+
+                sent.append(shared)
+                send((kind, index, shared))
+
+            # The client closes the connection once it has taken every result
+            cancels.join()
+        finally:
+            # If the client went away, drop its requests still queued or running
+            for future in futures:
+                future.cancel()
+            # and free the results it never took
+            for shared in sent:
+                discard_array(shared)
+
+    def _receive_cancels(self, conn, requests):
+        # Runs until the client closes the connection; a client that goes away cancels everything
+        try:
+            while True:
+                message = conn.recv()
+                if message["op"] == "cancel":
+                    requests[message["index"]].future.cancel()
+        except (EOFError, OSError):
+            pass
+        finally:
+            for request in requests:
+                request.future.cancel()
+
+    def _model_lock(self, key):
+        with self._model_locks_lock:
+            return self._model_locks.setdefault(key, threading.Lock())
+
+    def _call(self, conn, key, args, kwargs):
+        try:
+            # Pipelines are not thread-safe, so connections take turns on each model
+            with self._model_lock(key):
+                output = model_registry.get(key)(*args, **kwargs)
+            result = share_arrays(output)
+        except Exception as e:
+            conn.send(("error", None, f"{type(e).__name__}: {str(e)}"))
+            return
+
+        try:
+            conn.send(("result", result))
+            # The client closes the connection once it has taken the arrays
+            conn.recv()
+        except (EOFError, OSError):
+            pass
+        finally:
+            # Free any array the client never took
+            discard_arrays(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--socket", default=Config.INFERENCE_SOCKETS[0], help="Unix socket to listen on")
+    args = parser.parse_args()
+
+    try:
+        InferenceServer(args.socket).serve_forever()
+    except KeyboardInterrupt:
+        print("Inference server stopped")
+
+
+if __name__ == "__main__":
+    main()
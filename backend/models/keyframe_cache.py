@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+import threading
+from PIL import Image
+from utils.disk_cache import DiskCacheLimit
+from config import Config
+
+def image_digest(image):
+    """
+    Return the SHA-256 hex digest of an image's size and pixels
+    """
+    digest = hashlib.sha256(f"{image.mode}:{image.width}x{image.height}\n".encode('utf-8'))
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+def keyframe_cache_key(prompt, negative_prompt, seed, num_inference_steps, guidance_scale, height, width, model, init_image=None, strength=None):
+    """
+    Build the cache key of a single seeded diffusion output
+
+    img2img outputs are keyed on the pixels of their init image and the
+    strength as well; text-to-image keys are unchanged by those arguments.
+
+    Returns:
+        str: Hex SHA-256 digest of every input that determines the image
+    """
+    inputs = {
+        "prompt": prompt,
+        "negativePrompt": negative_prompt,
+        "seed": seed,
+        "steps": num_inference_steps,
+        "guidance": guidance_scale,
+        "size": [width, height],
+        "model": model,
+    }
+    if init_image is not None:
+        inputs["init"] = image_digest(init_image)
+        inputs["strength"] = strength
+    payload = json.dumps(inputs, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class KeyframeCache:
+    """
+    Persistent cache of generated keyframes, shared by every render on the host
+
+    Images are stored as lossless PNGs so a cache hit is identical to a fresh
+    generation. Reads refresh a file's modification time, and the least recently
+    used files are deleted once the cache grows past its size limit.
+
+    Args:
+        cache_dir (str): Directory holding the cached images
+        max_bytes (int): Size limit of the cache directory, 0 for no limit
+    """
+
+    def __init__(self, cache_dir, max_bytes=0):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._limit = DiskCacheLimit(cache_dir, max_bytes, ('.png',))
+
+    def _path(self, key):
+        # Fan out into subdirectories so no single directory grows too large
+        return os.path.join(self.cache_dir, key[:2], f"{key}.png")
+
+    def get(self, key):
+        """
+        Return the cached image for a key, or None on a miss
+        """
+        path = self._path(key)
+        try:
+            with Image.open(path) as image:
+                image.load()
+                self._limit.touch(path)
+                return image.convert('RGB')
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, image):
+        """
+        Store an image under a key and evict old entries if over the size limit
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temporary file first so readers never see a partial image
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        image.save(tmp_path, format='PNG', compress_level=6)
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+
+        self._limit.added(size)
+
+
+# Shared keyframe cache consulted before any diffusion call
+keyframe_cache = KeyframeCache(Config.KEYFRAME_CACHE_DIR, Config.KEYFRAME_CACHE_MAX_MB * 2**20)
\ No newline at end of file
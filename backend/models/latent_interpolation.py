@@ -0,0 +1,128 @@
+import threading
+import numpy as np
+from models.diffusion_batcher import LatentDecodeRequest
+
+def slerp(t, v0, v1, dot_threshold=0.9995):
+    """
+    Spherically interpolate between two latent arrays
+
+    Denoised latents sit near a shell of constant norm; a straight line between
+    two of them cuts inside it and decodes to a washed-out double exposure,
+    while the arc stays on it. Nearly parallel inputs fall back to a linear blend.
+
+    Args:
+        t (float): Position between v0 (0) and v1 (1)
+        v0 (numpy.ndarray): Latents at t = 0
+        v1 (numpy.ndarray): Latents at t = 1, same shape as v0
+        dot_threshold (float): Cosine above which the inputs count as parallel
+
+    Returns:
+        numpy.ndarray: The interpolated latents, float32
+    """
+    v0 = np.asarray(v0, dtype=np.float32)
+    v1 = np.asarray(v1, dtype=np.float32)
+
+    norms = np.linalg.norm(v0) * np.linalg.norm(v1)
+    dot = float(np.vdot(v0, v1) / norms) if norms else 1.0
+    if abs(dot) > dot_threshold:
+        return ((1 - t) * v0 + t * v1).astype(np.float32)
+
+    theta = np.arccos(dot)
+    sin_theta = np.sin(theta)
+    return ((np.sin((1 - t) * theta) / sin_theta) * v0 + (np.sin(t * theta) / sin_theta) * v1).astype(np.float32)
+
+def anchor_indices(num_frames, num_anchors):
+    """
+    Return the keyframe indices that are denoised, spread evenly and always including the first and last
+    """
+    num_anchors = max(2, min(num_anchors, num_frames))
+    return sorted({round(i * (num_frames - 1) / (num_anchors - 1)) for i in range(num_anchors)})
+
+def keyframe_latents(anchors, anchor_latents, num_frames):
+    """
+    Return the latents of every keyframe, slerped between the anchors on either side of it
+
+    Args:
+        anchors (list): Sorted keyframe indices of the anchors
+        anchor_latents (list): Denoised latents of each anchor
+        num_frames (int): Number of keyframes
+
+    Returns:
+        list: One latent array per keyframe
+    """
+    if len(anchors) == 1:
+        return [anchor_latents[0]] * num_frames
+
+    latents = []
+    for index in range(num_frames):
+        segment = min(int(np.searchsorted(anchors, index, side='right')) - 1, len(anchors) - 2)
+        start, end = anchors[segment], anchors[segment + 1]
+        latents.append(slerp((index - start) / (end - start), anchor_latents[segment], anchor_latents[segment + 1]))
+    return latents
+
+def interpolate_latent_keyframes(batcher, requests, num_anchors):
+    """
+    Generate keyframes by denoising a few anchors and slerping the latents between them
+
+    Only the anchor requests run the UNet. Every keyframe, anchors included, is
+    then decoded from its latents by the VAE. The seeds and progress callbacks of
+    the anchors are those of the requests at their indices; the other requests
+    are not submitted. A failed or cancelled anchor fails or cancels every keyframe,
+    and once every keyframe future is cancelled (or resolved) the anchors still
+    denoising are cancelled too, so the batcher stops spending steps on them.
+
+    Args:
+        batcher: The diffusion batcher to submit to
+        requests (list): KeyframeRequest objects, one per keyframe in sequence order
+        num_anchors (int): How many keyframes to denoise, at least 2
+
+    Returns:
+        list: The futures for each keyframe, resolving to a PIL image
+    """
+    anchors = anchor_indices(len(requests), num_anchors)
+    anchor_requests = [requests[index] for index in anchors]
+    for request in anchor_requests:
+        request.output_type = 'latent'
+
+    decodes = [LatentDecodeRequest(None) for _ in requests]
+    remaining = [len(anchor_requests)]
+    lock = threading.Lock()
+
+    def on_anchor_done(future):
+        if future.cancelled() or future.exception() is not None:
+            for decode in decodes:
+                if decode.future.done():
+                    continue
+                if future.cancelled():
+                    decode.future.cancel()
+                elif decode.future.set_running_or_notify_cancel():
+                    decode.future.set_exception(future.exception())
+            return
+
+        # Decode once every anchor has its latents
+        with lock:
+            remaining[0] -= 1
+            if remaining[0] > 0:
+                return
+
+        latents = keyframe_latents(anchors, [request.future.result() for request in anchor_requests], len(decodes))
+        pending = []
+        for decode, frame_latents in zip(decodes, latents):
+            if not decode.future.done():
+                decode.latents = frame_latents
+                pending.append(decode)
+        batcher.submit(pending)
+
+    def on_decode_done(future):
+        # Nobody waits for the anchors once no keyframe is pending
+        if future.cancelled() and all(decode.future.done() for decode in decodes):
+            for request in anchor_requests:
+                request.future.cancel()
+
+    for request in anchor_requests:
+        request.future.add_done_callback(on_anchor_done)
+    for decode in decodes:
+        decode.future.add_done_callback(on_decode_done)
+
+    batcher.submit(anchor_requests)
+    return [decode.future for decode in decodes]
@@ -1,96 +1,162 @@
-import torch
-from transformers import AutoTokenizer, pipeline
-from diffusers import StableDiffusionPipeline, DPMSolverMultistepScheduler
+import threading
+import weakref
+from models.model_registry import model_registry
+from models.inference_client import RemoteModel
+from models.inference_profile import optimize_diffusion_pipeline, optimize_summarizer, profile_identity
 from config import Config
 
-# Cache for loaded models
-_models_cache = {}
+# torch, transformers and diffusers are imported inside the loaders, so importing
+# this module (and the app) stays fast and the heavy imports happen during warm-up
+
+def _weight_loading_kwargs():
+    # safetensors loads faster and without unpickling; None lets the library use them when
+    # the model has them. low_cpu_mem_usage skips the random init of weights that are loaded anyway
+    return {"use_safetensors": Config.USE_SAFETENSORS, "low_cpu_mem_usage": True}
+
+# img2img pipelines built over the loaded image generation pipeline, dropped with it
+_img2img_pipelines = weakref.WeakKeyDictionary()
+_img2img_lock = threading.Lock()
+
+def _load_tts_model():
+    from transformers import pipeline
+
+    print(f"Loading TTS model: {Config.TTS_MODEL}")
+    # Using a TTS pipeline instead of direct model
+    return pipeline("text-to-speech", model=Config.TTS_MODEL, model_kwargs=_weight_loading_kwargs())
+
+def _load_image_generation_model():
+    import torch
+    from diffusers import StableDiffusionPipeline, DPMSolverMultistepScheduler
+
+    print(f"Loading image generation model: {Config.IMAGE_MODEL}")
+
+    # Use CUDA if available
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+
+    # Load the model with optimized settings
+    pipe = StableDiffusionPipeline.from_pretrained(
+        Config.IMAGE_MODEL,
+        torch_dtype=torch.float16 if device == "cuda" else torch.float32,
+        safety_checker=None,  # Disable safety checker for faster generation
+        **_weight_loading_kwargs()
+    )
+
+    # Use DPM-Solver++ scheduler for faster and better quality generation
+    pipe.scheduler = DPMSolverMultistepScheduler.from_config(pipe.scheduler.config)
+    pipe = pipe.to(device)
+
+    # Enable memory efficient attention if using CUDA
+    if device == "cuda":
+        pipe.enable_attention_slicing()
+        # Enable xformers memory efficient attention if available
+        try:
+            pipe.enable_xformers_memory_efficient_attention()
+        except:
+            pass
+
+    # CPU-only speedups, when Config.INFERENCE_PROFILE is 'cpu'
+    return optimize_diffusion_pipeline(pipe)
+
+def _load_text_summarization_model():
+    from transformers import pipeline
+
+    print(f"Loading text summarization model: facebook/bart-large-cnn")
+
+    # Using Facebook's BART model for text summarization
+    summarizer = pipeline("summarization", model="facebook/bart-large-cnn", model_kwargs=_weight_loading_kwargs())
+    return optimize_summarizer(summarizer)
+
+def _load_text_to_video_model():
+    import torch
+    from diffusers import DiffusionPipeline
+
+    print("Loading text-to-video model: damo-vilab/text-to-video-ms-1.7b")
+
+    # Use CUDA if available
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+
+    # Load the text-to-video model
+    pipe = DiffusionPipeline.from_pretrained(
+        "damo-vilab/text-to-video-ms-1.7b",
+        torch_dtype=torch.float16 if device == "cuda" else torch.float32,
+        variant="fp16" if device == "cuda" else None,
+        **_weight_loading_kwargs()
+    )
+    return pipe.to(device)
+
+model_registry.register('tts', _load_tts_model)
+model_registry.register('image_gen', _load_image_generation_model)
+model_registry.register('summarizer', _load_text_summarization_model)
+model_registry.register('text_to_video', _load_text_to_video_model)
+
+def remote_inference():
+    """
+    Return whether the models run on inference servers instead of in this process
+    """
+    return Config.INFERENCE_BACKEND == 'remote'
 
 def get_tts_model():
     """
-    Load and return the text-to-speech model
+    Load and return the text-to-speech model, or a proxy to it with the remote inference backend
     """
-    cache_key = 'tts'
-    if cache_key not in _models_cache:
-        print(f"Loading TTS model: facebook/tts-transformer")
-        # Using a TTS pipeline instead of direct model
-        tts = pipeline("text-to-speech", model="facebook/tts-transformer")
-        _models_cache[cache_key] = tts
-    
-    return _models_cache[cache_key]
+    if remote_inference():
+        return RemoteModel('tts')
+    return model_registry.get('tts')
 
 def get_image_generation_model():
     """
     Load and return the image generation model
     """
-    cache_key = 'image_gen'
-    if cache_key not in _models_cache:
-        print(f"Loading image generation model: stabilityai/stable-diffusion-2-1")
-        
-        # Use CUDA if available
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        
-        # Using Stability AI's Stable Diffusion 2.1 for high-quality image generation
-        model_id = "stabilityai/stable-diffusion-2-1"
-        
-        # Load the model with optimized settings
-        pipe = StableDiffusionPipeline.from_pretrained(
-            model_id,
-            torch_dtype=torch.float16 if device == "cuda" else torch.float32,
-            safety_checker=None  # Disable safety checker for faster generation
-        )
-        
-        # Use DPM-Solver++ scheduler for faster and better quality generation
-        pipe.scheduler = DPMSolverMultistepScheduler.from_config(pipe.scheduler.config)
-        pipe = pipe.to(device)
-        
-        # Enable memory efficient attention if using CUDA
-        if device == "cuda":
-            pipe.enable_attention_slicing()
-            # Enable xformers memory efficient attention if available
-            try:
-                pipe.enable_xformers_memory_efficient_attention()
-            except:
-                pass
-        
-        _models_cache[cache_key] = pipe
-    
-    return _models_cache[cache_key]
+    return model_registry.get('image_gen')
 
-def get_text_summarization_model():
+def get_image_to_image_model():
+    """
+    Return an img2img pipeline that shares the components of the image generation model
+
+    No weights are loaded or copied; both pipelines run the same UNet, VAE and
+    text encoder, with the CPU profile optimizations already applied to them.
+    """
+    pipe = get_image_generation_model()
+    with _img2img_lock:
+        img2img = _img2img_pipelines.get(pipe)
+        if img2img is None:
+            from diffusers import StableDiffusionImg2ImgPipeline
+
+            img2img = _img2img_pipelines[pipe] = StableDiffusionImg2ImgPipeline.from_pipe(pipe)
+    return img2img
+
+def image_model_identity():
     """
-    Load and return the text summarization model
+    Return a string identifying the weights and sampler behind get_image_generation_model
+
+    Cached outputs are keyed on this, so it changes whenever the images would.
     """
-    cache_key = 'summarizer'
-    if cache_key not in _models_cache:
-        print(f"Loading text summarization model: facebook/bart-large-cnn")
-        
-        # Using Facebook's BART model for text summarization
-        summarizer = pipeline("summarization", model="facebook/bart-large-cnn")
-        _models_cache[cache_key] = summarizer
-    
-    return _models_cache[cache_key]
+    return f"{Config.IMAGE_MODEL}:dpmsolver++{profile_identity()}"
 
+def get_text_summarization_model():
+    """
+    Load and return the text summarization model, or a proxy to it with the remote inference backend
+    """
+    if remote_inference():
+        return RemoteModel('summarizer')
+    return model_registry.get('summarizer')
 
 def get_text_to_video_model():
     """
     Load and return the text-to-video model from Hugging Face
     """
-    cache_key = 'text_to_video'
-    if cache_key not in _models_cache:
-        print("Loading text-to-video model: damo-vilab/text-to-video-ms-1.7b")
-        
-        # Use CUDA if available
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        
-        # Load the text-to-video model
-        pipe = DiffusionPipeline.from_pretrained(
-            "damo-vilab/text-to-video-ms-1.7b", 
-            torch_dtype=torch.float16 if device == "cuda" else torch.float32,
-            variant="fp16" if device == "cuda" else None
-        )
-        pipe = pipe.to(device)
-        
-        _models_cache[cache_key] = pipe
-    
-    return _models_cache[cache_key]
\ No newline at end of file
+    return model_registry.get('text_to_video')
+
+def preload_models():
+    """
+    Load the models listed in Config.PRELOAD_MODELS so the first request does not pay for it
+
+    Nothing is loaded with the remote inference backend; the inference servers
+    preload the models instead.
+
+    Returns:
+        list: Keys of the models that failed to load
+    """
+    if remote_inference():
+        return []
+    return model_registry.preload(Config.PRELOAD_MODELS)
\ No newline at end of file
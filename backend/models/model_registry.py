@@ -0,0 +1,220 @@
+import gc
+import sys
+import threading
+import time
+from collections import OrderedDict
+from utils.metrics import observe_stage
+from config import Config
+
+def _torch_modules(model):
+    # diffusers pipelines hold their modules as components, transformers pipelines as model
+    if hasattr(model, 'components'):
+        modules = list(model.components.values())
+    elif hasattr(model, 'model'):
+        modules = [model.model]
+    else:
+        modules = [model]
+    return [module for module in modules if hasattr(module, 'parameters')]
+
+def estimate_model_bytes(model):
+    """
+    Estimate the memory held by a model's weights
+
+    Works for diffusers pipelines (via their components), transformers pipelines
+    (via their model) and plain torch modules.
+
+    Args:
+        model: The loaded model or pipeline
+
+    Returns:
+        int: Approximate size in bytes, or 0 if it cannot be determined
+    """
+    total = 0
+    seen = set()
+    for module in _torch_modules(model):
+        tensors = list(module.parameters())
+        if hasattr(module, 'buffers'):
+            tensors.extend(module.buffers())
+        for tensor in tensors:
+            if id(tensor) in seen:
+                continue
+            seen.add(id(tensor))
+            total += tensor.numel() * tensor.element_size()
+
+    return total
+
+def share_model_memory(model):
+    """
+    Move a model's weights into shared memory, so forked processes map the same pages
+
+    Inherited private memory is only shared copy-on-write, and any write in a
+    child (or the parent) copies the page. Shared memory is never copied.
+    Needs as much space in /dev/shm as the weights take. Dynamically quantized
+    layers keep their packed weights outside the parameters, so those stay private.
+
+    Args:
+        model: The loaded model or pipeline
+    """
+    for module in _torch_modules(model):
+        if hasattr(module, 'share_memory'):
+            module.share_memory()
+
+def _release_memory():
+    # Give freed weights back to the allocator (and the GPU, if one is in use)
+    gc.collect()
+    torch = sys.modules.get('torch')
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of loaded models with least-recently-used eviction
+
+    Models are registered by key with a loader function and loaded on first use.
+    When the combined size of the loaded models exceeds the memory budget, the
+    least recently used models are dropped.
+
+    Args:
+        memory_budget_bytes (int): Maximum combined model size, 0 for no limit
+    """
+
+    def __init__(self, memory_budget_bytes=0):
+        self.memory_budget_bytes = memory_budget_bytes
+        self._loaders = {}
+        self._models = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    def register(self, key, loader):
+        """
+        Register a loader function for a model key
+
+        Args:
+            key (str): The model key
+            loader (callable): Function with no arguments that returns the loaded model
+        """
+        with self._lock:
+            self._loaders[key] = loader
+            self._load_locks.setdefault(key, threading.Lock())
+
+    def get(self, key):
+        """
+        Return the model for a key, loading it if needed
+
+        Args:
+            key (str): The model key
+
+        Returns:
+            The loaded model
+        """
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                return self._models[key]
+            if key not in self._loaders:
+                raise KeyError(f"No model registered for '{key}'")
+            load_lock = self._load_locks[key]
+
+        # Only one thread loads a given model; the others wait and reuse it
+        with load_lock:
+            with self._lock:
+                if key in self._models:
+                    self._models.move_to_end(key)
+                    return self._models[key]
+                loader = self._loaders[key]
+
+            print(f"Loading model '{key}'...")
+            start_time = time.time()
+            with observe_stage('model_load'):
+                model = loader()
+            size = estimate_model_bytes(model)
+            print(f"Loaded model '{key}' ({size / 2**20:.0f} MB) in {time.time() - start_time:.1f}s")
+
+            with self._lock:
+                self._models[key] = model
+                self._sizes[key] = size
+                self._enforce_budget(keep=key)
+
+        return model
+
+    def _enforce_budget(self, keep):
+        # Evict least recently used models until the loaded set fits the budget
+        if not self.memory_budget_bytes:
+            return
+
+        evicted = []
+        for key in list(self._models):
+            if sum(self._sizes.values()) <= self.memory_budget_bytes:
+                break
+            if key == keep:
+                continue
+            del self._models[key]
+            del self._sizes[key]
+            evicted.append(key)
+
+        if evicted:
+            print(f"Evicted models to stay under memory budget: {', '.join(evicted)}")
+            _release_memory()
+
+    def evict(self, key):
+        """
+        Drop a loaded model so its memory can be reclaimed
+        """
+        with self._lock:
+            if key not in self._models:
+                return
+            del self._models[key]
+            del self._sizes[key]
+        _release_memory()
+
+    def preload(self, keys):
+        """
+        Load a list of models ahead of the first request
+
+        Args:
+            keys (list): Model keys to load; failures are logged and skipped
+
+        Returns:
+            list: Keys of the models that failed to load
+        """
+        failed = []
+        for key in keys:
+            try:
+                self.get(key)
+            except Exception as e:
+                print(f"Error preloading model '{key}': {str(e)}")
+                failed.append(key)
+        return failed
+
+    def share_memory(self):
+        """
+        Move the weights of every loaded model into shared memory, ahead of forking worker processes
+
+        Returns:
+            list: Keys of the models whose weights could not be moved; they stay private memory
+        """
+        failed = []
+        with self._lock:
+            for key, model in self._models.items():
+                try:
+                    share_model_memory(model)
+                except Exception as e:
+                    print(f"Error moving model '{key}' to shared memory: {str(e)}")
+                    failed.append(key)
+        return failed
+
+    def loaded_models(self):
+        """
+        Return the loaded model keys and their estimated sizes in bytes
+
+        Returns:
+            dict: Model key to size in bytes, least recently used first
+        """
+        with self._lock:
+            return {key: self._sizes[key] for key in self._models}
+
+
+# Shared registry used by every model call site
+model_registry = ModelRegistry(Config.MODEL_MEMORY_BUDGET_MB * 2**20)
\ No newline at end of file
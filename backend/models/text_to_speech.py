@@ -1,21 +1,250 @@
+import hashlib
 import os
-from gtts import gTTS
+import re
+import shutil
+import threading
+import wave
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from models.video_encoder import run_ffmpeg
+from utils.disk_cache import DiskCacheLimit
+from utils.metrics import record_cache_lookup
+from config import Config
 
-def text_to_speech(text, output_path):
+
+class TTSBackend:
+    """
+    Base class for speech synthesis backends
+
+    Subclasses set a name and the file extension they produce, and implement
+    synthesize() for a single text segment.
+    """
+
+    name = None
+    extension = None
+
+    @property
+    def identity(self):
+        """
+        String identifying the voice; cached audio is keyed on it
+        """
+        return self.name
+
+    def synthesize(self, text, output_path):
+        """
+        Synthesize one text segment to output_path
+        """
+        raise NotImplementedError
+
+    def join(self, segment_paths, output_path):
+        """
+        Concatenate synthesized segments into one file
+        """
+        with open(output_path, 'wb') as out:
+            for path in segment_paths:
+                with open(path, 'rb') as f:
+                    shutil.copyfileobj(f, out)
+
+
+class GTTSBackend(TTSBackend):
+    """
+    Google Text-to-Speech; needs network access for every segment
+
+    MP3 frames can be concatenated byte for byte, the same way gTTS joins its
+    own chunks, so the default join() is used.
+    """
+
+    name = 'gtts'
+    extension = 'mp3'
+
+    def synthesize(self, text, output_path):
+        from gtts import gTTS
+
+        tts = gTTS(text=text, lang='en', slow=False)
+        tts.save(output_path)
+
+
+class WaveBackend(TTSBackend):
+    """
+    Base class for backends that produce PCM WAV segments
+    """
+
+    extension = 'wav'
+
+    def write_wav(self, samples, sampling_rate, output_path):
+        # Convert float samples in [-1, 1] to 16-bit mono PCM
+        samples = np.asarray(samples, dtype=np.float32).reshape(-1)
+        pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype('<i2')
+
+        with wave.open(output_path, 'wb') as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(int(sampling_rate))
+            f.writeframes(pcm.tobytes())
+
+    def join(self, segment_paths, output_path):
+        with wave.open(output_path, 'wb') as out:
+            for i, path in enumerate(segment_paths):
+                with wave.open(path, 'rb') as segment:
+                    if i == 0:
+                        out.setparams(segment.getparams())
+                    out.writeframes(segment.readframes(segment.getnframes()))
+
+
+class LocalTTSBackend(WaveBackend):
+    """
+    On-host synthesis with the transformers text-to-speech model from the model registry
+    """
+
+    name = 'local'
+
+    def __init__(self):
+        # The pipeline is not thread-safe, and TTS_WORKERS threads synthesize segments at once
+        self._lock = threading.Lock()
+
+    @property
+    def identity(self):
+        return f"{self.name}:{Config.TTS_MODEL}"
+
+    def synthesize(self, text, output_path):
+        from models.model_loader import get_tts_model, remote_inference
+
+        if remote_inference():
+            # The inference server serializes calls to its pipeline itself
+            speech = get_tts_model()(text)
+        else:
+            with self._lock:
+                speech = get_tts_model()(text)
+        self.write_wav(speech["audio"], speech["sampling_rate"], output_path)
+
+
+class SilentTTSBackend(WaveBackend):
+    """
+    Deterministic silence sized to the text; for offline tests and benchmarks
     """
-    Convert text to speech using Google Text-to-Speech
-    
+
+    name = 'silent'
+    sampling_rate = 16000
+    seconds_per_character = 0.06
+
+    def synthesize(self, text, output_path):
+        samples = np.zeros(int(len(text) * self.seconds_per_character * self.sampling_rate), dtype=np.float32)
+        self.write_wav(samples, self.sampling_rate, output_path)
+
+
+TTS_BACKENDS = {
+    backend.name: backend
+    for backend in (GTTSBackend, LocalTTSBackend, SilentTTSBackend)
+}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+def get_tts_backend(name=None):
+    """
+    Return the shared instance of a TTS backend
+
+    Args:
+        name (str): Backend name, defaults to Config.TTS_BACKEND
+
+    Returns:
+        TTSBackend: The backend
+    """
+    name = name or Config.TTS_BACKEND
+    if name not in TTS_BACKENDS:
+        raise ValueError(f"Unknown TTS backend '{name}'")
+
+    with _backends_lock:
+        if name not in _backends:
+            _backends[name] = TTS_BACKENDS[name]()
+        return _backends[name]
+
+# Keeps Config.TTS_CACHE_DIR under Config.TTS_CACHE_MAX_MB, dropping the least recently used segments
+_segment_cache_limit = DiskCacheLimit(Config.TTS_CACHE_DIR, Config.TTS_CACHE_MAX_MB * 2**20, ('.mp3', '.wav'))
+
+def split_segments(text):
+    """
+    Split text into sentence segments that are synthesized and cached separately
+    """
+    return [sentence.strip() for sentence in re.split(r'(?<=[.!?])\s+', text.strip()) if sentence.strip()]
+
+def synthesize_segment(backend, text):
+    """
+    Return the path of the cached audio for one segment, synthesizing it on a miss
+
+    Args:
+        backend (TTSBackend): The backend to synthesize with
+        text (str): The segment text
+
+    Returns:
+        str: Path to the segment audio in Config.TTS_CACHE_DIR
+    """
+    key = hashlib.sha256(f"{backend.identity}\n{text}".encode('utf-8')).hexdigest()
+    path = os.path.join(Config.TTS_CACHE_DIR, key[:2], f"{key}.{backend.extension}")
+
+    if os.path.exists(path):
+        record_cache_lookup('tts', True)
+        _segment_cache_limit.touch(path)
+        return path
+
+    record_cache_lookup('tts', False)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # Write to a temporary file first so readers never see partial audio
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    backend.synthesize(text, tmp_path)
+    size = os.path.getsize(tmp_path)
+    os.replace(tmp_path, path)
+    _segment_cache_limit.added(size)
+
+    return path
+
+def text_to_speech(text, output_path, backend=None):
+    """
+    Convert text to speech with the configured TTS backend
+
+    The text is split into sentences that are synthesized in parallel and cached
+    by content, so repeated phrases and re-renders are not synthesized again.
+    The audio is written in the format of output_path's extension; when that is
+    not the backend's own format (backend.extension) it is transcoded with
+    ffmpeg, so callers that can take any format should ask for the backend's.
+
     Args:
         text (str): The text to convert to speech
-        output_path (str): Path to save the generated audio file
+        output_path (str): Path to save the generated audio file; without an
+            extension, the backend's is added
+        backend (TTSBackend): Backend to use, defaults to Config.TTS_BACKEND
+
+    Returns:
+        str: Path to the generated audio file
     """
+    backend = backend or get_tts_backend()
+    extension = os.path.splitext(output_path)[1][1:].lower()
+    if not extension:
+        output_path = f"{output_path}.{backend.extension}"
+        extension = backend.extension
+
     # Make sure the directory exists
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    
-    # Generate speech using gTTS
-    tts = gTTS(text=text, lang='en', slow=False)
-    
-    # Save the audio file
-    tts.save(output_path)
-    
-    return output_path
\ No newline at end of file
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+
+    segments = split_segments(text) or [text]
+    # Synthesize each distinct sentence once; parallel misses on the same text would all run
+    unique_segments = list(dict.fromkeys(segments))
+    with ThreadPoolExecutor(max_workers=min(Config.TTS_WORKERS, len(unique_segments))) as executor:
+        paths = dict(zip(unique_segments, executor.map(lambda segment: synthesize_segment(backend, segment), unique_segments)))
+    segment_paths = [paths[segment] for segment in segments]
+
+    # Assemble the audio in the backend's format, next to the output when it needs transcoding
+    native_path = output_path if extension == backend.extension else f"{output_path}.{os.getpid()}.{threading.get_ident()}.{backend.extension}"
+    if len(segment_paths) == 1:
+        shutil.copyfile(segment_paths[0], native_path)
+    else:
+        backend.join(segment_paths, native_path)
+
+    if native_path != output_path:
+        try:
+            run_ffmpeg(['ffmpeg', '-y', '-loglevel', 'error', '-i', native_path, output_path], 'tts_transcode')
+        finally:
+            os.remove(native_path)
+
+    return output_path
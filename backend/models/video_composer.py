@@ -1,12 +1,125 @@
+import hashlib
+import json
 import os
-import subprocess
-import tempfile
-import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from models.video_encoder import run_ffmpeg
+from models.inference_profile import available_cpus
+from utils.disk_cache import DiskCacheLimit
+from utils.metrics import observe_stage, record_cache_lookup
+from utils.workspace import JobWorkspace, hold_file
+from config import Config
+
+# Encode settings of every segment; they are part of the segment cache key
+SEGMENT_ENCODE_ARGS = [
+    "-c:v", "libx264",
+    "-tune", "stillimage",
+    "-c:a", "aac",
+    "-b:a", "192k",
+    "-pix_fmt", "yuv420p",
+    "-shortest",
+]
+
+# Keeps Config.SEGMENT_CACHE_DIR under Config.SEGMENT_CACHE_MAX_MB, dropping the least recently used segments
+_segment_cache_limit = DiskCacheLimit(Config.SEGMENT_CACHE_DIR, Config.SEGMENT_CACHE_MAX_MB * 2**20, ('.mp4',))
+
+def file_digest(path):
+    """
+    Return the SHA-256 hex digest of a file's contents
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def segment_cache_key(image_path, audio_path):
+    """
+    Build the cache key of an encoded segment from its inputs and encode settings
+
+    Returns:
+        str: Hex SHA-256 digest
+    """
+    payload = json.dumps({
+        "image": file_digest(image_path),
+        "audio": file_digest(audio_path),
+        "encode": SEGMENT_ENCODE_ARGS,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def composer_workers(num_segments):
+    """
+    Return how many segments to encode at once, bounded by Config.COMPOSER_WORKERS or the available CPUs
+    """
+    limit = Config.COMPOSER_WORKERS or available_cpus()
+    return max(1, min(limit, num_segments))
+
+def encode_segment(image_path, audio_path, threads=0, hold=None):
+    """
+    Return the path of the cached video segment for an image and its audio, encoding it on a miss
+
+    Args:
+        image_path (str): Path to the still image
+        audio_path (str): Path to the audio played over it
+        threads (int): x264 threads for the encode, 0 to let ffmpeg decide
+        hold (str): Optional path, e.g. in a job workspace, to link the segment to
+            before it can be evicted from the cache, so it outlives the eviction
+
+    Returns:
+        str: Path to the segment in Config.SEGMENT_CACHE_DIR, or hold when given
+    """
+    key = segment_cache_key(image_path, audio_path)
+    path = os.path.join(Config.SEGMENT_CACHE_DIR, key[:2], f"{key}.mp4")
+
+    if os.path.exists(path):
+        try:
+            held = hold_file(path, hold) if hold else path
+        except FileNotFoundError:
+            # Evicted since the check; encode it again
+            held = None
+        if held is not None:
+            record_cache_lookup('segment', True)
+            _segment_cache_limit.touch(path)
+            return held
+
+    record_cache_lookup('segment', False)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # Encode to a temporary file first so readers never see a partial segment; its name keeps
+    # it out of the cache's size accounting, so the container format is given explicitly
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    cmd = [
+        "ffmpeg", "-y",
+        "-loop", "1",
+        "-i", image_path,
+        "-i", audio_path,
+        *SEGMENT_ENCODE_ARGS,
+        "-threads", str(threads),
+        "-f", "mp4",
+        tmp_path
+    ]
+
+    try:
+        with observe_stage('segment_encode'):
+            run_ffmpeg(cmd, 'segment_encode')
+        size = os.path.getsize(tmp_path)
+        if hold:
+            hold_file(tmp_path, hold)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    _segment_cache_limit.added(size)
+    return hold or path
 
 def create_video_from_images_and_audio(image_paths, audio_paths, output_path, fps=24):
     """
     Create a video from a list of images and audio files using FFmpeg
-    
+
+    Segments are encoded concurrently, and cached by the contents of their
+    inputs, so re-composing a video only encodes the segments that changed.
+
     Args:
         image_paths (list): List of paths to image files
         audio_paths (list): List of paths to audio files
@@ -15,44 +128,31 @@ def create_video_from_images_and_audio(image_paths, audio_paths, output_path, fp
     """
     if len(image_paths) != len(audio_paths):
         raise ValueError("Number of images must match number of audio files")
-    
+
     # Make sure the output directory exists
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    
-    # Create a temporary directory for intermediate files
-    temp_dir = tempfile.mkdtemp()
-    
-    try:
-        # Create segment videos (image + audio)
-        segment_videos = []
-        
-        for i, (img_path, audio_path) in enumerate(zip(image_paths, audio_paths)):
-            segment_output = os.path.join(temp_dir, f"segment_{i}.mp4")
-            
-            # Use FFmpeg to create a video segment from image and audio
-            cmd = [
-                "ffmpeg", "-y",
-                "-loop", "1",
-                "-i", img_path,
-                "-i", audio_path,
-                "-c:v", "libx264",
-                "-tune", "stillimage",
-                "-c:a", "aac",
-                "-b:a", "192k",
-                "-pix_fmt", "yuv420p",
-                "-shortest",
-                segment_output
-            ]
-            
-            subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            segment_videos.append(segment_output)
-        
+
+    # Create a private workspace for intermediate files
+    with JobWorkspace() as workspace:
+        temp_dir = workspace.path
+
+        # Create segment videos (image + audio), sharing the cores between the encodes
+        workers = composer_workers(len(image_paths))
+        threads = max(1, available_cpus() // workers)
+        # Each segment is held in the workspace, so concurrent renders evicting it from
+        # the cache cannot delete it before the concat has read it
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            segment_videos = list(executor.map(
+                lambda args: encode_segment(args[1], args[2], threads, hold=workspace.file(f"segment_{args[0]}.mp4")),
+                zip(range(len(image_paths)), image_paths, audio_paths)
+            ))
+
         # Create a file listing all segments
         concat_file = os.path.join(temp_dir, "concat.txt")
         with open(concat_file, "w") as f:
             for video in segment_videos:
                 f.write(f"file '{video}'\n")
-        
+
         # Concatenate all segments
         cmd = [
             "ffmpeg", "-y",
@@ -60,13 +160,11 @@ def create_video_from_images_and_audio(image_paths, audio_paths, output_path, fp
             "-safe", "0",
             "-i", concat_file,
             "-c", "copy",
+            "-movflags", "+faststart",
             output_path
         ]
-        
-        subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        
-        return output_path
-        
-    finally:
-        # Clean up temporary directory
-        shutil.rmtree(temp_dir)
\ No newline at end of file
+
+        with observe_stage('mux'):
+            run_ffmpeg(cmd, 'concat')
+
+        return output_path
\ No newline at end of file
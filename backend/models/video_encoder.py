@@ -0,0 +1,338 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import numpy as np
+from models.captions import subtitle_output_args
+from utils.metrics import FFMPEG_FAILURES_TOTAL
+
+AUDIO_OUTPUT_ARGS = [
+    '-c:a', 'aac',
+    '-b:a', '192k',
+]
+
+def narration_filter(input_index, duration):
+    """
+    Return a filter graph chain that loops an audio input and trims it to duration
+
+    Args:
+        input_index (int): Index of the audio input in the ffmpeg command
+        duration (float): Length of the output in seconds
+
+    Returns:
+        str: Filter chain producing the [aout] label
+    """
+    # Repeat the narration until it covers the video, then cut it to length
+    return f'[{input_index}:a]aloop=loop=-1:size=2147483647,atrim=duration={duration},asetpts=N/SR/TB[aout]'
+
+def run_ffmpeg(cmd, operation):
+    """
+    Run an ffmpeg command, counting failures by operation
+
+    Args:
+        cmd (list): The ffmpeg command
+        operation (str): Name of the operation for the failure counter
+
+    Returns:
+        subprocess.CompletedProcess: The finished process
+    """
+    try:
+        return subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    except (subprocess.CalledProcessError, OSError):
+        FFMPEG_FAILURES_TOTAL.labels(operation=operation).inc()
+        raise
+
+class FFmpegFrameWriter:
+    """
+    Stream raw RGB frames into an ffmpeg process through its stdin
+
+    Frames are written as they are produced, so memory use does not depend on the
+    number of frames in the video. When an audio track is given it is looped and
+    trimmed to the video duration in the same ffmpeg run, so the final file is
+    produced in a single encode. A subtitle file is added as a soft caption track
+    the same way. Use as a context manager; the video is
+    finalized when the block exits.
+
+    Args:
+        output_path (str): Path to save the encoded video
+        width (int): Frame width in pixels
+        height (int): Frame height in pixels
+        fps (int): Frames per second of the input frames
+        audio_path (str): Optional audio file to mux into the video
+        duration (float): Length of the output in seconds; required with audio_path
+        output_args (list): ffmpeg video output options, defaults to H.264
+        subtitle_path (str): Optional WebVTT file to add as a mov_text caption track
+    """
+
+    DEFAULT_OUTPUT_ARGS = [
+        '-c:v', 'libx264',
+        '-preset', 'medium',
+        '-crf', '23',
+        '-pix_fmt', 'yuv420p',
+        # Put the moov atom first so playback can start from the first byte range
+        '-movflags', '+faststart',
+    ]
+
+    def __init__(self, output_path, width, height, fps, audio_path=None, duration=None, output_args=None, subtitle_path=None):
+        if audio_path and not duration:
+            raise ValueError("duration is required when muxing an audio track")
+
+        self.output_path = output_path
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.audio_path = audio_path
+        self.duration = duration
+        self.output_args = output_args if output_args is not None else self.DEFAULT_OUTPUT_ARGS
+        self.subtitle_path = subtitle_path
+        self.process = None
+
+    def command(self):
+        """
+        Return the ffmpeg command used to encode the stream
+        """
+        cmd = [
+            'ffmpeg', '-y',
+            '-loglevel', 'error',
+            '-f', 'rawvideo',
+            '-pix_fmt', 'rgb24',
+            '-s', f'{self.width}x{self.height}',
+            '-r', str(self.fps),
+            '-i', '-',
+        ]
+
+        # Inputs come first; every option after them applies to the output
+        output = []
+        if self.audio_path or self.subtitle_path:
+            output += ['-map', '0:v:0']
+
+        if self.audio_path:
+            cmd += ['-i', self.audio_path]
+            output += [
+                '-filter_complex', narration_filter(1, self.duration),
+                '-map', '[aout]',
+                *AUDIO_OUTPUT_ARGS,
+            ]
+
+        if self.subtitle_path:
+            cmd += ['-i', self.subtitle_path]
+            output += subtitle_output_args(2 if self.audio_path else 1)
+
+        cmd += output
+        cmd += list(self.output_args)
+
+        if self.duration:
+            cmd += ['-t', str(self.duration)]
+
+        return cmd + [self.output_path]
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.output_path) or '.', exist_ok=True)
+        self.process = subprocess.Popen(
+            self.command(),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE
+        )
+        return self
+
+    def write(self, frame):
+        """
+        Write one frame
+
+        Args:
+            frame (numpy.ndarray): A height x width x 3 uint8 RGB frame
+        """
+        # Hand the frame's buffer to the pipe without an intermediate bytes copy
+        self.process.stdin.write(memoryview(np.ascontiguousarray(frame, dtype=np.uint8)))
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+
+        stderr = self.process.stderr.read()
+        return_code = self.process.wait()
+
+        if return_code != 0:
+            FFMPEG_FAILURES_TOTAL.labels(operation='encode').inc()
+        if exc_type is None and return_code != 0:
+            raise subprocess.CalledProcessError(return_code, self.command(), stderr=stderr)
+        return False
+
+def interpolate_frames(keyframes, frame_count):
+    """
+    Yield frame_count frames crossfading linearly through the keyframes
+
+    Blends use 8-bit fixed-point weights in integer math. Blended frames are
+    written into a single reused buffer, so each yielded frame is only valid
+    until the next one is requested.
+
+    Args:
+        keyframes (list): height x width x 3 uint8 frames, at least one
+        frame_count (int): Number of frames to produce
+
+    Yields:
+        numpy.ndarray: The next frame
+    """
+    keyframes = [np.ascontiguousarray(frame, dtype=np.uint8) for frame in keyframes]
+    wide_keyframes = [frame.astype(np.uint16) for frame in keyframes]
+
+    shape = keyframes[0].shape
+    blend = np.empty(shape, dtype=np.uint16)
+    scratch = np.empty(shape, dtype=np.uint16)
+    output = np.empty(shape, dtype=np.uint8)
+
+    for i in range(int(frame_count)):
+        # Determine which keyframes to interpolate between
+        frame_idx = (i / frame_count) * (len(keyframes) - 1)
+        frame1_idx = int(frame_idx)
+        frame2_idx = min(frame1_idx + 1, len(keyframes) - 1)
+        weight = int((frame_idx - frame1_idx) * 256)
+
+        if frame1_idx == frame2_idx or weight == 0:
+            yield keyframes[frame1_idx]
+            continue
+
+        # (a * (256 - w) + b * w) >> 8 stays within uint16 for 8-bit inputs
+        np.multiply(wide_keyframes[frame1_idx], 256 - weight, out=blend)
+        np.multiply(wide_keyframes[frame2_idx], weight, out=scratch)
+        np.add(blend, scratch, out=blend)
+        np.right_shift(blend, 8, out=blend)
+        np.copyto(output, blend, casting='unsafe')
+
+        yield output
+
+def keyframe_hold_durations(num_keyframes, duration, transition):
+    """
+    Split a video duration evenly across keyframes, accounting for crossfade overlap
+
+    Returns:
+        list: Seconds each keyframe is on screen, including its transitions
+    """
+    return [(duration + (num_keyframes - 1) * transition) / num_keyframes] * num_keyframes
+
+def build_keyframe_filtergraph(num_keyframes, width, height, fps, hold_durations, transition=1.0, ken_burns=True, max_zoom=1.15):
+    """
+    Build the video filter graph that turns still keyframes into a timeline
+
+    Each keyframe input becomes a clip of its hold duration, optionally with a
+    slow Ken Burns zoom (alternating in and out), and consecutive clips are
+    joined with xfade crossfades.
+
+    Args:
+        num_keyframes (int): Number of keyframe inputs, at indexes 0..n-1
+        width (int): Output width in pixels
+        height (int): Output height in pixels
+        fps (int): Output frames per second
+        hold_durations (list): Seconds each keyframe is on screen, including transitions
+        transition (float): Crossfade duration in seconds
+        ken_burns (bool): Whether to add zoompan motion to each keyframe
+        max_zoom (float): Zoom factor reached at the end (or start) of each clip
+
+    Returns:
+        str: Filter chains producing the [vout] label
+    """
+    chains = []
+
+    for i, hold in enumerate(hold_durations[:num_keyframes]):
+        clip_frames = max(1, round(hold * fps))
+
+        if ken_burns:
+            zoom_step = (max_zoom - 1) / clip_frames
+            zoom = f'1+{zoom_step:.6f}*on' if i % 2 == 0 else f'{max_zoom}-{zoom_step:.6f}*on'
+            # Upscale first so the zoom moves in sub-pixel steps instead of jittering
+            motion = (
+                f'scale={width * 2}:{height * 2},'
+                f"zoompan=z='{zoom}':x='iw/2-(iw/zoom/2)':y='ih/2-(ih/zoom/2)'"
+                f':d={clip_frames}:s={width}x{height}:fps={fps}'
+            )
+        else:
+            motion = f'loop=loop={clip_frames - 1}:size=1:start=0'
+
+        chains.append(f'[{i}:v]{motion},fps={fps},setsar=1,format=yuv420p[v{i}]')
+
+    if num_keyframes == 1:
+        chains.append('[v0]null[vout]')
+        return ';'.join(chains)
+
+    # Chain the crossfades; each one starts a transition before the previous clip ends
+    previous = 'v0'
+    offset = 0.0
+    for i in range(1, num_keyframes):
+        offset += hold_durations[i - 1] - transition
+        label = 'vout' if i == num_keyframes - 1 else f'x{i}'
+        chains.append(f'[{previous}][v{i}]xfade=transition=fade:duration={transition}:offset={offset:.3f}[{label}]')
+        previous = label
+
+    return ';'.join(chains)
+
+def encode_keyframe_video(keyframes, output_path, fps, duration, audio_path=None, transition=1.0, ken_burns=True, hold_durations=None, scratch_dir=None, subtitle_path=None, check_quota=None):
+    """
+    Encode a video from keyframes alone, building transitions and motion in ffmpeg
+
+    Only the keyframes are handed to ffmpeg; the crossfades, Ken Burns motion and
+    optional narration are all produced by a single ffmpeg run.
+
+    Args:
+        keyframes (list): height x width x 3 uint8 frames
+        output_path (str): Path to save the encoded video
+        fps (int): Output frames per second
+        duration (float): Length of the output in seconds
+        audio_path (str): Optional audio file to loop and mux into the video
+        transition (float): Crossfade duration in seconds
+        ken_burns (bool): Whether to add zoompan motion to each keyframe
+        hold_durations (list): Seconds each keyframe is on screen, split evenly by default
+        scratch_dir (str): Directory for the keyframe dumps, a temporary one by default
+        subtitle_path (str): Optional WebVTT file to add as a mov_text caption track
+        check_quota (callable): Called after each keyframe dump, e.g. a workspace's check_quota
+
+    Returns:
+        str: Path to the encoded video
+    """
+    height, width = keyframes[0].shape[:2]
+    # Transitions cannot be longer than the clips they join
+    transition = min(transition, duration / (2 * len(keyframes)))
+    hold_durations = hold_durations or keyframe_hold_durations(len(keyframes), duration, transition)
+
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    keyframe_dir = scratch_dir or tempfile.mkdtemp(prefix='keyframes_')
+
+    try:
+        cmd = ['ffmpeg', '-y', '-loglevel', 'error']
+
+        # Raw RGB dumps are the cheapest way to hand ffmpeg a still image
+        for i, frame in enumerate(keyframes):
+            frame_path = os.path.join(keyframe_dir, f'keyframe_{i}.rgb')
+            np.ascontiguousarray(frame, dtype=np.uint8).tofile(frame_path)
+            if check_quota is not None:
+                check_quota()
+            cmd += ['-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{width}x{height}', '-r', str(fps), '-i', frame_path]
+
+        filtergraph = build_keyframe_filtergraph(len(keyframes), width, height, fps, hold_durations, transition, ken_burns)
+        maps = ['-map', '[vout]']
+
+        if audio_path:
+            cmd += ['-i', audio_path]
+            filtergraph += ';' + narration_filter(len(keyframes), duration)
+            maps += ['-map', '[aout]', *AUDIO_OUTPUT_ARGS]
+
+        if subtitle_path:
+            cmd += ['-i', subtitle_path]
+            maps += subtitle_output_args(len(keyframes) + (1 if audio_path else 0))
+
+        cmd += [
+            '-filter_complex', filtergraph,
+            *maps,
+            *FFmpegFrameWriter.DEFAULT_OUTPUT_ARGS,
+            '-r', str(fps),
+            '-t', str(duration),
+            output_path
+        ]
+
+        run_ffmpeg(cmd, 'keyframe_encode')
+        return output_path
+    finally:
+        if scratch_dir is None:
+            shutil.rmtree(keyframe_dir, ignore_errors=True)
\ No newline at end of file
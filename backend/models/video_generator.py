@@ -1,381 +1,358 @@
 import os
 import logging
-import numpy as np
-import torch
 import time
-import math  # Add this import
-from diffusers import StableDiffusionPipeline
-import imageio
-from PIL import Image, ImageDraw, ImageFont
-import tempfile
-import subprocess
-from gtts import gTTS  # For text-to-speech
+import numpy as np
+from concurrent.futures import wait
+from models.captions import burn_captions, caption_text, write_webvtt
+from models.fallback_renderer import fallback_frames, FALLBACK_OUTPUT_ARGS
+from models.latent_interpolation import anchor_indices, interpolate_latent_keyframes
+from models.diffusion_batcher import diffusion_batcher, chain_keyframes, KeyframeRequest
+from models.model_loader import image_model_identity
+from models.text_to_speech import text_to_speech, get_tts_backend
+from models.video_encoder import FFmpegFrameWriter, interpolate_frames, encode_keyframe_video
+from utils.latency import render_latency
+from utils.metrics import observe_stage, timed_iter, FALLBACKS_TOTAL
+from utils.progress import report
+from utils.workspace import open_workspace
+from config import Config
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def generate_video_from_text(text, output_path, num_frames=5, height=512, width=512, enable_audio=True, enable_captions=True, min_duration=30):
+# Keyframe diffusion settings
+NUM_KEYFRAMES = 5
+NUM_INFERENCE_STEPS = 20  # Reduced for faster generation
+GUIDANCE_SCALE = 7.5  # Slightly reduced for speed
+# Better prompt engineering for more relevant results
+PROMPT_TEMPLATE = "high quality, detailed {text}, professional photography, 4k, sharp focus"
+NEGATIVE_PROMPT = "blurry, low quality, distorted, deformed, disfigured, bad anatomy, watermark, signature, text"
+FPS = 24  # Higher FPS for smoother video
+# A VAE decode costs about as much as this many UNet steps at the same size
+VAE_DECODE_STEPS = 2
+
+def keyframe_seeds(num_frames):
     """
-    Generate a video from text using a series of images with optional narration and captions
+    Return the deterministic seed used for each keyframe
+    """
+    return [i * 100 + 42 for i in range(num_frames)]
+
+def keyframe_count():
+    """
+    Return how many keyframes a video has in the configured keyframe mode
+
+    Latent keyframes only cost a VAE decode, so that mode uses more of them and
+    shorter crossfades.
+    """
+    if Config.KEYFRAME_MODE == 'latent':
+        return max(2, Config.LATENT_KEYFRAMES)
+    return NUM_KEYFRAMES
+
+def diffusion_steps(num_frames, num_inference_steps):
+    """
+    Return the UNet steps generating the keyframes costs in the configured keyframe mode, counting VAE decodes as steps
+    """
+    if Config.KEYFRAME_MODE == 'latent':
+        unet_steps = len(anchor_indices(num_frames, Config.LATENT_ANCHORS)) * num_inference_steps
+    elif Config.KEYFRAME_MODE == 'chained':
+        unet_steps = num_inference_steps + (num_frames - 1) * int(num_inference_steps * Config.KEYFRAME_STRENGTH)
+    else:
+        unet_steps = num_frames * num_inference_steps
+    return unet_steps + num_frames * VAE_DECODE_STEPS
+
+def render_settings(height=512, width=512, enable_audio=True, enable_captions=True, min_duration=30, render_mode=None, caption_mode=None, num_frames=None, num_inference_steps=None, fps=None):
+    """
+    Return every setting that determines the output of generate_video_from_text
+
+    Two renders of the same text with equal settings produce the same video, so
+    this is used to build result cache keys.
+    """
+    render_mode = render_mode or Config.RENDER_MODE
+    settings = {
+        "model": image_model_identity(),
+        "seeds": keyframe_seeds(num_frames or keyframe_count()),
+        "steps": num_inference_steps or NUM_INFERENCE_STEPS,
+        "guidance": GUIDANCE_SCALE,
+        "prompt": PROMPT_TEMPLATE,
+        "negativePrompt": NEGATIVE_PROMPT,
+        "size": [width, height],
+        "fps": fps or FPS,
+        "duration": min_duration,
+        "audio": get_tts_backend().identity if enable_audio else None,
+        "captions": (caption_mode or Config.CAPTION_MODE) if enable_captions else None,
+        "renderMode": render_mode,
+        "keyframeMode": Config.KEYFRAME_MODE,
+    }
+    if Config.KEYFRAME_MODE == 'chained':
+        settings["strength"] = Config.KEYFRAME_STRENGTH
+    elif Config.KEYFRAME_MODE == 'latent':
+        settings["anchors"] = Config.LATENT_ANCHORS
+    if render_mode == 'keyframes':
+        settings["transition"] = Config.KEYFRAME_TRANSITION_SECONDS
+        settings["kenBurns"] = Config.KEN_BURNS
+    return settings
+
+def generate_narration(text, audio_path):
+    """
+    Synthesize narration for a video
+
+    Args:
+        text (str): The text to speak
+        audio_path (str): Path to save the audio file; muxing takes any format, so
+            callers use the TTS backend's extension to avoid a transcode
+
+    Returns:
+        str: Path to the audio file, or None if synthesis failed
     """
-    # Make sure the directory exists
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    
     try:
-        logger.info(f"Generating video for prompt: {text}")
-        
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        logger.info(f"Using device: {device}")
-        
-        # Use a better model for higher quality and more relevant images
-        pipe = StableDiffusionPipeline.from_pretrained(
-            "stabilityai/stable-diffusion-2-1",  # Using a better model
-            torch_dtype=torch.float16 if device == "cuda" else torch.float32,
-            safety_checker=None
-        )
-        pipe = pipe.to(device)
-        pipe.enable_attention_slicing()
-        
-        # Generate a series of slightly different images to create a video effect
-        logger.info("Starting image sequence generation...")
-        frames = []
-        
-        # Set a timeout for the entire generation process
-        start_time = time.time()
-        max_time = 420  # 7 minutes max
-        
-        # Ensure we generate exactly 5 frames
-        num_frames = 5
-        
-        # Generate frames with optimized quality settings for speed
-        for i in range(num_frames):
-            # Check if we're exceeding the time limit
-            if time.time() - start_time > max_time:
-                logger.warning(f"Generation taking too long, using {len(frames)} frames")
-                break
-                
-            # Add variations to the prompt for each frame
-            seed = i * 100 + 42  # Different seed for each frame
-            generator = torch.Generator(device=device).manual_seed(seed)
-            
-            # Better prompt engineering for more relevant results
-            enhanced_prompt = f"high quality, detailed {text}, professional photography, 4k, sharp focus"
-            
-            # Generate image with faster settings
-            image = pipe(
-                prompt=enhanced_prompt,
-                negative_prompt="blurry, low quality, distorted, deformed, disfigured, bad anatomy, watermark, signature, text",
-                num_inference_steps=20,  # Reduced for faster generation
-                guidance_scale=7.5,  # Slightly reduced for speed
-                height=height,
-                width=width,
-                generator=generator
-            ).images[0]
-            
-            # Convert to numpy array
-            frame = np.array(image)
-            frames.append(frame)
-            logger.info(f"Generated frame {i+1}/{num_frames}")
-            
-            # If we're taking too long after generating minimum frames, stop
-            if len(frames) >= 3 and time.time() - start_time > 360:  # 6 minutes
-                logger.warning("Generation taking longer than expected, stopping with minimum frames")
-                break
-        
-        # Ensure we have at least 5 frames by duplicating if needed
-        while len(frames) < 5:
-            logger.warning(f"Only generated {len(frames)} frames, duplicating last frame to reach 5")
-            frames.append(frames[-1] if frames else np.zeros((height, width, 3), dtype=np.uint8))
-        
-        # Add captions to the frames before interpolation if enabled
-        if enable_captions:
-            logger.info("Adding captions to frames...")
-            captioned_frames = []
-            
-            # Try to load a font, use default if not available
-            try:
-                caption_font = ImageFont.truetype("arial.ttf", 28)
-            except:
-                caption_font = ImageFont.load_default()
-                
-            # Add caption to each base frame
-            for frame in frames:
-                img = Image.fromarray(frame)
-                draw = ImageDraw.Draw(img)
-                
-                # Create caption text
-                caption_text = text[:50] + "..." if len(text) > 50 else text
-                
-                # Calculate text width and position (centered at bottom with padding)
-                text_width = draw.textlength(caption_text, font=caption_font) if hasattr(draw, 'textlength') else len(caption_text) * 15
-                text_position = ((width - text_width) // 2, height - 60)
-                
-                # Draw text background for better readability
-                text_bbox = draw.textbbox(text_position, caption_text, font=caption_font) if hasattr(draw, 'textbbox') else (
-                    text_position[0], text_position[1], 
-                    text_position[0] + text_width, text_position[1] + 40
+        logger.info("Generating audio narration...")
+        with observe_stage('tts'):
+            return text_to_speech(text, audio_path)
+    except Exception as e:
+        logger.error(f"Error generating narration, continuing without audio: {str(e)}")
+        return None
+
+def generate_video_from_text(text, output_path, num_frames=None, height=512, width=512, enable_audio=True, enable_captions=True, min_duration=30, narration_text=None, render_mode=None, allow_fallback=True, workspace=None, caption_mode=None, progress=None, num_inference_steps=None, fps=None, keyframe_timeout=None):
+    """
+    Generate a video from text using a series of images with optional narration and captions
+
+    num_frames, num_inference_steps and fps default to the keyframe mode's
+    keyframe count, NUM_INFERENCE_STEPS and FPS; the render planner lowers them
+    to meet a deadline. Keyframes still denoising after keyframe_timeout seconds
+    (default Config.RENDER_DEADLINE_SECONDS) are replaced by the last finished one;
+    the first keyframe is waited for at least Config.FIRST_KEYFRAME_TIMEOUT_SECONDS,
+    and the render fails (or falls back) if even that one does not finish.
+    The narration speaks narration_text when given, otherwise the prompt text.
+    render_mode is 'interpolate' (crossfades blended in Python) or 'keyframes'
+    (transitions built by ffmpeg), defaulting to Config.RENDER_MODE. caption_mode
+    is 'burn' (drawn into the frames) or 'soft' (a subtitle track), defaulting to
+    Config.CAPTION_MODE. With allow_fallback=False errors are raised instead of
+    rendering the fallback video. Scratch files go to workspace, or to a
+    temporary one when none is given. Stage transitions and denoising steps are
+    reported to the progress tracker when one is given.
+    """
+    render_mode = render_mode or Config.RENDER_MODE
+    caption_mode = caption_mode or Config.CAPTION_MODE
+    num_frames = num_frames or keyframe_count()
+    num_inference_steps = num_inference_steps or NUM_INFERENCE_STEPS
+    fps = fps or FPS
+    started = time.perf_counter()
+
+    # Every intermediate file lives in the job's private workspace
+    with open_workspace(workspace) as workspace:
+        # Make sure the directory exists
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+        try:
+            logger.info(f"Generating video for prompt: {text}")
+
+            # Generate a series of slightly different images to create a video effect
+            logger.info("Starting image sequence generation...")
+
+            # Stop waiting for keyframes in time for the rest of the render to meet its deadline
+            max_time = keyframe_timeout or Config.RENDER_DEADLINE_SECONDS
+
+            enhanced_prompt = PROMPT_TEMPLATE.format(text=text)
+
+            # Track how far each keyframe is, so progress covers both finished images and denoising steps
+            keyframe_fractions = [0.0] * num_frames
+            # Keyframes that ran denoising steps, and how many, to measure the per-step latency
+            denoised = set()
+            steps_run = [0]
+
+            def keyframe_step(index, step, total):
+                denoised.add(index)
+                steps_run[0] += 1
+                keyframe_progress(index, step, total)
+
+            def keyframe_progress(index, step, total):
+                keyframe_fractions[index] = step / total
+                report(
+                    progress, 'keyframes', sum(keyframe_fractions) / num_frames,
+                    keyframe=sum(1 for fraction in keyframe_fractions if fraction >= 1), keyframes=num_frames,
+                    step=step, steps=total
+                )
+
+            report(progress, 'keyframes', 0.0, keyframe=0, keyframes=num_frames, step=0, steps=num_inference_steps)
+
+            # Each keyframe has its own seed (different seed for each frame)
+            requests = [
+                KeyframeRequest(
+                    prompt=enhanced_prompt,
+                    negative_prompt=NEGATIVE_PROMPT,
+                    seed=seed,
+                    num_inference_steps=num_inference_steps,
+                    guidance_scale=GUIDANCE_SCALE,
+                    height=height,
+                    width=width,
+                    on_step=lambda step, total, index=index: keyframe_step(index, step, total)
                 )
-                
-                # Add semi-transparent background
-                bg_bbox = (text_bbox[0]-10, text_bbox[1]-5, text_bbox[2]+10, text_bbox[3]+5)
-                overlay = Image.new('RGBA', img.size, (0, 0, 0, 0))
-                draw_overlay = ImageDraw.Draw(overlay)
-                draw_overlay.rectangle(bg_bbox, fill=(0, 0, 0, 180))
-                img = Image.alpha_composite(img.convert('RGBA'), overlay).convert('RGB')
-                draw = ImageDraw.Draw(img)
-                
-                # Draw caption text
-                draw.text(text_position, caption_text, font=caption_font, fill=(255, 255, 255))
-                
-                # Convert back to numpy array
-                captioned_frames.append(np.array(img))
-            
-            frames = captioned_frames
-        else:
-            logger.info("Captions disabled, skipping caption generation")
-        
-        # If we have at least 2 frames, interpolate between them to reach target duration
-        if len(frames) >= 2:
-            logger.info(f"Interpolating between {len(frames)} frames...")
-            interpolated_frames = []
-            
-            # Calculate how many frames we need for the minimum duration at 24 fps
-            fps = 24  # Higher FPS for smoother video
+                for index, seed in enumerate(keyframe_seeds(num_frames))
+            ]
+            keyframes_started = time.perf_counter()
+            concurrency = render_latency.begin_diffusion()
+            if Config.KEYFRAME_MODE == 'latent':
+                # Denoise only the anchors; the keyframes between them are slerped latents
+                # that just need a VAE decode, so they look like real images, not double exposures
+                futures = interpolate_latent_keyframes(diffusion_batcher, requests, Config.LATENT_ANCHORS)
+            elif Config.KEYFRAME_MODE == 'chained':
+                # Derive each keyframe from the previous one, so the sequence stays coherent
+                # and later keyframes run only a fraction of the denoising steps
+                futures = chain_keyframes(diffusion_batcher, requests, Config.KEYFRAME_STRENGTH)
+            else:
+                # Submit every keyframe at once so they are denoised in a single batched call
+                futures = diffusion_batcher.submit(requests)
+            def keyframe_done(future, index):
+                # Cancelled and failed keyframes are not complete
+                if not future.cancelled() and future.exception() is None:
+                    keyframe_progress(index, num_inference_steps, num_inference_steps)
+
+            for index, future in enumerate(futures):
+                future.add_done_callback(lambda future, index=index: keyframe_done(future, index))
+
+            try:
+                # The measured latencies leave out model loading, so the first keyframe gets
+                # at least the floor; the timeout only decides how many of the others are used
+                wait(futures[:1], timeout=max(max_time, Config.FIRST_KEYFRAME_TIMEOUT_SECONDS))
+                remaining = max_time - (time.perf_counter() - keyframes_started)
+                done, not_done = wait(futures, timeout=max(0.0, remaining))
+            finally:
+                concurrency = max(concurrency, render_latency.end_diffusion())
+            keyframe_seconds = time.perf_counter() - keyframes_started
+
+            # Only complete generations say how long a step takes; keyframe cache hits run no steps
+            if not not_done and steps_run[0]:
+                decodes = num_frames if Config.KEYFRAME_MODE == 'latent' else len(denoised)
+                render_latency.observe_diffusion(keyframe_seconds, steps_run[0] + decodes * VAE_DECODE_STEPS, width * height, concurrency)
+
+            if not_done:
+                logger.warning(f"Generation taking too long, using {len(done)} frames")
+                for future in not_done:
+                    future.cancel()
+            if futures[0] not in done:
+                # Nothing to duplicate; a video of blank frames is not a result
+                raise TimeoutError(f"No keyframe finished within {keyframe_seconds:.0f}s")
+
+            # Keep frames in order, stopping at the first one that did not finish in time
+            frames = []
+            for future in futures:
+                if future not in done:
+                    break
+                frames.append(np.array(future.result()))
+            logger.info(f"Generated {len(frames)}/{num_frames} frames")
+
+            # Ensure we have every planned frame by duplicating if needed
+            while len(frames) < num_frames:
+                logger.warning(f"Only generated {len(frames)} frames, duplicating last frame to reach {num_frames}")
+                frames.append(frames[-1])
+
+            # Add captions to the frames before interpolation if enabled
+            subtitle_path = None
+            report(progress, 'captions')
+            if not enable_captions:
+                logger.info("Captions disabled, skipping caption generation")
+            elif caption_mode == 'soft':
+                logger.info("Writing captions as a subtitle track...")
+                with observe_stage('captions'):
+                    subtitle_path = write_webvtt([(0, min_duration, caption_text(text))], workspace.file("captions.vtt"))
+            else:
+                logger.info("Adding captions to frames...")
+                with observe_stage('captions'):
+                    frames = burn_captions(frames, text)
+
+            # Calculate how many frames we need for the minimum duration
             target_frame_count = min_duration * fps
-            
-            # Faster interpolation between frames
-            for i in range(int(target_frame_count)):
-                # Determine which base frames to interpolate between
-                frame_idx = (i / target_frame_count) * (len(frames) - 1)
-                frame1_idx = int(frame_idx)
-                frame2_idx = min(frame1_idx + 1, len(frames) - 1)
-                weight = frame_idx - frame1_idx
-                
-                # Simple linear blending for speed
-                if frame1_idx == frame2_idx:
-                    interpolated_frames.append(frames[frame1_idx])
-                else:
-                    blended_frame = np.uint8((1 - weight) * frames[frame1_idx] + weight * frames[frame2_idx])
-                    interpolated_frames.append(blended_frame)
-            
-            frames = interpolated_frames
-        
-        # Save as video with higher quality
-        temp_video_path = output_path
-        if enable_audio:
-            # Use a temporary file for the silent video
-            temp_video_path = os.path.join(tempfile.gettempdir(), "temp_video.mp4")
-            
-        logger.info(f"Saving video to: {temp_video_path}")
-        # Use higher quality settings for the video
-        imageio.mimsave(temp_video_path, frames, fps=fps, quality=9, macro_block_size=1)
-        
-        # Generate audio narration if enabled
-        if enable_audio:
+
+            # Generate the narration first so it can be muxed in the same encode
+            audio_path = None
+            if enable_audio:
+                report(progress, 'narration')
+                audio_path = generate_narration(narration_text or text, workspace.file(f"narration.{get_tts_backend().extension}"))
+                workspace.check_quota()
+
+            report(progress, 'encoding', 0.0, frame=0, frames=target_frame_count)
+            encode_started = time.perf_counter()
+
             try:
-                logger.info("Generating audio narration...")
-                audio_path = os.path.join(tempfile.gettempdir(), "narration.mp3")
-                
-                # Generate speech from the prompt text
-                tts = gTTS(text=text, lang='en', slow=False)
-                tts.save(audio_path)
-                
-                # Combine video and audio with better ffmpeg settings
-                logger.info("Combining video and audio...")
-                
-                # Check audio duration
-                audio_info_cmd = [
-                    'ffprobe', '-v', 'error', '-show_entries', 'format=duration', 
-                    '-of', 'default=noprint_wrappers=1:nokey=1', audio_path
-                ]
-                
-                try:
-                    audio_duration = float(subprocess.check_output(audio_info_cmd).decode('utf-8').strip())
-                    logger.info(f"Audio duration: {audio_duration} seconds")
-                    
-                    # If audio is shorter than 30 seconds, loop it
-                    if audio_duration < 30:
-                        logger.info("Audio is shorter than 30 seconds, creating looped version")
-                        looped_audio_path = os.path.join(tempfile.gettempdir(), "looped_narration.mp3")
-                        
-                        # Create a filter to loop audio to at least 30 seconds
-                        loop_count = math.ceil(30 / audio_duration)
-                        
-                        loop_cmd = [
-                            'ffmpeg', '-y',
-                            '-i', audio_path,
-                            '-filter_complex', f'aloop=loop={loop_count}:size=1:start=0',
-                            '-t', '30',  # Limit to exactly 30 seconds
-                            looped_audio_path
-                        ]
-                        
-                        subprocess.run(loop_cmd, check=True)
-                        
-                        # Use the looped audio instead
-                        audio_path = looped_audio_path
-                except Exception as e:
-                    logger.warning(f"Could not check audio duration: {str(e)}")
-                
-                # Use ffmpeg to combine video and audio - ensure output is exactly 30 seconds
-                ffmpeg_cmd = [
-                    'ffmpeg', '-y',
-                    '-i', temp_video_path,
-                    '-i', audio_path,
-                    '-c:v', 'libx264',  # Use better codec
-                    '-preset', 'medium',  # Better quality preset
-                    '-crf', '23',  # Better quality setting
-                    '-c:a', 'aac',
-                    '-b:a', '192k',  # Better audio quality
-                    '-t', '30',  # Force exactly 30 seconds
-                    output_path
-                ]
-                
-                subprocess.run(ffmpeg_cmd, check=True)
-                logger.info(f"Video with narration saved to: {output_path}")
-                
-                # Clean up temporary files
-                if os.path.exists(temp_video_path):
-                    os.remove(temp_video_path)
-                if os.path.exists(audio_path):
+                if render_mode == 'keyframes':
+                    # Hand only the keyframes to ffmpeg; crossfades, Ken Burns motion and the
+                    # narration are all built in its filter graph
+                    logger.info(f"Encoding {len(frames)} keyframes with ffmpeg transitions to: {output_path}")
+                    with observe_stage('encode'):
+                        encode_keyframe_video(
+                            frames,
+                            output_path,
+                            fps,
+                            min_duration,
+                            audio_path=audio_path,
+                            transition=Config.KEYFRAME_TRANSITION_SECONDS,
+                            ken_burns=Config.KEN_BURNS,
+                            scratch_dir=workspace.mkdir("keyframes"),
+                            subtitle_path=subtitle_path,
+                            check_quota=workspace.check_quota
+                        )
+                    workspace.check_quota()
+                else:
+                    # Interpolate between the keyframes to reach the target duration, streaming
+                    # each frame straight into the encoder so only a few frames are ever in memory.
+                    # The narration is looped and trimmed to the video length by the same ffmpeg run.
+                    logger.info(f"Interpolating between {len(frames)} frames and saving video to: {output_path}")
+                    # 'encode' covers the whole streamed encode, 'interpolation' only the blending
+                    with observe_stage('encode'), FFmpegFrameWriter(output_path, width, height, fps, audio_path=audio_path, duration=min_duration, subtitle_path=subtitle_path) as writer:
+                        for i, frame in enumerate(timed_iter(interpolate_frames(frames, target_frame_count), 'interpolation'), 1):
+                            writer.write(frame)
+                            # Check the disk quota and report progress every couple of seconds of output
+                            if i % (fps * 2) == 0:
+                                workspace.check_quota()
+                                report(progress, 'encoding', i / target_frame_count, frame=i, frames=target_frame_count)
+                        # ffmpeg finishes the audio track and moves the index to the front on close
+                        report(progress, 'muxing')
+            finally:
+                if audio_path and os.path.exists(audio_path):
                     os.remove(audio_path)
-            except Exception as e:
-                logger.error(f"Error adding narration: {str(e)}")
-                # If audio fails, just use the video without audio
-                if os.path.exists(temp_video_path) and temp_video_path != output_path:
-                    os.rename(temp_video_path, output_path)
-        
-        return output_path
-        
-    except Exception as e:
-        logger.error(f"Error in video generation: {str(e)}")
-        # Use a faster fallback video generation
-        return generate_fallback_video(output_path, 5, height, width, enable_audio, enable_captions, text)
 
-def generate_fallback_video(output_path, num_frames=30, height=512, width=512, enable_audio=True, enable_captions=True, text="Video Generation"):
+            encode_seconds = time.perf_counter() - encode_started
+            render_latency.observe_encode(encode_seconds, target_frame_count, width * height)
+            render_latency.observe('overhead', time.perf_counter() - started - keyframe_seconds - encode_seconds)
+
+            return output_path
+
+        except Exception as e:
+            logger.error(f"Error in video generation: {str(e)}")
+            if not allow_fallback:
+                raise
+            # Use a faster fallback video generation
+            report(progress, 'fallback')
+            return generate_fallback_video(output_path, 5, height, width, enable_audio, enable_captions, text, narration_text, workspace)
+
+def generate_fallback_video(output_path, num_frames=30, height=512, width=512, enable_audio=True, enable_captions=True, text="Video Generation", narration_text=None, workspace=None):
     """
     Generate a simple fallback video when the main generation fails
     """
-    try:
-        logger.info("Generating fallback video with text overlay")
-        frames = []
-        
-        # Create a series of frames with text and the prompt
-        for i in range(num_frames * 12):  # 30 seconds at 12 fps
-            # Create a gradient background
-            img = Image.new('RGB', (width, height), color=(25, 25, 50))
-            draw = ImageDraw.Draw(img)
-            
-            # Try to load a font, use default if not available
-            try:
-                font = ImageFont.truetype("arial.ttf", 30)
-                small_font = ImageFont.truetype("arial.ttf", 20)
-            except:
-                font = ImageFont.load_default()
-                small_font = ImageFont.load_default()
-            
-            # Add text to the image
-            text_to_draw = "Video Generation"
-            text_width = draw.textlength(text_to_draw, font=font) if hasattr(draw, 'textlength') else 200
-            
-            # Position text in center
-            text_position = ((width - text_width) // 2, height // 2 - 50)
-            draw.text(text_position, text_to_draw, fill=(255, 255, 255), font=font)
-            
-            # Add the prompt text
-            prompt_lines = text.split('\n')
-            y_offset = height // 2 + 20
-            for line in prompt_lines:
-                if len(line) > 40:
-                    # Split long lines
-                    words = line.split()
-                    current_line = ""
-                    for word in words:
-                        if len(current_line + " " + word) <= 40:
-                            current_line += " " + word if current_line else word
-                        else:
-                            prompt_width = draw.textlength(current_line, font=small_font) if hasattr(draw, 'textlength') else 150
-                            prompt_position = ((width - prompt_width) // 2, y_offset)
-                            draw.text(prompt_position, current_line, fill=(200, 200, 255), font=small_font)
-                            y_offset += 25
-                            current_line = word
-                    
-                    if current_line:
-                        prompt_width = draw.textlength(current_line, font=small_font) if hasattr(draw, 'textlength') else 150
-                        prompt_position = ((width - prompt_width) // 2, y_offset)
-                        draw.text(prompt_position, current_line, fill=(200, 200, 255), font=small_font)
-                        y_offset += 25
-                else:
-                    prompt_width = draw.textlength(line, font=small_font) if hasattr(draw, 'textlength') else 150
-                    prompt_position = ((width - prompt_width) // 2, y_offset)
-                    draw.text(prompt_position, line, fill=(200, 200, 255), font=small_font)
-                    y_offset += 25
-            
-            # Caption code removed - we no longer add captions at the bottom of the screen
-            
-            # Add animated elements
-            angle = (i / (num_frames * 12)) * 360
-            for j in range(5):  # Multiple circles for more visual interest
-                sub_angle = angle + (j * 72)  # Distribute evenly
-                radius = min(width, height) // 3
-                x = width // 2 + int(radius * np.cos(np.radians(sub_angle)))
-                y = height // 2 + int(radius * np.sin(np.radians(sub_angle)))
-                
-                # Draw circles with different colors
-                colors = [(255, 200, 0), (0, 200, 255), (200, 0, 255), (0, 255, 100), (255, 100, 100)]
-                draw.ellipse((x-15, y-15, x+15, y+15), fill=colors[j % len(colors)])
-            
-            # Convert to numpy array and append to frames
-            frames.append(np.array(img))
-        
-        # Save as video
-        temp_video_path = output_path
-        if enable_audio:
-            # Use a temporary file for the silent video
-            temp_video_path = os.path.join(tempfile.gettempdir(), "temp_fallback.mp4")
-            
-        logger.info(f"Saving fallback video to: {temp_video_path}")
-        imageio.mimsave(temp_video_path, frames, fps=12)  # Higher FPS for smoother animation
-        
-        # Generate audio narration if enabled
-        if enable_audio:
+    with open_workspace(workspace) as workspace:
+        try:
+            logger.info("Generating fallback video with text overlay")
+            FALLBACKS_TOTAL.inc()
+            frame_count = num_frames * 12  # 30 seconds at 12 fps
+
+            # Generate the narration first so it can be muxed in the same encode
+            audio_path = None
+            if enable_audio:
+                audio_path = generate_narration(narration_text or text, workspace.file(f"fallback_narration.{get_tts_backend().extension}"))
+
+            # Save as video, with the narration looped and trimmed to the video length
+            fps = 12  # Higher FPS for smoother animation
+            logger.info(f"Saving fallback video to: {output_path}")
             try:
-                logger.info("Generating audio narration for fallback...")
-                audio_path = os.path.join(tempfile.gettempdir(), "fallback_narration.mp3")
-                
-                # Generate speech from the prompt text
-                tts = gTTS(text=text, lang='en', slow=False)
-                tts.save(audio_path)
-                
-                # Combine video and audio
-                logger.info("Combining fallback video and audio...")
-                
-                # Use ffmpeg to combine video and audio
-                ffmpeg_cmd = [
-                    'ffmpeg', '-y',
-                    '-i', temp_video_path,
-                    '-i', audio_path,
-                    '-c:v', 'copy',
-                    '-c:a', 'aac',
-                    '-shortest',  # End when the shortest input ends
-                    output_path
-                ]
-                
-                subprocess.run(ffmpeg_cmd, check=True)
-                logger.info(f"Fallback video with narration saved to: {output_path}")
-                
-                # Clean up temporary files
-                if os.path.exists(temp_video_path):
-                    os.remove(temp_video_path)
-                if os.path.exists(audio_path):
+                # Only the moving dots are drawn per frame, straight into the encoder
+                with observe_stage('fallback'), FFmpegFrameWriter(output_path, width, height, fps, audio_path=audio_path, duration=frame_count / fps, output_args=FALLBACK_OUTPUT_ARGS) as writer:
+                    for frame in fallback_frames(width, height, text, frame_count):
+                        writer.write(frame)
+            finally:
+                if audio_path and os.path.exists(audio_path):
                     os.remove(audio_path)
-            except Exception as e:
-                logger.error(f"Error adding narration to fallback: {str(e)}")
-                # If audio fails, just use the video without audio
-                if os.path.exists(temp_video_path) and temp_video_path != output_path:
-                    os.rename(temp_video_path, output_path)
-        
-        return output_path
-    except Exception as e:
-        logger.error(f"Error generating fallback video: {str(e)}")
-        return output_path
\ No newline at end of file
+
+            return output_path
+        except Exception as e:
+            logger.error(f"Error generating fallback video: {str(e)}")
+            return output_path
\ No newline at end of file
@@ -1,27 +1,23 @@
-from fastapi import APIRouter, Request, HTTPException, Response, BackgroundTasks
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
+from fastapi import APIRouter, Request, HTTPException, Response, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 from typing import Optional, List
 import os
-import uuid
-import json
-from datetime import datetime
-from services.text_processing import process_text
-from services.audio_processing import generate_audio
-from services.image_processing import generate_images
-from services.video_processing import create_video
-from utils.file_utils import get_video_path, save_video_metadata
+from services.job_queue import render_queue, load_job, Job, JOB_DONE, JOB_FAILED
+from services.video_processing import render_video
+from utils.file_utils import get_video_path, get_video_metadata, list_video_metadata
+from utils.progress import PolledProgress, progress_events
+from utils.video_delivery import video_file_response
 from config import Config
 
-# Add this import
-from models.video_generator import generate_video_from_text
-
 video_router = APIRouter()
 
 # Define request and response models
 class VideoRequest(BaseModel):
     text: str
     enableAudio: Optional[bool] = True
+    # Seconds until the video must be ready, at most a day; quality is lowered to meet it
+    deadlineSeconds: Optional[int] = Field(None, gt=0, le=86400)
 
 class VideoResponse(BaseModel):
     id: str
@@ -29,124 +25,165 @@ class VideoResponse(BaseModel):
     title: str
     hasAudio: bool
 
+class JobResponse(BaseModel):
+    jobId: str
+    status: str
+    statusUrl: str
+    eventsUrl: str
+    videoUrl: Optional[str] = None
+    error: Optional[str] = None
+    createdAt: str
+
 class VideoListItem(BaseModel):
     id: str
     title: str
     url: str
     createdAt: str
 
-@video_router.post('/generate', response_model=VideoResponse, status_code=201)
-async def generate_video(video_request: VideoRequest, background_tasks: BackgroundTasks):
+def job_response(job):
+    """
+    Build the API representation of a render job
+    """
+    return {
+        "jobId": job.id,
+        "status": job.status,
+        "statusUrl": f"{Config.API_URL}/videos/jobs/{job.id}",
+        "eventsUrl": f"{Config.API_URL}/videos/jobs/{job.id}/events",
+        "videoUrl": f"{Config.API_URL}/videos/{job.id}" if job.status == JOB_DONE else None,
+        "error": job.error,
+        "createdAt": job.created_at
+    }
+
+def find_job(job_id):
+    """
+    Look up a render job by ID
+
+    Jobs live in the memory of the worker process that queued them, and their
+    state is saved to the metadata store on every change. When several workers
+    serve the API, a job queued by another worker is rebuilt from that saved
+    state, and a finished job whose state was pruned from its video metadata,
+    so its status is available from any worker.
+
+    Returns:
+        Job: The job, or None if it is unknown
+    """
+    job = render_queue.get(job_id) or load_job(job_id)
+    if job is not None:
+        return job
+
+    metadata = get_video_metadata(job_id)
+    if metadata is None:
+        return None
+
+    job = Job(job_id, {})
+    job.status = JOB_DONE
+    job.result = metadata
+    job.created_at = job.finished_at = metadata["createdAt"]
+    job.progress.update(JOB_DONE)
+    return job
+
+@video_router.post('/generate', response_model=JobResponse, status_code=202)
+async def generate_video(video_request: VideoRequest):
     try:
-        text = video_request.text
-        enable_audio = video_request.enableAudio
-        
-        # Generate a unique ID for this video
-        video_id = str(uuid.uuid4())
-        
-        # Process text to get a concise prompt
-        segments = process_text(text)
-        main_prompt = segments[0] if segments else text
-        
-        # Generate video directly from text
-        video_filename = f"{video_id}.mp4"
-        temp_video_path = os.path.join(Config.TEMP_DIR, f"temp_{video_filename}")
-        final_video_path = os.path.join(Config.VIDEOS_DIR, video_filename)
+        # Queue the render and return right away; the job ID doubles as the video ID
+        job = render_queue.submit(
+            render_video,
+            text=video_request.text,
+            enable_audio=video_request.enableAudio,
+            deadline=video_request.deadlineSeconds
+        )
         
-        # Use the Hugging Face model to generate the video
-        generate_video_from_text(main_prompt, temp_video_path)
-        
-        # Generate audio narration if enabled
-        if enable_audio:
-            # Generate audio from the text
-            audio_filename = f"{video_id}.mp3"
-            audio_path = os.path.join(Config.AUDIO_DIR, audio_filename)
-            generate_audio(text, audio_path)
-            
-            # Combine audio with video
-            import subprocess
-            subprocess.run([
-                'ffmpeg',
-                '-i', temp_video_path,
-                '-i', audio_path,
-                '-c:v', 'copy',
-                '-c:a', 'aac',
-                '-map', '0:v:0',
-                '-map', '1:a:0',
-                '-shortest',
-                final_video_path
-            ], check=True)
-            
-            # Clean up temporary files
-            if os.path.exists(temp_video_path):
-                os.remove(temp_video_path)
-        else:
-            # Just use the video without audio
-            import shutil
-            shutil.move(temp_video_path, final_video_path)
-        
-        # Save metadata
-        title = text[:50] + "..." if len(text) > 50 else text
-        metadata = {
-            "id": video_id,
-            "title": title,
-            "text": text,
-            "hasAudio": enable_audio,
-            "createdAt": datetime.now().isoformat(),
-            "filename": video_filename
-        }
-        save_video_metadata(video_id, metadata)
-        
-        # Return the URL to access the video
-        video_url = f"{Config.API_URL}/videos/{video_id}"
-        
-        return {
-            "id": video_id,
-            "videoUrl": video_url,
-            "title": title,
-            "hasAudio": enable_audio
-        }
+        return job_response(job)
         
     except Exception as e:
-        print(f"Error generating video: {str(e)}")
+        print(f"Error queueing video: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to queue video generation")
+
+@video_router.get('/jobs/{job_id}', response_model=JobResponse)
+async def get_job(job_id: str):
+    job = find_job(job_id)
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+        
+    return job_response(job)
+
+@video_router.get('/jobs/{job_id}/result', response_model=VideoResponse)
+async def get_job_result(job_id: str):
+    job = find_job(job_id)
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    if job.status == JOB_FAILED:
         raise HTTPException(status_code=500, detail="Failed to generate video")
+    
+    if job.status != JOB_DONE:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    
+    return {
+        "id": job.result["id"],
+        "videoUrl": f"{Config.API_URL}/videos/{job.result['id']}",
+        "title": job.result["title"],
+        "hasAudio": job.result["hasAudio"]
+    }
+
+@video_router.get('/jobs/{job_id}/events')
+async def get_job_events(job_id: str, request: Request):
+    job = find_job(job_id)
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    tracker = job.progress
+    if render_queue.get(job_id) is None and not job.finished:
+        # The job runs in another worker process; follow the progress it saves
+        def load_event():
+            stored = load_job(job_id)
+            return stored.progress.event if stored is not None else None
+        tracker = PolledProgress(load_event)
+    
+    # Stream progress as Server-Sent Events; the last event carries the job status and video URL
+    return StreamingResponse(
+        progress_events(tracker, request, final_fields=lambda: job_response(find_job(job_id) or job)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @video_router.get('/', response_model=List[VideoListItem])
-async def get_videos():
+def get_videos(response: Response, limit: int = Query(50, ge=1, le=500), cursor: Optional[str] = None):
     try:
-        videos = []
-        metadata_dir = os.path.join(Config.VIDEOS_DIR, "metadata")
-        
-        if os.path.exists(metadata_dir):
-            for filename in os.listdir(metadata_dir):
-                if filename.endswith('.json'):
-                    with open(os.path.join(metadata_dir, filename), 'r') as f:
-                        metadata = json.load(f)
-                        videos.append({
-                            "id": metadata["id"],
-                            "title": metadata["title"],
-                            "url": f"{Config.API_URL}/videos/{metadata['id']}",
-                            "createdAt": metadata["createdAt"]
-                        })
-        
-        # Sort by creation date (newest first)
-        videos.sort(key=lambda x: x["createdAt"], reverse=True)
-        
-        return videos
-        
+        metadata_list, next_cursor = list_video_metadata(limit, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     except Exception as e:
         print(f"Error fetching videos: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to fetch videos")
+    
+    # The cursor for the next page (newest first) is returned in a header
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    
+    return [
+        {
+            "id": metadata["id"],
+            "title": metadata["title"],
+            "url": f"{Config.API_URL}/videos/{metadata['id']}",
+            "createdAt": metadata["createdAt"]
+        }
+        for metadata in metadata_list
+    ]
 
-@video_router.get('/{video_id}')
-async def get_video(video_id: str):
+@video_router.api_route('/{video_id}', methods=['GET', 'HEAD'])
+def get_video(video_id: str, request: Request):
     try:
         video_path = get_video_path(video_id)
         
         if not video_path or not os.path.exists(video_path):
             raise HTTPException(status_code=404, detail="Video not found")
             
-        return FileResponse(video_path, media_type='video/mp4')
+        # Supports Range, ETag and conditional requests so players can seek and resume
+        return video_file_response(request, video_path, media_type='video/mp4')
         
     except HTTPException:
         raise
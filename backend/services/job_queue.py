@@ -0,0 +1,270 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from utils.file_utils import get_job_state, list_unfinished_job_states, save_job_state
+from utils.metrics import RENDER_QUEUE_DEPTH
+from utils.progress import ProgressTracker
+from config import Config
+
+# Job states reported by the status endpoints
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+class Job:
+    """
+    A single unit of work tracked by the job queue
+    """
+
+    def __init__(self, job_id, params):
+        self.id = job_id
+        self.params = params
+        self.status = JOB_QUEUED
+        self.result = None
+        self.error = None
+        self.created_at = datetime.now().isoformat()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+        self.progress = ProgressTracker(job_id)
+        # Process running the job; its state is saved for the other worker processes
+        self.pid = os.getpid()
+        self.saved_stage = None
+        self.saved_at = 0.0
+        self.save_lock = threading.Lock()
+
+    @property
+    def finished(self):
+        return self.status in (JOB_DONE, JOB_FAILED)
+
+    def to_dict(self):
+        """
+        Return a JSON-serializable snapshot of the job
+        """
+        return {
+            "id": self.id,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "createdAt": self.created_at,
+            "startedAt": self.started_at,
+            "finishedAt": self.finished_at,
+        }
+
+    def to_state(self):
+        """
+        Return the job and its latest progress event as saved for other processes
+        """
+        return {**self.to_dict(), "params": self.params, "progress": self.progress.event, "pid": self.pid}
+
+    @classmethod
+    def from_state(cls, state):
+        """
+        Rebuild a job saved by to_state, e.g. one running in another worker process
+        """
+        job = cls(state["id"], state["params"])
+        job.status = state["status"]
+        job.result = state["result"]
+        job.error = state["error"]
+        job.created_at = state["createdAt"]
+        job.started_at = state["startedAt"]
+        job.finished_at = state["finishedAt"]
+        job.pid = state["pid"]
+        job.progress.event = state["progress"]
+        return job
+
+
+class JobQueue:
+    """
+    Run jobs on a fixed-size worker pool, off the event loop
+
+    With save_state, every job's status and progress is saved on each change
+    (progress within a stage at most every state_interval seconds), so that
+    processes other than the one running a job can report on it.
+
+    Args:
+        max_workers (int): Number of jobs allowed to run at the same time
+        history_limit (int): Number of finished jobs kept for status lookups
+        depth_gauge (Gauge): Optional gauge kept at the number of queued or running jobs
+        save_state (callable): Optional function called as save_state(job_id, state, finished, history_limit)
+        state_interval (float): Shortest time between two saves of progress within one stage
+    """
+
+    def __init__(self, max_workers, history_limit=1000, depth_gauge=None, save_state=None, state_interval=1.0):
+        self.max_workers = max_workers
+        self.history_limit = history_limit
+        self.depth_gauge = depth_gauge
+        self.save_state = save_state
+        self.state_interval = state_interval
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _get_executor(self):
+        # Created on first use so the worker threads start in the serving process
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="render-worker"
+            )
+        return self._executor
+
+    def submit(self, fn, job_id=None, **params):
+        """
+        Queue fn(job, **params) for execution and return the Job immediately
+
+        Args:
+            fn (callable): The work to run; its return value becomes job.result
+            job_id (str): Optional ID for the job, a UUID is generated otherwise
+            **params: Keyword arguments passed to fn
+
+        Returns:
+            Job: The queued job
+        """
+        job = Job(job_id or str(uuid.uuid4()), params)
+        job.progress.on_update = lambda event: self._save(job)
+        self._save(job)
+
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+            job.future = self._get_executor().submit(self._run, job, fn)
+        if self.depth_gauge is not None:
+            self.depth_gauge.inc()
+
+        return job
+
+    def _run(self, job, fn):
+        job.status = JOB_RUNNING
+        job.started_at = datetime.now().isoformat()
+        self._save(job)
+
+        try:
+            job.result = fn(job, **job.params)
+            job.status = JOB_DONE
+        except Exception as e:
+            print(f"Job {job.id} failed: {str(e)}")
+            job.error = str(e)
+            job.status = JOB_FAILED
+        finally:
+            job.finished_at = datetime.now().isoformat()
+            job.progress.update(job.status, error=job.error)
+            if self.depth_gauge is not None:
+                self.depth_gauge.dec()
+
+        return job.result
+
+    def _save(self, job):
+        if self.save_state is None:
+            return
+
+        # Snapshot and save under the job's lock, so the last save is always the latest state
+        with job.save_lock:
+            stage = (job.status, job.progress.event["stage"])
+            now = time.monotonic()
+            if stage == job.saved_stage and now - job.saved_at < self.state_interval:
+                return
+
+            try:
+                self.save_state(job.id, job.to_state(), job.finished, self.history_limit)
+            except Exception as e:
+                print(f"Error saving state of job {job.id}: {str(e)}")
+                return
+            job.saved_stage = stage
+            job.saved_at = now
+
+    def _prune(self):
+        # Drop the oldest finished jobs once the history grows past its limit
+        excess = len(self._jobs) - self.history_limit
+        if excess <= 0:
+            return
+
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished][:excess]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        """
+        Look up a job by its ID
+
+        Returns:
+            Job: The job, or None if it is unknown or has been pruned
+        """
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def queue_depth(self):
+        """
+        Return the number of jobs that are queued or running
+        """
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if not job.finished)
+
+    def shutdown(self, wait=True):
+        """
+        Stop the worker pool, dropping jobs that have not started yet
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+
+def load_job(job_id):
+    """
+    Load a job saved by a JobQueue, in this or another process
+
+    Returns:
+        Job: The job, or None if no state was saved for it
+    """
+    state = get_job_state(job_id)
+    return Job.from_state(state) if state is not None else None
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def fail_orphaned_jobs(pids=None):
+    """
+    Mark saved jobs that were queued or running in a process that has exited as failed
+
+    Args:
+        pids (list): Process IDs that have exited; by default, jobs of any process
+            that is no longer alive, or of an earlier process with this one's ID
+
+    Returns:
+        int: Number of jobs marked as failed
+    """
+    failed = 0
+    for state in list_unfinished_job_states():
+        pid = state["pid"]
+        if pids is not None:
+            orphaned = pid in pids
+        else:
+            # This process has not run any job yet, so a job under its ID belongs to an earlier one
+            orphaned = pid == os.getpid() or not _process_alive(pid)
+        if not orphaned:
+            continue
+
+        job = Job.from_state(state)
+        job.status = JOB_FAILED
+        job.error = "The worker process running the job exited"
+        job.finished_at = datetime.now().isoformat()
+        job.progress.update(JOB_FAILED, error=job.error)
+        save_job_state(job.id, job.to_state(), True, Config.JOB_HISTORY_LIMIT)
+        failed += 1
+
+    return failed
+
+
+# Shared queue for video renders; job states go to the metadata store, shared by all worker processes
+render_queue = JobQueue(Config.RENDER_WORKERS, Config.JOB_HISTORY_LIMIT, RENDER_QUEUE_DEPTH, save_job_state)
\ No newline at end of file
@@ -0,0 +1,95 @@
+from models.video_generator import keyframe_count, diffusion_steps, NUM_KEYFRAMES
+from services.job_queue import render_queue
+from utils.latency import render_latency
+from config import Config
+
+# Quality levels from best to cheapest: (keyframes, inference steps, frame size, fps).
+# Keyframe counts are for the default 5-keyframe video and scale with the keyframe mode.
+QUALITY_LADDER = [
+    (5, 20, 512, 24),
+    (5, 15, 512, 24),
+    (4, 12, 448, 24),
+    (3, 10, 384, 20),
+    (3, 8, 320, 16),
+    (2, 6, 256, 12),
+]
+
+
+class RenderPlan:
+    """
+    The render settings chosen for a deadline, with the estimate behind them
+
+    level is the index of the settings in QUALITY_LADDER, 0 for the best quality.
+    """
+
+    def __init__(self, level, keyframes, steps, size, fps, deadline, budget, estimate, keyframe_timeout, concurrency):
+        self.level = level
+        self.keyframes = keyframes
+        self.steps = steps
+        self.size = size
+        self.fps = fps
+        self.deadline = deadline
+        self.budget = budget
+        self.estimate = estimate
+        self.keyframe_timeout = keyframe_timeout
+        self.concurrency = concurrency
+
+    def to_dict(self):
+        """
+        Return a JSON-serializable description of the plan, as saved in the video metadata
+        """
+        return {
+            "level": self.level,
+            "keyframes": self.keyframes,
+            "steps": self.steps,
+            "size": [self.size, self.size],
+            "fps": self.fps,
+            "deadlineSeconds": self.deadline,
+            "budgetSeconds": round(self.budget, 1),
+            "estimatedSeconds": round(self.estimate, 1),
+            "concurrency": self.concurrency,
+        }
+
+
+def estimate_render_seconds(keyframes, steps, size, fps, duration, concurrency=1):
+    """
+    Estimate how long generate_video_from_text takes with the given settings on this host
+
+    Returns:
+        tuple: (keyframe generation seconds, seconds for everything after it)
+    """
+    megapixels = size * size / 1e6
+    diffusion = diffusion_steps(keyframes, steps) * render_latency.get('diffusionStep') * megapixels * concurrency
+    rest = duration * fps * render_latency.get('encodeFrame') * megapixels + render_latency.get('overhead')
+    return diffusion, rest
+
+def plan_render(deadline=None, elapsed=0.0, duration=30):
+    """
+    Choose the best quality level whose estimated render time fits the deadline
+
+    The estimate uses the latencies measured by earlier renders on this host and
+    assumes the renders already running in this process share the diffusion
+    model with this one. When no level fits, the cheapest one is used.
+
+    Args:
+        deadline (float): Seconds from queueing to a finished video, default Config.RENDER_DEADLINE_SECONDS
+        elapsed (float): Seconds the job has already spent in the queue
+        duration (int): Video length in seconds
+
+    Returns:
+        RenderPlan: The chosen settings
+    """
+    deadline = deadline or Config.RENDER_DEADLINE_SECONDS
+    budget = max(0.0, deadline - elapsed)
+    # The queue depth counts this render; only up to RENDER_WORKERS run at once
+    concurrency = max(1, min(render_queue.queue_depth(), render_queue.max_workers))
+
+    for level, (keyframes, steps, size, fps) in enumerate(QUALITY_LADDER):
+        keyframes = max(2, round(keyframes * keyframe_count() / NUM_KEYFRAMES))
+        diffusion, rest = estimate_render_seconds(keyframes, steps, size, fps, duration, concurrency)
+        if diffusion + rest <= budget * Config.PLANNER_SAFETY or level == len(QUALITY_LADDER) - 1:
+            break
+
+    # Keyframes still running when only the rest of the render fits are given up on
+    keyframe_timeout = max(diffusion, budget - rest)
+    return RenderPlan(level, keyframes, steps, size, fps, deadline, budget, diffusion + rest, keyframe_timeout, concurrency)
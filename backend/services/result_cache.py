@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from concurrent.futures import Future
+from config import Config
+
+def normalize_prompt(text):
+    """
+    Normalize prompt text so trivially different submissions share a cache entry
+    """
+    return re.sub(r'\s+', ' ', text).strip()
+
+def render_cache_key(text, settings):
+    """
+    Build the content address of a render
+
+    Args:
+        text (str): The prompt text
+        settings (dict): Every option that affects the output (model, seeds, size, ...)
+
+    Returns:
+        str: Hex SHA-256 digest identifying the render
+    """
+    payload = json.dumps({"text": normalize_prompt(text), "settings": settings}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """
+    Content-addressed cache of finished videos with single-flight rendering
+
+    Each entry maps a render cache key to a video file in Config.VIDEOS_DIR.
+    Identical renders that start while one is already running wait for that
+    render instead of starting their own.
+
+    Args:
+        cache_dir (str): Directory holding the cache index entries
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def lookup(self, key):
+        """
+        Return the cache entry for a key, or None if it is missing or its video is gone
+        """
+        entry_path = self._entry_path(key)
+        if not os.path.exists(entry_path):
+            return None
+
+        try:
+            with open(entry_path, 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if not os.path.exists(os.path.join(Config.VIDEOS_DIR, entry["filename"])):
+            # The video was deleted; forget the stale entry
+            try:
+                os.remove(entry_path)
+            except OSError:
+                pass
+            return None
+
+        return entry
+
+    def store(self, key, entry):
+        """
+        Record a finished render under its key
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        # Write to a temporary file first so readers never see a partial entry
+        tmp_path = f"{self._entry_path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, self._entry_path(key))
+
+    def get_or_render(self, key, render_fn, accept=None):
+        """
+        Return the cached result for key, rendering it at most once at a time
+
+        Args:
+            key (str): The render cache key
+            render_fn (callable): Renders the video and returns a dict with at least
+                "filename"; results marked "fallback" are returned but not cached
+            accept (callable): Optional check of a cached entry; an entry it rejects
+                is rendered again and replaced
+
+        Returns:
+            tuple: (entry dict, bool cache_hit)
+        """
+        entry = self.lookup(key)
+        if entry and (accept is None or accept(entry)):
+            return entry, True
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._in_flight[key] = future
+
+        if not is_leader:
+            # Another job is rendering the same video; share its result
+            return future.result(), True
+
+        try:
+            entry = render_fn()
+            if not entry.get("fallback"):
+                self.store(key, entry)
+            future.set_result(entry)
+            return entry, False
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+
+# Shared cache of rendered videos
+result_cache = ResultCache(Config.RESULT_CACHE_DIR)
\ No newline at end of file
@@ -1,5 +1,6 @@
 import re
 from models.model_loader import get_text_summarization_model
+from utils.metrics import observe_stage
 
 def process_text(text):
     """
@@ -44,7 +45,8 @@ def process_text(text):
     if len(text) > 1000:
         try:
             summarizer = get_text_summarization_model()
-            summary = summarizer(text, max_length=150, min_length=30, do_sample=False)[0]['summary_text']
+            with observe_stage('summarization'):
+                summary = summarizer(text, max_length=150, min_length=30, do_sample=False)[0]['summary_text']
             segments.insert(0, summary)  # Add summary as the first segment
         except Exception as e:
             print(f"Error during summarization: {str(e)}")
@@ -1,15 +1,141 @@
+import os
+from datetime import datetime
 from models.video_composer import create_video_from_images_and_audio
+from models.video_generator import generate_video_from_text, generate_fallback_video, render_settings
+from services.render_planner import plan_render, QUALITY_LADDER
+from services.text_processing import process_text
+from services.result_cache import result_cache, render_cache_key
+from utils.file_utils import save_video_metadata
+from utils.metrics import observe_stage, record_cache_lookup, track_render
+from utils.progress import report
+from utils.workspace import JobWorkspace, WorkspaceQuotaExceeded, publish_file
+from config import Config
 
 def create_video(image_paths, audio_paths, output_path):
     """
     Create a video from images and audio files
-    
+
     Args:
         image_paths (list): List of paths to image files
         audio_paths (list): List of paths to audio files
         output_path (str): Path to save the generated video
-        
+
     Returns:
         str: Path to the generated video file
     """
-    return create_video_from_images_and_audio(image_paths, audio_paths, output_path)
\ No newline at end of file
+    return create_video_from_images_and_audio(image_paths, audio_paths, output_path)
+
+def render_video(job, text, enable_audio=True, deadline=None):
+    """
+    Run the full render pipeline for a queued job and save the video metadata
+
+    Identical requests reuse a cached video (or wait for the render already in
+    progress) instead of rendering again; the job still gets its own metadata.
+    The cache key covers the request, not the quality it ends up rendered at:
+    the job that actually renders asks the render planner for the keyframes,
+    steps, size and fps that fit the deadline given the time already spent in
+    the queue, and every job sharing the result gets its plan in the metadata.
+    A cached video rendered at a lower quality than the planner would choose
+    now, e.g. one degraded under load, is rendered again and replaced.
+
+    Args:
+        job (Job): The job being run; its ID is used as the video ID
+        text (str): The text to generate a video from
+        enable_audio (bool): Whether to add a narration track
+        deadline (float): Seconds from queueing to a finished video, default Config.RENDER_DEADLINE_SECONDS
+
+    Returns:
+        dict: The saved video metadata
+    """
+    video_id = job.id
+    # Planned settings depend on the load, so they must not split identical requests across keys
+    cache_key = render_cache_key(text, render_settings(enable_audio=enable_audio))
+
+    def current_plan():
+        queued_seconds = (datetime.now() - datetime.fromisoformat(job.created_at)).total_seconds()
+        return plan_render(deadline, queued_seconds)
+
+    def accept(entry):
+        # Videos cached before render plans existed were rendered at full quality
+        if "renderPlan" not in entry:
+            return True
+        return entry["renderPlan"].get("level", len(QUALITY_LADDER)) <= current_plan().level
+
+    def render():
+        plan = current_plan()
+        settings = {
+            "num_frames": plan.keyframes,
+            "num_inference_steps": plan.steps,
+            "height": plan.size,
+            "width": plan.size,
+            "fps": plan.fps,
+        }
+
+        # Process text to get a concise prompt
+        report(job.progress, 'text_processing')
+        with observe_stage('text_processing'):
+            segments = process_text(text)
+        main_prompt = segments[0] if segments else text
+
+        # Generate video directly from text, narrating the full text in the same encode
+        video_filename = f"{video_id}.mp4"
+        final_video_path = os.path.join(Config.VIDEOS_DIR, video_filename)
+
+        # Render inside the job's own workspace and publish the finished file at the end,
+        # so concurrent renders never collide and readers never see a partial video
+        with JobWorkspace(video_id) as workspace:
+            output_path = workspace.file(video_filename)
+            fallback = False
+
+            try:
+                # Use the Hugging Face model to generate the video
+                generate_video_from_text(
+                    main_prompt,
+                    output_path,
+                    enable_audio=enable_audio,
+                    narration_text=text,
+                    allow_fallback=False,
+                    workspace=workspace,
+                    progress=job.progress,
+                    keyframe_timeout=plan.keyframe_timeout,
+                    **settings
+                )
+            except WorkspaceQuotaExceeded:
+                raise
+            except Exception as e:
+                print(f"Error in video generation, rendering fallback: {str(e)}")
+                report(job.progress, 'fallback')
+                generate_fallback_video(output_path, 5, enable_audio=enable_audio, text=main_prompt, narration_text=text, workspace=workspace)
+                fallback = True
+
+            publish_file(output_path, final_video_path)
+
+        rendered = {"videoId": video_id, "filename": video_filename, "renderPlan": plan.to_dict()}
+        if fallback:
+            rendered["fallback"] = True
+        return rendered
+
+    with track_render():
+        rendered, cache_hit = result_cache.get_or_render(cache_key, render, accept)
+    record_cache_lookup('result', cache_hit)
+
+    # Save metadata
+    title = text[:50] + "..." if len(text) > 50 else text
+    metadata = {
+        "id": video_id,
+        "title": title,
+        "text": text,
+        "hasAudio": enable_audio,
+        "createdAt": datetime.now().isoformat(),
+        "filename": rendered["filename"],
+        "cacheKey": cache_key
+    }
+    if rendered.get("renderPlan"):
+        metadata["renderPlan"] = rendered["renderPlan"]
+    if cache_hit:
+        metadata["cachedFrom"] = rendered["videoId"]
+    if rendered.get("fallback"):
+        metadata["fallback"] = True
+    save_video_metadata(video_id, metadata)
+
+    return metadata
\ No newline at end of file
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The backend modules import each other from the backend directory, as when the app runs there
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
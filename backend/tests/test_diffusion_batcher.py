@@ -0,0 +1,86 @@
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from PIL import Image
+
+torch = pytest.importorskip("torch")
+
+from models import diffusion_batcher as batcher_module
+from models.diffusion_batcher import DiffusionBatcher, KeyframeRequest
+
+
+class StubPipeline:
+    """
+    Stands in for the Stable Diffusion pipeline: each image is drawn from its own generator
+
+    Records the seeds of the generators and the batch size of every call.
+    """
+
+    device = 'cpu'
+
+    def __init__(self):
+        self.seeds = []
+        self.batch_sizes = []
+
+    def __call__(self, prompt, negative_prompt, num_inference_steps, guidance_scale, generator, callback_on_step_end, output_type, height, width):
+        self.batch_sizes.append(len(prompt))
+        self.seeds.extend(g.initial_seed() for g in generator)
+
+        latents = [torch.randn((height // 8, width // 8, 3), generator=g) for g in generator]
+        for step in range(num_inference_steps):
+            latents = [latent + torch.randn(latent.shape, generator=g) / num_inference_steps for latent, g in zip(latents, generator)]
+            callback_on_step_end(self, step, step, {})
+
+        images = [Image.fromarray(((latent.clamp(-2, 2) + 2) * 63.75).to(torch.uint8).numpy()) for latent in latents]
+        return SimpleNamespace(images=images)
+
+
+class NoCache:
+    def get(self, key):
+        return None
+
+    def put(self, key, image):
+        pass
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    pipe = StubPipeline()
+    monkeypatch.setattr(batcher_module, 'get_image_generation_model', lambda: pipe)
+    monkeypatch.setattr(batcher_module, 'keyframe_cache', NoCache())
+    return pipe
+
+def keyframe_requests(seeds):
+    return [KeyframeRequest(f"prompt {seed}", "blurry", seed, num_inference_steps=4, height=64, width=64) for seed in seeds]
+
+def test_batched_images_match_unbatched_images(pipeline):
+    seeds = [7, 1234, 42, 99999]
+
+    batched = DiffusionBatcher(window_ms=1000, max_batch=8)
+    batched_images = [future.result(timeout=30) for future in batched.submit(keyframe_requests(seeds))]
+    assert pipeline.batch_sizes == [len(seeds)]
+    assert pipeline.seeds == seeds
+
+    pipeline.seeds.clear()
+    pipeline.batch_sizes.clear()
+
+    unbatched = DiffusionBatcher(window_ms=0, max_batch=1)
+    unbatched_images = [unbatched.submit([request])[0].result(timeout=30) for request in keyframe_requests(seeds)]
+    assert pipeline.batch_sizes == [1] * len(seeds)
+    assert pipeline.seeds == seeds
+
+    for batched_image, unbatched_image in zip(batched_images, unbatched_images):
+        assert np.array_equal(np.asarray(batched_image), np.asarray(unbatched_image))
+
+    # Each image comes from its own seed, not from its position in the batch
+    assert not np.array_equal(np.asarray(batched_images[0]), np.asarray(batched_images[1]))
+
+def test_batch_splits_by_settings(pipeline):
+    requests = keyframe_requests([1, 2])
+    requests.append(KeyframeRequest("other size", "blurry", 3, num_inference_steps=4, height=128, width=64))
+
+    batcher = DiffusionBatcher(window_ms=1000, max_batch=8)
+    images = [future.result(timeout=30) for future in batcher.submit(requests)]
+
+    assert sorted(pipeline.batch_sizes) == [1, 2]
+    assert [image.size for image in images] == [(8, 8), (8, 8), (8, 16)]
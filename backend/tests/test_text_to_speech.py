@@ -0,0 +1,117 @@
+import os
+import wave
+import pytest
+from config import Config
+from models import text_to_speech
+from models.text_to_speech import SilentTTSBackend, synthesize_segment, text_to_speech as synthesize_text
+
+
+class CountingBackend(SilentTTSBackend):
+    """
+    Silent backend that records every segment it synthesizes
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def synthesize(self, text, output_path):
+        self.calls.append(text)
+        super().synthesize(text, output_path)
+
+
+@pytest.fixture(autouse=True)
+def tts_cache_dir(tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / 'segments')
+    monkeypatch.setattr(Config, 'TTS_CACHE_DIR', cache_dir)
+    monkeypatch.setattr(text_to_speech, '_segment_cache_limit', text_to_speech.DiskCacheLimit(cache_dir, 0, ('.wav',)))
+    return cache_dir
+
+def frame_count(path):
+    with wave.open(path, 'rb') as f:
+        return f.getnframes()
+
+def test_segment_cache_hit_returns_the_same_file():
+    backend = CountingBackend()
+
+    first = synthesize_segment(backend, "Hello there.")
+    second = synthesize_segment(backend, "Hello there.")
+
+    assert first == second
+    assert backend.calls == ["Hello there."]
+
+def test_segment_cache_is_keyed_on_text(tts_cache_dir):
+    backend = CountingBackend()
+
+    first = synthesize_segment(backend, "Hello there.")
+    second = synthesize_segment(backend, "Goodbye now.")
+
+    assert first != second
+    assert first.startswith(tts_cache_dir) and second.startswith(tts_cache_dir)
+    assert backend.calls == ["Hello there.", "Goodbye now."]
+
+def test_repeated_sentences_are_synthesized_once(tmp_path):
+    backend = CountingBackend()
+
+    synthesize_text("Same line. Same line. Other line.", str(tmp_path / 'speech.wav'), backend)
+
+    assert sorted(backend.calls) == ["Other line.", "Same line."]
+
+def test_join_concatenates_segments(tmp_path):
+    backend = CountingBackend()
+    segments = ["First sentence.", "A second, longer sentence!", "Third?"]
+    output_path = str(tmp_path / 'speech.wav')
+
+    assert synthesize_text(" ".join(segments), output_path, backend) == output_path
+
+    segment_paths = [synthesize_segment(backend, segment) for segment in segments]
+    assert frame_count(output_path) == sum(frame_count(path) for path in segment_paths)
+
+    with wave.open(output_path, 'rb') as out, wave.open(segment_paths[0], 'rb') as segment:
+        assert out.getnchannels() == segment.getnchannels() == 1
+        assert out.getsampwidth() == segment.getsampwidth() == 2
+        assert out.getframerate() == segment.getframerate() == SilentTTSBackend.sampling_rate
+
+def test_single_segment_is_copied(tmp_path):
+    backend = CountingBackend()
+    output_path = str(tmp_path / 'speech.wav')
+
+    synthesize_text("Only one sentence.", output_path, backend)
+
+    with open(output_path, 'rb') as out, open(synthesize_segment(backend, "Only one sentence."), 'rb') as segment:
+        assert out.read() == segment.read()
+
+def test_path_without_extension_gets_the_backend_extension(tmp_path):
+    output_path = synthesize_text("No extension.", str(tmp_path / 'speech'), CountingBackend())
+
+    assert output_path == str(tmp_path / 'speech.wav')
+    assert os.path.exists(output_path)
+
+def test_other_extension_is_transcoded(tmp_path, monkeypatch):
+    commands = []
+
+    def fake_ffmpeg(command, operation):
+        commands.append(command)
+        with open(command[-1], 'wb') as f:
+            f.write(b'mp3')
+
+    monkeypatch.setattr(text_to_speech, 'run_ffmpeg', fake_ffmpeg)
+    output_path = str(tmp_path / 'speech.mp3')
+
+    assert synthesize_text("Needs another format.", output_path, CountingBackend()) == output_path
+    assert len(commands) == 1 and commands[0][-1] == output_path
+    # Only the requested file is left behind
+    assert sorted(os.listdir(tmp_path)) == ['segments', 'speech.mp3']
+
+def test_cache_evicts_least_recently_used_segments(tts_cache_dir, monkeypatch):
+    backend = CountingBackend()
+    first = synthesize_segment(backend, "First.")
+    segment_size = os.path.getsize(first)
+    monkeypatch.setattr(text_to_speech, '_segment_cache_limit', text_to_speech.DiskCacheLimit(tts_cache_dir, segment_size * 2, ('.wav',)))
+
+    second = synthesize_segment(backend, "Other.")
+    os.utime(first, (0, 0))
+    os.utime(second, (1, 1))
+    third = synthesize_segment(backend, "Third.")
+
+    assert not os.path.exists(first)
+    assert os.path.exists(second) and os.path.exists(third)
@@ -0,0 +1,79 @@
+import os
+import threading
+
+
+class DiskCacheLimit:
+    """
+    Keep a cache directory under a size limit by deleting its least recently used files
+
+    A file's modification time is its last use: callers touch() files on every
+    hit and report the size of every file they add. Once the running total
+    passes the limit the directory is rescanned, since other processes share
+    it, and the oldest files are deleted until it fits again.
+
+    Args:
+        cache_dir (str): Directory holding the cached files, searched recursively
+        max_bytes (int): Size limit of the cached files, 0 for no limit
+        extensions (tuple): File extensions that count as cache entries; temporary files are ignored
+    """
+
+    def __init__(self, cache_dir, max_bytes=0, extensions=()):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.extensions = tuple(extensions)
+        self._total_bytes = None
+        self._lock = threading.Lock()
+
+    def touch(self, path):
+        """
+        Mark a cached file as just used
+        """
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def added(self, size):
+        """
+        Account for a file of size bytes added to the cache and evict old entries if over the limit
+        """
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._scan_size()
+            else:
+                self._total_bytes += size
+
+            if self.max_bytes and self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(self.extensions):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, os.path.join(root, name)))
+        return entries
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        # Rescan since other processes share the directory, then drop the oldest files
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+        self._total_bytes = total
@@ -1,7 +1,13 @@
 import os
 import json
+import base64
+import sqlite3
+import threading
+import time
 from config import Config
 
+_local = threading.local()
+
 def get_video_path(video_id):
     """
     Get the path to a video file by its ID
@@ -18,27 +24,203 @@ def get_video_path(video_id):
     if os.path.exists(video_path):
         return video_path
     
+    # Videos served from the result cache point at another video's file
+    metadata = get_video_metadata(video_id)
+    if metadata and metadata.get("filename"):
+        video_path = os.path.join(Config.VIDEOS_DIR, os.path.basename(metadata["filename"]))
+        if os.path.exists(video_path):
+            return video_path
+    
     return None
 
+def _connect():
+    # SQLite connections cannot be shared across threads, so keep one per thread
+    connection = getattr(_local, 'connection', None)
+    if connection is None:
+        os.makedirs(os.path.dirname(Config.METADATA_DB), exist_ok=True)
+        connection = sqlite3.connect(Config.METADATA_DB, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript("""
+            CREATE TABLE IF NOT EXISTS videos (
+                id TEXT PRIMARY KEY,
+                created_at TEXT NOT NULL,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_videos_created_at ON videos (created_at DESC, id DESC);
+            CREATE TABLE IF NOT EXISTS store_info (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                finished INTEGER NOT NULL,
+                updated_at REAL NOT NULL,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs (finished, updated_at);
+        """)
+        _local.connection = connection
+    return connection
+
+def get_video_metadata(video_id):
+    """
+    Load the metadata saved for a video
+    
+    Args:
+        video_id (str): The ID of the video
+        
+    Returns:
+        dict: The metadata, or None if not found
+    """
+    row = _connect().execute("SELECT data FROM videos WHERE id = ?", (video_id,)).fetchone()
+    
+    return json.loads(row[0]) if row else None
+
 def save_video_metadata(video_id, metadata):
     """
-    Save video metadata to a JSON file
+    Save video metadata to the metadata store
     
     Args:
         video_id (str): The ID of the video
-        metadata (dict): The metadata to save
+        metadata (dict): The metadata to save; must include createdAt
         
     Returns:
-        str: Path to the metadata file
+        str: Path to the metadata store
     """
-    # Create metadata directory if it doesn't exist
-    metadata_dir = os.path.join(Config.VIDEOS_DIR, "metadata")
-    os.makedirs(metadata_dir, exist_ok=True)
+    connection = _connect()
+    with connection:
+        connection.execute(
+            "INSERT OR REPLACE INTO videos (id, created_at, data) VALUES (?, ?, ?)",
+            (video_id, metadata["createdAt"], json.dumps(metadata))
+        )
     
-    # Save metadata to a JSON file
-    metadata_path = os.path.join(metadata_dir, f"{video_id}.json")
+    return Config.METADATA_DB
+
+def save_job_state(job_id, state, finished, history_limit=0):
+    """
+    Save the state of a render job where every worker process can read it
     
-    with open(metadata_path, 'w') as f:
-        json.dump(metadata, f, indent=2)
+    Args:
+        job_id (str): The ID of the job
+        state (dict): JSON-serializable job state
+        finished (bool): Whether the job has finished
+        history_limit (int): Number of finished jobs to keep, 0 to keep all
+    """
+    connection = _connect()
+    with connection:
+        connection.execute(
+            "INSERT OR REPLACE INTO jobs (id, finished, updated_at, data) VALUES (?, ?, ?, ?)",
+            (job_id, int(finished), time.time(), json.dumps(state))
+        )
+        if finished and history_limit:
+            connection.execute(
+                "DELETE FROM jobs WHERE finished = 1 AND id NOT IN "
+                "(SELECT id FROM jobs WHERE finished = 1 ORDER BY updated_at DESC LIMIT ?)",
+                (history_limit,)
+            )
+
+def get_job_state(job_id):
+    """
+    Load the saved state of a render job
+    
+    Returns:
+        dict: The state, or None if not found
+    """
+    row = _connect().execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    
+    return json.loads(row[0]) if row else None
+
+def list_unfinished_job_states():
+    """
+    Return the saved states of all jobs that have not finished
+    """
+    rows = _connect().execute("SELECT data FROM jobs WHERE finished = 0").fetchall()
+    
+    return [json.loads(row[0]) for row in rows]
+
+def encode_cursor(created_at, video_id):
+    """
+    Encode a listing position as an opaque cursor string
+    """
+    return base64.urlsafe_b64encode(json.dumps([created_at, video_id]).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor made by encode_cursor
+    
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        created_at, video_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    
+    return str(created_at), str(video_id)
+
+def list_video_metadata(limit=50, cursor=None):
+    """
+    List video metadata, newest first, one page at a time
+    
+    Args:
+        limit (int): Maximum number of videos to return
+        cursor (str): Cursor returned with the previous page, None for the first page
+        
+    Returns:
+        tuple: (list of metadata dicts, cursor for the next page or None)
+    """
+    query = "SELECT created_at, id, data FROM videos"
+    params = []
+    
+    if cursor:
+        query += " WHERE (created_at, id) < (?, ?)"
+        params.extend(decode_cursor(cursor))
+    
+    # Fetch one extra row to find out whether another page follows
+    query += " ORDER BY created_at DESC, id DESC LIMIT ?"
+    params.append(limit + 1)
+    
+    rows = _connect().execute(query, params).fetchall()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][0], rows[-1][1])
+    
+    return [json.loads(row[2]) for row in rows], next_cursor
+
+def migrate_json_metadata():
+    """
+    Import the per-video JSON metadata files into the metadata store
+    
+    Runs once; later calls return immediately.
+    
+    Returns:
+        int: Number of videos imported
+    """
+    connection = _connect()
+    if connection.execute("SELECT value FROM store_info WHERE key = 'json_migrated'").fetchone():
+        return 0
+    
+    imported = 0
+    metadata_dir = os.path.join(Config.VIDEOS_DIR, "metadata")
+    
+    with connection:
+        if os.path.exists(metadata_dir):
+            for filename in os.listdir(metadata_dir):
+                if not filename.endswith('.json'):
+                    continue
+                try:
+                    with open(os.path.join(metadata_dir, filename), 'r') as f:
+                        metadata = json.load(f)
+                    cursor = connection.execute(
+                        "INSERT OR IGNORE INTO videos (id, created_at, data) VALUES (?, ?, ?)",
+                        (metadata["id"], metadata["createdAt"], json.dumps(metadata))
+                    )
+                    imported += cursor.rowcount
+                except Exception as e:
+                    print(f"Error importing metadata {filename}: {str(e)}")
+        
+        connection.execute("INSERT OR REPLACE INTO store_info (key, value) VALUES ('json_migrated', ?)", (str(imported),))
     
-    return metadata_path
\ No newline at end of file
+    return imported
\ No newline at end of file
@@ -0,0 +1,18 @@
+def resolve_future(future, result=None, exception=None):
+    """
+    Set the result (or exception) of a pending future unless its caller cancelled it
+
+    Work queued on a future leaves it pending until the result is ready, so
+    the caller can still cancel it while the work runs; the worker checks
+    future.cancelled() to stop early and resolves it here at the end.
+
+    Returns:
+        bool: Whether the future was resolved, False if it had been cancelled
+    """
+    if not future.set_running_or_notify_cancel():
+        return False
+    if exception is not None:
+        future.set_exception(exception)
+    else:
+        future.set_result(result)
+    return True
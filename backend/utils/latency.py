@@ -0,0 +1,119 @@
+import json
+import os
+import threading
+from config import Config
+
+# Costs assumed before anything has been measured on this host, sized for CPU inference so
+# the first renders are planned conservatively; every measured render replaces them
+DEFAULT_COSTS = {
+    # Seconds per UNet step of one image, per megapixel (VAE decodes count as a few steps)
+    "diffusionStep": 6.0,
+    # Seconds to interpolate and encode one output frame, per megapixel
+    "encodeFrame": 0.02,
+    # Seconds of fixed work per render: narration, captions, muxing
+    "overhead": 20.0,
+}
+
+
+class LatencyEstimator:
+    """
+    Moving averages of render costs measured on this host
+
+    Diffusion cost is normalized by the number of renders denoising at the same
+    time, so the planner can scale it by the expected concurrency. The averages
+    are saved to a JSON file and survive restarts.
+
+    Args:
+        path (str): File the averages are persisted to
+        alpha (float): Weight of each new measurement in the moving averages
+    """
+
+    def __init__(self, path, alpha=0.3):
+        self.path = path
+        self.alpha = alpha
+        self._costs = None
+        self._active_diffusions = 0
+        self._lock = threading.Lock()
+
+    def _load(self):
+        # Called with the lock held
+        if self._costs is None:
+            self._costs = dict(DEFAULT_COSTS)
+            try:
+                with open(self.path, 'r') as f:
+                    self._costs.update({key: float(value) for key, value in json.load(f).items() if key in DEFAULT_COSTS})
+            except (OSError, ValueError):
+                pass
+        return self._costs
+
+    def get(self, name):
+        """
+        Return the current estimate of a cost in DEFAULT_COSTS
+        """
+        with self._lock:
+            return self._load()[name]
+
+    def observe(self, name, value):
+        """
+        Fold a measurement of a cost into its moving average and persist the result
+        """
+        with self._lock:
+            costs = self._load()
+            costs[name] = (1 - self.alpha) * costs[name] + self.alpha * value
+            snapshot = dict(costs)
+
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Error saving latency estimates: {str(e)}")
+
+    def begin_diffusion(self):
+        """
+        Mark a render's keyframe generation as started
+
+        Returns:
+            int: Renders generating keyframes in this process, this one included
+        """
+        with self._lock:
+            self._active_diffusions += 1
+            return self._active_diffusions
+
+    def end_diffusion(self):
+        """
+        Mark a render's keyframe generation as finished
+
+        Returns:
+            int: Renders that were generating keyframes up to now, this one included
+        """
+        with self._lock:
+            active = self._active_diffusions
+            self._active_diffusions -= 1
+            return active
+
+    def observe_diffusion(self, seconds, steps, pixels, concurrency=1):
+        """
+        Record how long a render's keyframes took
+
+        Args:
+            seconds (float): Wall time of the keyframe generation
+            steps (float): UNet steps run for the render, counting VAE decodes as steps
+            pixels (int): Pixels per keyframe
+            concurrency (int): Renders that were generating keyframes at the same time
+        """
+        if steps > 0 and pixels > 0:
+            self.observe('diffusionStep', seconds / steps / (pixels / 1e6) / max(1, concurrency))
+
+    def observe_encode(self, seconds, frames, pixels):
+        """
+        Record how long interpolating and encoding a render's frames took
+        """
+        if frames > 0 and pixels > 0:
+            self.observe('encodeFrame', seconds / frames / (pixels / 1e6))
+
+
+# Shared estimator, updated by every render in this process
+render_latency = LatencyEstimator(Config.LATENCY_PROFILE)
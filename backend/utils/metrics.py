@@ -0,0 +1,151 @@
+import os
+import time
+from contextlib import contextmanager
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY, CONTENT_TYPE_LATEST, CollectorRegistry, generate_latest, multiprocess
+from prometheus_client.core import GaugeMetricFamily
+
+# Pipeline stages run from milliseconds (captions) to minutes (diffusion on CPU)
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+
+STAGE_SECONDS = Histogram(
+    'shorts_stage_seconds',
+    'Time spent in each pipeline stage',
+    ['stage'],
+    buckets=STAGE_BUCKETS
+)
+RENDERS_IN_FLIGHT = Gauge(
+    'shorts_renders_in_flight',
+    'Render jobs currently running',
+    # Summed across live workers when served by several processes
+    multiprocess_mode='livesum'
+)
+RENDER_QUEUE_DEPTH = Gauge(
+    'shorts_render_queue_depth',
+    'Render jobs queued or running',
+    # Each worker runs its own queue; the total is what is waiting on the host
+    multiprocess_mode='livesum'
+)
+RENDERS_TOTAL = Counter(
+    'shorts_renders_total',
+    'Finished render jobs by outcome',
+    ['outcome']
+)
+FALLBACKS_TOTAL = Counter(
+    'shorts_fallbacks_total',
+    'Renders that fell back to the placeholder video'
+)
+CACHE_REQUESTS_TOTAL = Counter(
+    'shorts_cache_requests_total',
+    'Cache lookups by cache and result (hit or miss)',
+    ['cache', 'result']
+)
+FFMPEG_FAILURES_TOTAL = Counter(
+    'shorts_ffmpeg_failures_total',
+    'ffmpeg runs that exited with an error',
+    ['operation']
+)
+
+def observe_stage(stage):
+    """
+    Return a context manager that records the time spent in a pipeline stage
+
+    Args:
+        stage (str): Stage name, e.g. 'diffusion' or 'encode'
+    """
+    return STAGE_SECONDS.labels(stage=stage).time()
+
+def timed_iter(iterable, stage):
+    """
+    Yield from iterable, recording the total time spent producing its items as one stage observation
+
+    Used where a stage is interleaved with another one, such as interpolation
+    streaming frames into the encoder.
+    """
+    elapsed = 0.0
+    iterator = iter(iterable)
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                elapsed += time.perf_counter() - start
+            yield item
+    finally:
+        STAGE_SECONDS.labels(stage=stage).observe(elapsed)
+
+def record_cache_lookup(cache, hit):
+    """
+    Count a cache lookup
+
+    Args:
+        cache (str): Cache name, e.g. 'result' or 'keyframe'
+        hit (bool): Whether the lookup was a hit
+    """
+    CACHE_REQUESTS_TOTAL.labels(cache=cache, result='hit' if hit else 'miss').inc()
+
+@contextmanager
+def track_render():
+    """
+    Track a render job as in flight and count its outcome when it finishes
+    """
+    RENDERS_IN_FLIGHT.inc()
+    try:
+        yield
+    except Exception:
+        RENDERS_TOTAL.labels(outcome='failed').inc()
+        raise
+    else:
+        RENDERS_TOTAL.labels(outcome='done').inc()
+    finally:
+        RENDERS_IN_FLIGHT.dec()
+
+
+class ModelRegistryCollector:
+    """
+    Report the models held by the model registry at scrape time
+    """
+
+    def describe(self):
+        # Lets the collector register without importing the registry yet
+        yield GaugeMetricFamily('shorts_loaded_models', 'Models currently loaded in memory')
+        yield GaugeMetricFamily('shorts_model_memory_bytes', 'Estimated memory held by each loaded model', labels=['model'])
+
+    def collect(self):
+        from models.model_registry import model_registry
+
+        loaded = model_registry.loaded_models()
+
+        count = GaugeMetricFamily('shorts_loaded_models', 'Models currently loaded in memory')
+        count.add_metric([], len(loaded))
+        yield count
+
+        memory = GaugeMetricFamily('shorts_model_memory_bytes', 'Estimated memory held by each loaded model', labels=['model'])
+        for key, size in loaded.items():
+            memory.add_metric([key], size)
+        yield memory
+
+
+REGISTRY.register(ModelRegistryCollector())
+
+def render_metrics():
+    """
+    Return the current metrics in the Prometheus text format
+
+    Under the preforking server (PROMETHEUS_MULTIPROC_DIR set) the counters,
+    histograms and gauges of every worker are aggregated, whichever worker
+    serves the scrape.
+
+    Returns:
+        tuple: (body bytes, content type)
+    """
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    # Workers share the preloaded models, so any worker's view of the registry will do
+    registry.register(ModelRegistryCollector())
+    return generate_latest(registry), CONTENT_TYPE_LATEST
\ No newline at end of file
@@ -0,0 +1,218 @@
+import asyncio
+import json
+import threading
+import time
+
+# Share of the whole render covered by each stage, as (start, end) fractions
+STAGE_RANGES = {
+    "queued": (0.0, 0.0),
+    "text_processing": (0.0, 0.02),
+    "keyframes": (0.02, 0.75),
+    "captions": (0.75, 0.77),
+    "narration": (0.77, 0.82),
+    "encoding": (0.82, 0.98),
+    "muxing": (0.98, 1.0),
+    "fallback": (0.82, 1.0),
+}
+
+# Stages reported once the job has finished
+TERMINAL_STAGES = ("done", "failed")
+
+
+class ProgressTracker:
+    """
+    The progress of one render job, published to any number of subscribers
+
+    Render code calls update() from worker threads; each subscriber is an
+    asyncio queue on an event loop, fed with call_soon_threadsafe, so the
+    stream endpoint never blocks a thread waiting for events. Every event
+    carries the overall progress and an ETA extrapolated from the time spent
+    so far.
+
+    Args:
+        job_id (str): The job being tracked
+        on_update (callable): Optional function called with every new event, from the updating thread
+    """
+
+    def __init__(self, job_id, on_update=None):
+        self.job_id = job_id
+        self.on_update = on_update
+        self.started = None
+        self.event = self._build_event("queued", 0.0, {})
+        self._lock = threading.Lock()
+        self._subscribers = []
+
+    def _build_event(self, stage, progress, details, eta=None):
+        return {
+            "jobId": self.job_id,
+            "stage": stage,
+            "progress": round(progress, 4),
+            "etaSeconds": None if eta is None else round(eta, 1),
+            **details,
+        }
+
+    def update(self, stage, fraction=0.0, **details):
+        """
+        Report progress within a stage
+
+        Args:
+            stage (str): A key of STAGE_RANGES, or 'done' / 'failed'
+            fraction (float): How far through the stage the job is, from 0 to 1
+            **details: Extra fields for the event, e.g. keyframe=2, keyframes=5
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            if stage in TERMINAL_STAGES:
+                progress = 1.0 if stage == "done" else self.event["progress"]
+                eta = 0.0 if stage == "done" else None
+            else:
+                if self.started is None:
+                    self.started = now
+                start, end = STAGE_RANGES[stage]
+                progress = start + (end - start) * min(max(fraction, 0.0), 1.0)
+                # Never report going backwards, e.g. when a render falls back
+                progress = max(progress, self.event["progress"])
+
+                eta = None
+                elapsed = now - self.started
+                if progress >= 0.05 and elapsed > 0:
+                    eta = elapsed * (1 - progress) / progress
+
+            self.event = self._build_event(stage, progress, details, eta)
+            event = self.event
+            subscribers = list(self._subscribers)
+
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:
+                # The subscriber's event loop has closed
+                self.unsubscribe(queue)
+
+        if self.on_update is not None:
+            self.on_update(event)
+
+    def subscribe(self, loop, queue):
+        """
+        Start delivering events to an asyncio queue, beginning with the latest one
+
+        Args:
+            loop (asyncio.AbstractEventLoop): The loop that owns the queue
+            queue (asyncio.Queue): Queue receiving the event dicts
+        """
+        with self._lock:
+            self._subscribers.append((loop, queue))
+            queue.put_nowait(self.event)
+
+    def unsubscribe(self, queue):
+        """
+        Stop delivering events to a queue
+        """
+        with self._lock:
+            self._subscribers = [(loop, q) for loop, q in self._subscribers if q is not queue]
+
+    @property
+    def finished(self):
+        return self.event["stage"] in TERMINAL_STAGES
+
+class PolledProgress:
+    """
+    The progress of a job tracked in another process, read by polling its latest event
+
+    Offers the subscriber side of ProgressTracker, so progress_events can
+    stream it. Each subscriber gets a task on its event loop that calls
+    load_event in a thread every poll_seconds and delivers the event whenever
+    it changes, until the job finishes.
+
+    Args:
+        load_event (callable): Returns the job's latest event dict, or None if it is gone
+        poll_seconds (float): Time between two polls
+    """
+
+    def __init__(self, load_event, poll_seconds=1.0):
+        self.load_event = load_event
+        self.poll_seconds = poll_seconds
+        self._tasks = {}
+
+    async def _poll(self, queue):
+        last = None
+        while True:
+            event = await asyncio.to_thread(self.load_event)
+            if event is not None and event != last:
+                queue.put_nowait(event)
+                last = event
+                if event["stage"] in TERMINAL_STAGES:
+                    return
+            await asyncio.sleep(self.poll_seconds)
+
+    def subscribe(self, loop, queue):
+        self._tasks[id(queue)] = loop.create_task(self._poll(queue))
+
+    def unsubscribe(self, queue):
+        task = self._tasks.pop(id(queue), None)
+        if task is not None:
+            task.cancel()
+
+def report(progress, stage, fraction=0.0, **details):
+    """
+    Report progress to a tracker, doing nothing when there is none
+
+    Lets pipeline functions take an optional tracker without checking for it everywhere.
+    """
+    if progress is not None:
+        progress.update(stage, fraction, **details)
+
+def format_sse(event, event_id=None):
+    """
+    Format an event dict as a Server-Sent Events message
+
+    The SSE event type is 'progress' while the job runs and the terminal stage
+    ('done' or 'failed') at the end.
+    """
+    event_type = event["stage"] if event["stage"] in TERMINAL_STAGES else "progress"
+    message = f"event: {event_type}\n"
+    if event_id is not None:
+        message += f"id: {event_id}\n"
+    return message + f"data: {json.dumps(event)}\n\n"
+
+async def progress_events(tracker, request, keepalive_seconds=15, final_fields=None):
+    """
+    Yield a job's progress as Server-Sent Events until it finishes or the client disconnects
+
+    Comment lines are sent while nothing changes, so proxies keep the
+    connection open.
+
+    Args:
+        tracker (ProgressTracker): The job's tracker
+        request (Request): The streaming request, checked for disconnects
+        keepalive_seconds (float): Longest silence before a keep-alive comment
+        final_fields (callable): Optional function returning extra fields for the terminal event
+
+    Yields:
+        str: The next SSE message
+    """
+    queue = asyncio.Queue()
+    tracker.subscribe(asyncio.get_running_loop(), queue)
+
+    try:
+        event_id = 0
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=keepalive_seconds)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    return
+                yield ": keep-alive\n\n"
+                continue
+
+            event_id += 1
+            finished = event["stage"] in TERMINAL_STAGES
+            if finished and final_fields is not None:
+                event = {**event, **final_fields()}
+            yield format_sse(event, event_id)
+
+            if finished:
+                return
+    finally:
+        tracker.unsubscribe(queue)
@@ -0,0 +1,100 @@
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+
+
+class SharedArray:
+    """
+    A reference to a numpy array placed in shared memory by share_array
+
+    Only the reference is pickled between processes; the receiver maps the
+    block, copies the array out and frees the block.
+    """
+
+    def __init__(self, name, shape, dtype):
+        self.name = name
+        self.shape = shape
+        self.dtype = dtype
+
+
+def share_array(array):
+    """
+    Copy an array into a new shared memory block and hand the block over to its receiver
+
+    Returns:
+        SharedArray: Reference to pass to receive_array in the other process
+    """
+    array = np.ascontiguousarray(array)
+    block = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+
+    shared = SharedArray(block.name, array.shape, array.dtype.str)
+    block.close()
+    # The receiver unlinks the block, so this process's resource tracker must
+    # not unlink it (and warn about a leak) when this process exits
+    resource_tracker.unregister(block._name, 'shared_memory')
+    return shared
+
+def receive_array(shared):
+    """
+    Copy an array out of shared memory and free the block
+
+    Args:
+        shared (SharedArray): Reference returned by share_array
+
+    Returns:
+        np.ndarray: The array
+    """
+    block = shared_memory.SharedMemory(name=shared.name)
+    try:
+        return np.ndarray(shared.shape, dtype=shared.dtype, buffer=block.buf).copy()
+    finally:
+        block.close()
+        block.unlink()
+
+def discard_array(shared):
+    """
+    Free a shared array that will never be received; does nothing if it already was
+    """
+    try:
+        block = shared_memory.SharedMemory(name=shared.name)
+    except FileNotFoundError:
+        return
+    block.close()
+    block.unlink()
+
+def share_arrays(value):
+    """
+    Return value with every numpy array in it, including inside dicts, lists and tuples, replaced by a SharedArray
+    """
+    if isinstance(value, np.ndarray):
+        return share_array(value)
+    if isinstance(value, dict):
+        return {key: share_arrays(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(share_arrays(item) for item in value)
+    return value
+
+def receive_arrays(value):
+    """
+    Return value with every SharedArray in it replaced by the received array
+    """
+    if isinstance(value, SharedArray):
+        return receive_array(value)
+    if isinstance(value, dict):
+        return {key: receive_arrays(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(receive_arrays(item) for item in value)
+    return value
+
+def discard_arrays(value):
+    """
+    Free every SharedArray in value that has not been received yet
+    """
+    if isinstance(value, SharedArray):
+        discard_array(value)
+    elif isinstance(value, dict):
+        for item in value.values():
+            discard_arrays(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            discard_arrays(item)
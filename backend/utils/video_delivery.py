@@ -0,0 +1,174 @@
+import os
+import re
+from email.utils import formatdate, parsedate_to_datetime
+import anyio
+from starlette.responses import Response
+from config import Config
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class FileRangeResponse(Response):
+    """
+    Send a byte range of a file
+
+    Uses the ASGI zero-copy send extension (sendfile) when the server offers it
+    and falls back to reading the file in chunks otherwise.
+
+    Args:
+        path (str): Path to the file
+        start (int): First byte to send
+        end (int): Last byte to send, inclusive
+        status_code (int): 200 for the whole file, 206 for a partial range
+        headers (dict): Response headers
+        media_type (str): Content type of the file
+    """
+
+    chunk_size = 1024 * 1024
+
+    def __init__(self, path, start, end, status_code=200, headers=None, media_type=None):
+        self.path = path
+        self.start = start
+        self.end = end
+        self.status_code = status_code
+        self.media_type = media_type
+        self.background = None
+        self.init_headers(headers)
+        self.headers["content-length"] = str(end - start + 1)
+
+    async def __call__(self, scope, receive, send):
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+
+        count = self.end - self.start + 1
+        if scope["method"].upper() == "HEAD" or count <= 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        if "http.response.zerocopysend" in scope.get("extensions", {}):
+            with open(self.path, 'rb') as file:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file,
+                    "offset": self.start,
+                    "count": count,
+                    "more_body": False,
+                })
+            return
+
+        async with await anyio.open_file(self.path, mode='rb') as file:
+            await file.seek(self.start)
+            remaining = count
+            while remaining > 0:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({
+                    "type": "http.response.body",
+                    "body": chunk,
+                    "more_body": remaining > 0,
+                })
+
+            if remaining > 0:
+                # The file shrank while sending; end the body rather than hang
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+def parse_range(range_header, size):
+    """
+    Parse a single-range Range header
+
+    Args:
+        range_header (str): The Range header value
+        size (int): Size of the file in bytes
+
+    Returns:
+        tuple: (start, end) inclusive, None to serve the whole file (unsupported or
+        multi-range requests), or False if the range cannot be satisfied
+    """
+    match = _RANGE_RE.match(range_header.strip())
+    if not match:
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+
+    return start, end
+
+def _etag_matches(if_none_match, etag):
+    candidates = [candidate.strip() for candidate in if_none_match.split(',')]
+    # Weak comparison applies to If-None-Match
+    return '*' in candidates or etag in candidates or f"W/{etag}" in candidates
+
+def video_file_response(request, path, media_type='video/mp4'):
+    """
+    Build the response for a video download, honouring conditional and range requests
+
+    Videos are written once and never modified, so the ETag derived from the
+    file's identity, size and modification time is strong and clients may
+    cache them for Config.VIDEO_CACHE_MAX_AGE seconds.
+
+    Args:
+        request (Request): The incoming request
+        path (str): Path to the video file
+        media_type (str): Content type of the file
+
+    Returns:
+        Response: 200, 206, 304 or 416 response
+    """
+    stat_result = os.stat(path)
+    size = stat_result.st_size
+    etag = f'"{stat_result.st_ino:x}-{size:x}-{stat_result.st_mtime_ns:x}"'
+    last_modified = formatdate(stat_result.st_mtime, usegmt=True)
+
+    headers = {
+        "etag": etag,
+        "last-modified": last_modified,
+        "accept-ranges": "bytes",
+        "cache-control": f"public, max-age={Config.VIDEO_CACHE_MAX_AGE}, immutable",
+    }
+
+    # Conditional GET: If-None-Match takes precedence over If-Modified-Since
+    if_none_match = request.headers.get('if-none-match')
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_none_match is not None:
+        if _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+    elif if_modified_since:
+        try:
+            if int(stat_result.st_mtime) <= parsedate_to_datetime(if_modified_since).timestamp():
+                return Response(status_code=304, headers=headers)
+        except (TypeError, ValueError):
+            pass
+
+    range_header = request.headers.get('range')
+    if_range = request.headers.get('if-range')
+    if range_header and (not if_range or if_range.strip() in (etag, last_modified)):
+        byte_range = parse_range(range_header, size)
+
+        if byte_range is False:
+            headers["content-range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+
+        if byte_range is not None:
+            start, end = byte_range
+            headers["content-range"] = f"bytes {start}-{end}/{size}"
+            return FileRangeResponse(path, start, end, status_code=206, headers=headers, media_type=media_type)
+
+    return FileRangeResponse(path, 0, size - 1, status_code=200, headers=headers, media_type=media_type)
\ No newline at end of file
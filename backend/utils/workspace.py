@@ -0,0 +1,245 @@
+import atexit
+import errno
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from contextlib import contextmanager
+from config import Config
+
+_WORKSPACE_PREFIX = 'job_'
+# Tells this run's workspaces from those of an earlier run that had the same PID,
+# as a restarted container usually does
+_INSTANCE_ID = uuid.uuid4().hex[:8]
+
+_active_workspaces = set()
+_active_lock = threading.Lock()
+
+
+class WorkspaceQuotaExceeded(Exception):
+    """
+    Raised when a job writes more scratch data than its quota allows
+    """
+
+
+def workspace_root():
+    """
+    Return the directory that holds job workspaces
+
+    Uses tmpfs (/dev/shm) when Config.SCRATCH_USE_TMPFS is set and available.
+    """
+    if Config.SCRATCH_USE_TMPFS and os.path.isdir('/dev/shm'):
+        return os.path.join('/dev/shm', 'shorts-video')
+    return Config.SCRATCH_DIR
+
+
+class JobWorkspace:
+    """
+    A private scratch directory for one render job
+
+    Every intermediate file of a job lives here, so concurrent renders never
+    share file names. The directory is removed when the workspace is closed,
+    whether the job succeeded, failed or was cancelled. Use as a context manager.
+
+    Args:
+        job_id (str): Optional job ID included in the directory name
+        quota_bytes (int): Maximum scratch data for the job, 0 for no limit
+        root (str): Parent directory, defaults to workspace_root()
+    """
+
+    def __init__(self, job_id=None, quota_bytes=None, root=None):
+        self.job_id = job_id
+        self.quota_bytes = Config.WORKSPACE_QUOTA_MB * 2**20 if quota_bytes is None else quota_bytes
+        self.root = root or workspace_root()
+        self.path = None
+
+    def open(self):
+        """
+        Create the workspace directory
+        """
+        os.makedirs(self.root, exist_ok=True)
+        # The PID and instance ID in the name let startup cleanup tell live workspaces from stale ones
+        prefix = f"{_WORKSPACE_PREFIX}{os.getpid()}_{_INSTANCE_ID}_{self.job_id + '_' if self.job_id else ''}"
+        self.path = tempfile.mkdtemp(prefix=prefix, dir=self.root)
+
+        with _active_lock:
+            _active_workspaces.add(self.path)
+
+        return self
+
+    def close(self):
+        """
+        Remove the workspace directory and everything in it
+        """
+        if self.path is None:
+            return
+
+        shutil.rmtree(self.path, ignore_errors=True)
+        with _active_lock:
+            _active_workspaces.discard(self.path)
+        self.path = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def file(self, name):
+        """
+        Return the path of a file inside the workspace
+        """
+        return os.path.join(self.path, name)
+
+    def mkdir(self, name):
+        """
+        Create and return a subdirectory inside the workspace
+        """
+        path = self.file(name)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def usage(self):
+        """
+        Return the bytes currently stored in the workspace
+        """
+        total = 0
+        for root, _, files in os.walk(self.path):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return total
+
+    def check_quota(self):
+        """
+        Raise WorkspaceQuotaExceeded if the workspace is over its quota
+        """
+        if not self.quota_bytes:
+            return
+
+        usage = self.usage()
+        if usage > self.quota_bytes:
+            raise WorkspaceQuotaExceeded(
+                f"Workspace {self.path} uses {usage / 2**20:.1f} MB, over its {self.quota_bytes / 2**20:.0f} MB quota"
+            )
+
+def publish_file(path, destination):
+    """
+    Move a finished file to its destination so readers there never see it partially written
+
+    A rename is atomic within a filesystem. A workspace on tmpfs is on another
+    one, where moving would copy into place, so the file is copied next to the
+    destination under a temporary name first and then renamed over it.
+
+    Returns:
+        str: The destination path
+    """
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    try:
+        os.replace(path, destination)
+        return destination
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+
+    tmp_path = f"{destination}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        shutil.copyfile(path, tmp_path)
+        os.replace(tmp_path, destination)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.remove(path)
+    return destination
+
+def hold_file(path, destination):
+    """
+    Give a shared file, such as a cache entry, a second name that keeps it alive
+
+    The file is hard-linked to destination, so it survives being deleted under
+    its own name, e.g. by cache eviction in another process. A destination on
+    another filesystem gets a copy instead.
+
+    Raises:
+        FileNotFoundError: If the file is already gone
+
+    Returns:
+        str: The destination path
+    """
+    try:
+        os.link(path, destination)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.copyfile(path, destination)
+    return destination
+
+@contextmanager
+def open_workspace(workspace=None, job_id=None):
+    """
+    Yield the given workspace, or a new one that is removed on exit
+    """
+    if workspace is not None:
+        yield workspace
+        return
+
+    with JobWorkspace(job_id) as workspace:
+        yield workspace
+
+def cleanup_stale_workspaces():
+    """
+    Remove workspaces left behind by processes that no longer exist
+
+    A workspace with this process's PID but another instance ID was left by an
+    earlier run that happened to get the same PID, and is removed as well.
+
+    Returns:
+        int: Number of workspaces removed
+    """
+    root = workspace_root()
+    if not os.path.isdir(root):
+        return 0
+
+    removed = 0
+    for name in os.listdir(root):
+        if not name.startswith(_WORKSPACE_PREFIX):
+            continue
+
+        fields = name[len(_WORKSPACE_PREFIX):].split('_', 2)
+        try:
+            pid = int(fields[0])
+        except ValueError:
+            continue
+
+        if pid == os.getpid():
+            if len(fields) > 1 and fields[1] == _INSTANCE_ID:
+                continue
+        elif _pid_alive(pid):
+            continue
+
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+        removed += 1
+
+    return removed
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+@atexit.register
+def _remove_active_workspaces():
+    # Jobs interrupted by shutdown never reach their own cleanup
+    with _active_lock:
+        paths = list(_active_workspaces)
+    for path in paths:
+        shutil.rmtree(path, ignore_errors=True)
\ No newline at end of file
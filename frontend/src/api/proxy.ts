@@ -1,6 +1,42 @@
 import type { VercelRequest, VercelResponse } from "@vercel/node";
 import axios from "axios";
 
+// Relay a Server-Sent Events stream chunk by chunk; buffering the response like the
+// other endpoints would hold back every progress event until the job has finished
+async function streamEvents(url: string, req: VercelRequest, res: VercelResponse) {
+  const controller = new AbortController();
+  req.on("close", () => controller.abort());
+
+  const upstream = await fetch(url, {
+    headers: { Accept: "text/event-stream" },
+    signal: controller.signal,
+  });
+
+  if (!upstream.ok || !upstream.body) {
+    return res.status(upstream.status || 502).json({ error: await upstream.text() });
+  }
+
+  res.status(200);
+  res.setHeader("Content-Type", upstream.headers.get("content-type") || "text/event-stream");
+  res.setHeader("Cache-Control", upstream.headers.get("cache-control") || "no-cache");
+  res.setHeader("Connection", "keep-alive");
+  res.setHeader("X-Accel-Buffering", "no");
+  res.flushHeaders();
+
+  const reader = upstream.body.getReader();
+  try {
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      res.write(value);
+    }
+  } catch {
+    // The browser went away and the upstream request was aborted
+  } finally {
+    res.end();
+  }
+}
+
 export default async function handler(req: VercelRequest, res: VercelResponse) {
   const { endpoint } = req.query;
 
@@ -27,6 +63,9 @@ export default async function handler(req: VercelRequest, res: VercelResponse) {
         }
       );
       return res.status(200).json(response.data);
+    } else if (req.method === "GET" && req.headers.accept?.includes("text/event-stream")) {
+      console.log(`Streaming events from ${baseUrl}/${endpoint}`);
+      return await streamEvents(`${baseUrl}/${endpoint}`, req, res);
     } else if (req.method === "GET") {
       console.log(`Forwarding GET request to ${baseUrl}/${endpoint}`);
       const response = await axios.get(
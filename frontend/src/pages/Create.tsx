@@ -125,23 +125,11 @@ const Create = () => {
     }
   }, [apiLoading, apiError]);
 
-  // Simulate progress during loading
+  // Reset progress if loading stopped before the video was ready
   useEffect(() => {
-    let interval: NodeJS.Timeout;
-
-    if (loading) {
-      interval = setInterval(() => {
-        setProgress((prev) => {
-          const newProgress = prev + Math.random() * 10;
-          return newProgress >= 95 ? 95 : newProgress;
-        });
-      }, 1000);
-    } else if (!loading && progress > 0 && progress < 100) {
-      // If we stopped loading but progress isn't complete, reset it
+    if (!loading && progress > 0 && progress < 100) {
       setProgress(0);
     }
-
-    return () => clearInterval(interval);
   }, [loading, progress]);
 
   // Add state for audio preference
@@ -163,7 +151,12 @@ const Create = () => {
 
     try {
       // Pass enableAudio to the API
-      const result = await generateVideo(text, options?.enableAudio ?? enableAudio);
+      const result = await generateVideo(
+        text,
+        options?.enableAudio ?? enableAudio,
+        // Progress is streamed by the server while the video renders
+        (update) => setProgress(Math.min(Math.round(update.progress * 100), 99))
+      );
       if (result) {
         setVideoUrl(result);
         setProgress(100);
@@ -10,22 +10,103 @@ export interface VideoData {
 
 const API_PROXY = import.meta.env.VITE_API_PROXY_URL || "/api/proxy";
 
+export interface VideoJob {
+  jobId: string;
+  status: "queued" | "running" | "done" | "failed";
+  statusUrl: string;
+  eventsUrl?: string;
+  videoUrl?: string | null;
+  error?: string | null;
+  createdAt: string;
+}
+
+export interface JobProgress {
+  stage: string;
+  progress: number;
+  etaSeconds?: number | null;
+  keyframe?: number;
+  keyframes?: number;
+  step?: number;
+  steps?: number;
+}
+
+const JOB_POLL_INTERVAL_MS = 3000;
+
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms));
+
+export const getJob = async (jobId: string): Promise<VideoJob> => {
+  const response = await axios.get(`${API_PROXY}?endpoint=videos/jobs/${jobId}`);
+  return response.data;
+};
+
+// Follow a job's progress stream until it finishes; rejects if the stream is unavailable
+const watchJob = (
+  job: VideoJob,
+  onProgress?: (progress: JobProgress) => void
+): Promise<VideoJob> =>
+  new Promise((resolve, reject) => {
+    if (typeof EventSource === "undefined") {
+      reject(new Error("Progress streams are not supported"));
+      return;
+    }
+
+    const source = new EventSource(`${API_PROXY}?endpoint=videos/jobs/${job.jobId}/events`);
+    source.addEventListener("progress", (event) => {
+      onProgress?.(JSON.parse((event as MessageEvent).data));
+    });
+
+    const finish = (event: Event) => {
+      source.close();
+      const data = JSON.parse((event as MessageEvent).data);
+      onProgress?.(data);
+      resolve({ ...job, ...data });
+    };
+    source.addEventListener("done", finish);
+    source.addEventListener("failed", finish);
+
+    source.onerror = () => {
+      source.close();
+      reject(new Error("Progress stream unavailable"));
+    };
+  });
+
 export const generateVideo = async (
   text: string,
-  enableAudio: boolean = true
+  enableAudio: boolean = true,
+  onProgress?: (progress: JobProgress) => void
 ): Promise<string> => {
   try {
+    // Rendering happens in a background job; submit it, then follow its progress
     const response = await axios.post(`${API_PROXY}?endpoint=videos/generate`, {
       text,
       enableAudio,
     });
 
-    return response.data.videoUrl;
+    let job: VideoJob = response.data;
+    try {
+      job = await watchJob(job, onProgress);
+    } catch {
+      // Fall back to polling when the stream cannot be opened or drops
+      job = await getJob(job.jobId);
+      while (job.status === "queued" || job.status === "running") {
+        await sleep(JOB_POLL_INTERVAL_MS);
+        job = await getJob(job.jobId);
+      }
+    }
+
+    if (job.status === "failed" || !job.videoUrl) {
+      throw new Error(job.error || "Failed to generate video");
+    }
+
+    return job.videoUrl;
   } catch (error: any) {
     console.error("Error generating video:", error);
     if (axios.isAxiosError(error) && error.response) {
       throw new Error(error.response.data.error || "Failed to generate video");
     }
+    if (error instanceof Error) {
+      throw error;
+    }
     throw new Error("Failed to connect to the video generation service");
   }
 };